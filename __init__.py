@@ -5,10 +5,12 @@ This package contains modular handlers organized by functionality:
 - registration: User registration (phone, city)
 - user_commands: Basic commands (/start, language, city selection, cancel)
 - admin: Admin panel and commands
+- offers: Seller "My offers" list and offer card actions
+- stores: Store browsing (all stores, top stores, stores by category)
 
 Additional handlers remain in bot.py and can be migrated here incrementally.
 """
-from handlers import registration, user_commands, admin
+from handlers import registration, user_commands, admin, offers, stores
 
 # Export all handler modules
-__all__ = ['registration', 'user_commands', 'admin']
+__all__ = ['registration', 'user_commands', 'admin', 'offers', 'stores']
@@ -2,23 +2,137 @@
 Admin panel handlers
 Note: This module contains the main admin handlers. Additional admin handlers  
 remain in bot.py and can be migrated here incrementally.
+
+This module owns the following admin texts and callbacks. Their bot.py copies
+must be commented out when setup() is wired in, as was done for /admin,
+"📊 Dashboard" and "🔙 Выход"; otherwise router order decides which one runs:
+  texts:     "📈 Аналитика", "🏪 Магазины", "📋 Бронирования", "📦 Товары"
+  callbacks: admin_refresh_dashboard, admin_moderation, admin_list_sellers
+             (and admin_list_sellers_p{n}), plus the new mod_page_{n},
+             admin_stores_{status}_p{n}, admin_bookings_{status}
 """
+import asyncio
+import csv
+import html
+import io
+import os
+import re
+import time
+
 from aiogram import Router, types, F
 from aiogram.filters import Command
+from aiogram.types import BufferedInputFile
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from database import TTLCache
+
 router = Router()
 
+# Rendered analytics report (text + CSV), shared by all admins. The dashboard
+# is not cached: its counters come from the trigger-maintained _counts table,
+# and nothing in the write paths could invalidate a cached copy
+ANALYTICS_CACHE_TTL = int(os.environ.get('ANALYTICS_CACHE_TTL', 30))
+ANALYTICS_CACHE = TTLCache(maxsize=4, ttl=ANALYTICS_CACHE_TTL)
+
+# Pending-store moderation list: "mod_page_{n}" (buttons from keyboards.moderation_list_keyboard)
+MODERATION_PAGE_SIZE = 10
+MOD_PAGE_RE = re.compile(r"^mod_page_(\d+)$")
+
+# Sellers list paging: "admin_list_sellers" is page 0, "admin_list_sellers_p{n}" page n
+SELLERS_PAGE_SIZE = 20
+SELLERS_PAGE_RE = re.compile(r"^admin_list_sellers(?:_p(\d+))?$")
+
+# Stores list paging: "admin_stores_{status}_p{n}"
+STORES_PAGE_SIZE = 20
+STORES_PAGE_RE = re.compile(r"^admin_stores_(active|pending|rejected)_p(\d+)$")
+# Offers overview: newest N active offers plus the total
+OFFERS_LIST_LIMIT = 10
+
+# Bookings list: "admin_bookings_{status}" switches between the tabs
+BOOKINGS_LIST_LIMIT = 15
+BOOKINGS_TAB_RE = re.compile(r"^admin_bookings_(pending|confirmed|completed|cancelled)$")
+BOOKING_STATUS_TITLES = {
+    'pending': "⏳ Активные",
+    'confirmed': "📦 Подтверждённые",
+    'completed': "✅ Выполненные",
+    'cancelled': "❌ Отменённые",
+}
+STORE_STATUS_TITLES = {
+    'active': "✅ Активные магазины",
+    'pending': "⏳ Магазины на модерации",
+    'rejected': "❌ Отклонённые магазины",
+}
+
+# Per-admin minimum interval between dashboard refreshes: {admin_id: monotonic time}.
+# The only throttle on "🔄 Обновить" - every allowed refresh reads fresh counts
+REFRESH_MIN_INTERVAL = float(os.environ.get('DASHBOARD_REFRESH_INTERVAL', 3))
+LAST_REFRESH = {}
+
+
+def refresh_allowed(admin_id: int) -> bool:
+    """False if this admin refreshed less than REFRESH_MIN_INTERVAL seconds ago"""
+    now = time.monotonic()
+    if now - LAST_REFRESH.get(admin_id, 0.0) < REFRESH_MIN_INTERVAL:
+        return False
+    LAST_REFRESH[admin_id] = now
+    return True
+
+
+def analytics_csv(report: dict, tops: dict = None) -> bytes:
+    """Analytics report as CSV bytes (UTF-8 with BOM so Excel opens Cyrillic correctly)"""
+    def by_key(section):
+        return sorted(report[section].items(), key=lambda kv: str(kv[0]))
+
+    rows = [("section", "key", "count", "sum", "original_sum")]
+    for section in ('users', 'stores'):
+        rows.extend((section, key, n) for key, n in by_key(section))
+    rows.extend(("offers", status, n, discount_sum, original_sum)
+                for status, (n, original_sum, discount_sum) in by_key('offers'))
+    rows.extend(("bookings", status, n, quantity) for status, (n, quantity) in by_key('bookings'))
+    rows.extend(("lifetime", key, "", value) for key, value in by_key('lifetime'))
+    for section, top in (tops or {}).items():
+        rows.extend((f"top_{section}", name, n) for name, n in top)
+
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue().encode('utf-8-sig')
+
+
+# Section titles for db.get_analytics_tops(), in display order
+TOP_TITLES = (
+    ('stores', "🏆 Топ магазинов"),
+    ('customers', "⭐ Топ покупателей"),
+    ('cities', "🏙 Топ городов"),
+    ('categories', "🗂 Топ категорий"),
+)
+
+
+def format_tops(tops: dict):
+    """Text blocks for the non-empty top lists of the analytics report"""
+    for section, title in TOP_TITLES:
+        rows = tops.get(section)
+        if rows:
+            yield f"\n\n<b>{title}:</b>"
+            for i, (name, n) in enumerate(rows, 1):
+                yield f"\n{i}. {html.escape(str(name))} - {n}"
+
 
 def setup(dp_or_router, db, get_text, admin_menu):
-    """Setup admin handlers with dependencies"""
-    from handlers.common import get_uzb_time
+    """Setup admin handlers with dependencies.
+
+    Handles the texts and callbacks listed in the module docstring; remove the
+    bot.py handlers for them instead of registering both.
+    """
+    from handlers.common import (
+        edit_text_if_changed, format_uzb_date, get_uzb_time, render_moderation_page
+    )
+    # Imported at setup time (not module import) to avoid circular dependencies
+    from keyboards import admin_stores_keyboard, main_menu_customer, main_menu_seller
     
     @dp_or_router.message(Command("admin"))
     async def cmd_admin(message: types.Message):
-        lang = db.get_user_language(message.from_user.id)
-        
         if not db.is_admin(message.from_user.id):
+            lang = await db.run(db.get_user_language, message.from_user.id)
             await message.answer(get_text(lang, 'no_admin_access'))
             return
         
@@ -29,103 +143,347 @@ def setup(dp_or_router, db, get_text, admin_menu):
             reply_markup=admin_menu()
         )
 
-    @dp_or_router.message(F.text == "📊 Dashboard")
-    async def admin_dashboard(message: types.Message):
-        """Main panel with general statistics and quick actions"""
-        if not db.is_admin(message.from_user.id):
-            return
-        
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
-        # General statistics
-        cursor.execute('SELECT COUNT(*) FROM users')
-        total_users = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM users WHERE role = "seller"')
-        sellers = cursor.fetchone()[0]
+    async def build_dashboard(today: str):
+        """Dashboard text and pending-store count, read fresh on every call"""
+        # All counters in one round trip, off the event loop
+        counts = await db.run(db.get_dashboard_counts, today)
+        users, stores = counts['users'], counts['stores']
+        offers, bookings = counts['offers'], counts['bookings']
         
-        cursor.execute('SELECT COUNT(*) FROM users WHERE role = "customer"')
-        customers = cursor.fetchone()[0]
+        total_users = sum(users.values())
+        sellers = users.get('seller', 0)
+        customers = users.get('customer', 0)
+        active_stores = stores.get('active', 0)
+        pending_stores = stores.get('pending', 0)
+        active_offers = offers.get('active', 0)
+        inactive_offers = offers.get('inactive', 0)
+        total_bookings = sum(bookings.values())
+        pending_bookings = bookings.get('pending', 0)
+        today_bookings = counts['today']['bookings']
+        today_revenue = counts['today']['revenue'] or 0
+        today_users = counts['today']['users']
         
-        # Stores
-        cursor.execute('SELECT COUNT(*) FROM stores WHERE status = "active"')
-        active_stores = cursor.fetchone()[0]
+        # Format message: one join instead of a chain of += copies
+        text = "".join((
+            "📊 <b>Dashboard - Общая статистика</b>\n\n",
+            
+            "👥 <b>Пользователи:</b>\n",
+            f"├ Всего: {total_users} (+{today_users} сегодня)\n",
+            f"├ 🏪 Партнёры: {sellers}\n",
+            f"└ 🛍 Покупатели: {customers}\n\n",
+            
+            "🏪 <b>Магазины:</b>\n",
+            f"├ ✅ Активные: {active_stores}\n",
+            f"└ ⏳ На модерации: {pending_stores}\n\n",
+            
+            "📦 <b>Товары:</b>\n",
+            f"├ ✅ Активные: {active_offers}\n",
+            f"└ ❌ Неактивные: {inactive_offers}\n\n",
+            
+            "🎫 <b>Бронирования:</b>\n",
+            f"├ Всего: {total_bookings}\n",
+            f"├ ⏳ Активные: {pending_bookings}\n",
+            f"└ 📅 Сегодня: {today_bookings}\n\n",
+            
+            f"💰 <b>Выручка сегодня:</b> {int(today_revenue):,} сум",
+        ))
         
-        cursor.execute('SELECT COUNT(*) FROM stores WHERE status = "pending"')
-        pending_stores = cursor.fetchone()[0]
+        return text, pending_stores
+
+    def dashboard_keyboard(pending_stores: int):
+        """Inline buttons for quick actions under the dashboard"""
+        kb = InlineKeyboardBuilder()
         
-        # Offers
-        cursor.execute('SELECT COUNT(*) FROM offers WHERE status = "active"')
-        active_offers = cursor.fetchone()[0]
+        if pending_stores > 0:
+            kb.button(text=f"⏳ Модерация ({pending_stores})", callback_data="admin_moderation")
         
-        cursor.execute('SELECT COUNT(*) FROM offers WHERE status = "inactive"')
-        inactive_offers = cursor.fetchone()[0]
+        kb.button(text="📊 Детальная статистика", callback_data="admin_detailed_stats")
+        kb.button(text="🔄 Обновить", callback_data="admin_refresh_dashboard")
+        kb.adjust(1)
+        return kb.as_markup()
+
+    @dp_or_router.message(F.text == "📊 Dashboard")
+    async def admin_dashboard(message: types.Message):
+        """Main panel with general statistics and quick actions"""
+        if not db.is_admin(message.from_user.id):
+            return
         
-        # Bookings
-        cursor.execute('SELECT COUNT(*) FROM bookings')
-        total_bookings = cursor.fetchone()[0]
+        # Today's statistics (Uzbek time)
+        text, pending_stores = await build_dashboard(format_uzb_date('%Y-%m-%d'))
+        await message.answer(text, parse_mode="HTML", reply_markup=dashboard_keyboard(pending_stores))
+
+    @dp_or_router.callback_query(F.data == "admin_refresh_dashboard")
+    async def admin_refresh_dashboard(callback: types.CallbackQuery):
+        """Re-render the dashboard in place; identical screens skip the edit call"""
+        if not db.is_admin(callback.from_user.id):
+            await callback.answer("❌ Доступ запрещён", show_alert=True)
+            return
+        if not refresh_allowed(callback.from_user.id):
+            await callback.answer("⏳ Слишком часто, попробуйте через пару секунд")
+            return
         
-        cursor.execute('SELECT COUNT(*) FROM bookings WHERE status = "pending"')
-        pending_bookings = cursor.fetchone()[0]
+        text, pending_stores = await build_dashboard(format_uzb_date('%Y-%m-%d'))
+        changed = await edit_text_if_changed(
+            callback.message, None, text,
+            reply_markup=dashboard_keyboard(pending_stores), parse_mode="HTML"
+        )
+        await callback.answer("✅ Обновлено" if changed else "✅ Обновлено (без изменений)")
+
+    async def render_moderation(page: int):
+        """(text, markup) for a page of pending stores, or the "no requests" text"""
+        pending = await db.run(db.get_pending_stores)
+        if not pending:
+            return get_text('ru', 'no_pending_stores'), None
+        return render_moderation_page(pending, page, MODERATION_PAGE_SIZE)
+
+    @dp_or_router.callback_query(F.data == "admin_moderation")
+    async def admin_moderation(callback: types.CallbackQuery):
+        """Pending stores as one paginated message under the dashboard"""
+        if not db.is_admin(callback.from_user.id):
+            await callback.answer("❌ Доступ запрещён", show_alert=True)
+            return
+        _, (text, markup) = await asyncio.gather(callback.answer(), render_moderation(0))
+        await callback.message.answer(text, parse_mode="HTML", reply_markup=markup)
+
+    @dp_or_router.callback_query(F.data.regexp(MOD_PAGE_RE).as_("page_match"))
+    async def admin_moderation_page(callback: types.CallbackQuery, page_match):
+        """Prev/next page of the moderation list, edited in place"""
+        if not db.is_admin(callback.from_user.id):
+            await callback.answer("❌ Доступ запрещён", show_alert=True)
+            return
+        _, (text, markup) = await asyncio.gather(
+            callback.answer(), render_moderation(int(page_match.group(1)))
+        )
+        await edit_text_if_changed(callback.message, None, text, reply_markup=markup, parse_mode="HTML")
+
+    @dp_or_router.callback_query(F.data.regexp(SELLERS_PAGE_RE).as_("page_match"))
+    async def admin_list_sellers_callback(callback: types.CallbackQuery, page_match):
+        """Sellers list, SELLERS_PAGE_SIZE per page (admin_list_sellers_p{n})"""
+        if not db.is_admin(callback.from_user.id):
+            await callback.answer("❌ Доступ запрещён", show_alert=True)
+            return
+        page = int(page_match.group(1) or 0)
+        # The spinner ack goes out while the page is read, not before it
+        _, (sellers, has_more), total = await asyncio.gather(
+            callback.answer(),
+            db.run(db.get_sellers_page, page, SELLERS_PAGE_SIZE),
+            db.run(db.count_users_by_role, 'seller'),
+        )
         
-        # Today's statistics (Uzbek time)
-        today = get_uzb_time().strftime('%Y-%m-%d')
+        lines = [f"🏪 <b>Партнёры</b> (всего: {total})\n"]
+        for i, (user_id, username, first_name, phone, city, _,
+                stores_count, active_stores, offers_count) in enumerate(
+                sellers, page * SELLERS_PAGE_SIZE + 1):
+            name = html.escape(first_name or str(user_id))
+            if username:
+                name += f" (@{html.escape(username)})"
+            lines.append(
+                f"{i}. {name}\n"
+                f"   📱 {html.escape(phone or '—')} | 📍 {html.escape(city or '—')}\n"
+                f"   🏪 {active_stores}/{stores_count} | 📦 {offers_count}"
+            )
+        if not sellers:
+            lines.append("Партнёров нет")
+        else:
+            shown_to = page * SELLERS_PAGE_SIZE + len(sellers)
+            lines.append(f"\nПоказано {page * SELLERS_PAGE_SIZE + 1}-{shown_to} из {total}")
         
-        cursor.execute('SELECT COUNT(*) FROM bookings WHERE DATE(created_at) = ?', (today,))
-        today_bookings = cursor.fetchone()[0]
+        kb = InlineKeyboardBuilder()
+        if page > 0:
+            kb.button(text="⬅️", callback_data=f"admin_list_sellers_p{page - 1}")
+        if has_more:
+            kb.button(text="➡️", callback_data=f"admin_list_sellers_p{page + 1}")
+        kb.adjust(2)
         
-        cursor.execute('''
-            SELECT SUM(o.discount_price * b.quantity)
-            FROM bookings b
-            JOIN offers o ON b.offer_id = o.offer_id
-            WHERE DATE(b.created_at) = ? AND b.status != 'cancelled'
-        ''', (today,))
-        today_revenue = cursor.fetchone()[0] or 0
+        await callback.message.edit_text(
+            "\n".join(lines), parse_mode="HTML", reply_markup=kb.as_markup()
+        )
+
+    async def build_analytics():
+        """Analytics report text and CSV bytes, cached for ANALYTICS_CACHE_TTL seconds"""
+        key = ('analytics',)
+        cached = ANALYTICS_CACHE.get(key)
+        if cached is not None:
+            return cached
         
-        # New users today
-        cursor.execute('''
-            SELECT COUNT(*) FROM users 
-            WHERE DATE(created_at) = ?
-        ''', (today,))
-        today_users = cursor.fetchone()[0]
+        # Independent reads on separate DB worker threads (own pooled connections);
+        # with WAL they do not serialize, so the wait is the slower of the two
+        report, tops = await asyncio.gather(
+            db.run(db.get_analytics_report),
+            db.run(db.get_analytics_tops, 5),
+        )
+        users, stores = report['users'], report['stores']
+        offers, bookings = report['offers'], report['bookings']
+        lifetime = report['lifetime']
         
-        conn.close()
+        total_bookings = sum(n for n, _ in bookings.values())
+        completed, completed_qty = bookings.get('completed', (0, 0))
+        cancelled = bookings.get('cancelled', (0, 0))[0]
+        active_offers, original_sum, discount_sum = offers.get('active', (0, 0, 0))
+        avg_discount = (1 - discount_sum / original_sum) * 100 if original_sum else 0
+        conversion = completed / total_bookings * 100 if total_bookings else 0
         
-        # Format message
-        text = "📊 <b>Dashboard - Общая статистика</b>\n\n"
+        text = "".join((
+            "📈 <b>Аналитика</b>\n\n",
+            
+            "👥 <b>Пользователи:</b>\n",
+            f"├ Всего: {sum(users.values())}\n",
+            f"├ 🏪 Партнёры: {users.get('seller', 0)}\n",
+            f"└ 🛍 Покупатели: {users.get('customer', 0)}\n\n",
+            
+            "🏪 <b>Магазины:</b>\n",
+            f"├ ✅ Активные: {stores.get('active', 0)}\n",
+            f"├ ⏳ На модерации: {stores.get('pending', 0)}\n",
+            f"└ ❌ Отклонённые: {stores.get('rejected', 0)}\n\n",
+            
+            "📦 <b>Товары:</b>\n",
+            f"├ ✅ Активные: {active_offers}\n",
+            f"└ 💸 Средняя скидка: {avg_discount:.0f}%\n\n",
+            
+            "🎫 <b>Бронирования:</b>\n",
+            f"├ Всего: {total_bookings}\n",
+            f"├ ✅ Выполнено: {completed} ({completed_qty} шт.)\n",
+            f"├ ❌ Отменено: {cancelled}\n",
+            f"└ 📊 Конверсия: {conversion:.1f}%\n\n",
+            
+            f"💰 <b>Выручка за всё время:</b> {int(lifetime.get('revenue', 0)):,} сум\n",
+            f"🌱 <b>Сэкономлено покупателями:</b> {int(lifetime.get('savings', 0)):,} сум",
+            *format_tops(tops),
+            # The report may be served from cache: show when it was built
+            f"\n\n🕐 <i>Данные на {get_uzb_time():%H:%M:%S}</i>",
+        ))
         
-        text += "👥 <b>Пользователи:</b>\n"
-        text += f"├ Всего: {total_users} (+{today_users} сегодня)\n"
-        text += f"├ 🏪 Партнёры: {sellers}\n"
-        text += f"└ 🛍 Покупатели: {customers}\n\n"
+        result = (text, analytics_csv(report, tops))
+        ANALYTICS_CACHE.set(key, result)
+        return result
+
+    @dp_or_router.message(F.text == "📈 Аналитика")
+    async def admin_analytics(message: types.Message):
+        """Platform-wide analytics; repeated taps within the TTL reuse the rendered report"""
+        if not db.is_admin(message.from_user.id):
+            return
         
-        text += "🏪 <b>Магазины:</b>\n"
-        text += f"├ ✅ Активные: {active_stores}\n"
-        text += f"└ ⏳ На модерации: {pending_stores}\n\n"
+        text, csv_bytes = await build_analytics()
+        await message.answer(text, parse_mode="HTML")
+        # Sent straight from memory: no temp file to write, send and remove
+        await message.answer_document(
+            BufferedInputFile(csv_bytes, filename=f"statistics_{format_uzb_date('%Y-%m-%d')}.csv"),
+            caption="📎 Статистика в CSV"
+        )
+
+    async def render_stores_page(status: str, page: int):
+        """One message for a page of stores: numbered list + "🗑 N" grid and paging"""
+        (stores, has_more), total = await asyncio.gather(
+            db.run(db.get_stores_page, status, page, STORES_PAGE_SIZE),
+            db.run(db.count_stores_by_status, status),
+        )
         
-        text += "📦 <b>Товары:</b>\n"
-        text += f"├ ✅ Активные: {active_offers}\n"
-        text += f"└ ❌ Неактивные: {inactive_offers}\n\n"
+        lines = [f"<b>{STORE_STATUS_TITLES[status]}</b> (всего: {total})"]
+        for i, store in enumerate(stores, page * STORES_PAGE_SIZE + 1):
+            owner = html.escape(store[11] or '—')
+            if store[12]:
+                owner += f" (@{html.escape(store[12])})"
+            lines.append(
+                f"{i}. <b>{html.escape(store[2])}</b> — {html.escape(store[6] or '')}\n"
+                f"   📍 {html.escape(store[3] or '')} | 👤 {owner} | 📱 {html.escape(store[7] or '—')}"
+            )
+        if not stores:
+            lines.append("Магазинов нет")
+        return "\n\n".join(lines), admin_stores_keyboard(stores, status, page, has_more, STORES_PAGE_SIZE)
+
+    @dp_or_router.message(F.text == "🏪 Магазины")
+    async def admin_all_stores(message: types.Message):
+        """Active stores, STORES_PAGE_SIZE per message instead of one message per store"""
+        if not db.is_admin(message.from_user.id):
+            return
         
-        text += "🎫 <b>Бронирования:</b>\n"
-        text += f"├ Всего: {total_bookings}\n"
-        text += f"├ ⏳ Активные: {pending_bookings}\n"
-        text += f"└ 📅 Сегодня: {today_bookings}\n\n"
+        text, markup = await render_stores_page('active', 0)
+        await message.answer(text, parse_mode="HTML", reply_markup=markup)
+
+    @dp_or_router.callback_query(F.data.regexp(STORES_PAGE_RE).as_("page_match"))
+    async def admin_stores_page(callback: types.CallbackQuery, page_match):
+        """Prev/next page of the stores list, edited in place"""
+        if not db.is_admin(callback.from_user.id):
+            await callback.answer("❌ Доступ запрещён", show_alert=True)
+            return
+        _, (text, markup) = await asyncio.gather(
+            callback.answer(), render_stores_page(page_match.group(1), int(page_match.group(2)))
+        )
+        await edit_text_if_changed(callback.message, None, text, reply_markup=markup, parse_mode="HTML")
+
+    async def render_bookings(status: str):
+        """Latest BOOKINGS_LIST_LIMIT bookings with the status as one message plus tab buttons"""
+        bookings = await db.run(db.get_recent_bookings, status, BOOKINGS_LIST_LIMIT)
+        totals = await db.run(db.get_booking_status_totals)
+        count, quantity = totals.get(status, (0, 0))
         
-        text += f"💰 <b>Выручка сегодня:</b> {int(today_revenue):,} сум"
+        parts = [f"🎫 <b>Бронирования: {BOOKING_STATUS_TITLES[status]}</b> ({count}, {quantity} шт.)"]
+        total_sum = 0
+        for i, (_, code, qty, created_at, title, price, _, store_name,
+                first_name, username) in enumerate(bookings, 1):
+            amount = int((price or 0) * qty)
+            total_sum += amount
+            customer = html.escape(first_name or '—')
+            if username:
+                customer += f" (@{html.escape(username)})"
+            parts.append(
+                f"\n\n{i}. <b>{html.escape(title or '')}</b> × {qty} — {amount:,} сум\n"
+                f"   🏪 {html.escape(store_name or '')} | 👤 {customer}\n"
+                f"   🎫 <code>{html.escape(code or '')}</code> | 🕐 {str(created_at)[:16]}"
+            )
+        if not bookings:
+            parts.append("\n\nБронирований нет")
+        elif count > len(bookings):
+            parts.append(f"\n\nПоказаны последние {len(bookings)} на {total_sum:,} сум")
         
-        # Inline buttons for quick actions
         kb = InlineKeyboardBuilder()
+        for tab, title in BOOKING_STATUS_TITLES.items():
+            if tab != status:
+                kb.button(text=title, callback_data=f"admin_bookings_{tab}")
+        kb.adjust(3)
+        return "".join(parts), kb.as_markup()
+
+    @dp_or_router.message(F.text == "📋 Бронирования")
+    async def admin_bookings(message: types.Message):
+        """Latest active bookings across all stores"""
+        if not db.is_admin(message.from_user.id):
+            return
         
-        if pending_stores > 0:
-            kb.button(text=f"⏳ Модерация ({pending_stores})", callback_data="admin_moderation")
-        
-        kb.button(text="📊 Детальная статистика", callback_data="admin_detailed_stats")
-        kb.button(text="🔄 Обновить", callback_data="admin_refresh_dashboard")
-        kb.adjust(1)
+        text, markup = await render_bookings('pending')
+        await message.answer(text, parse_mode="HTML", reply_markup=markup)
+
+    @dp_or_router.callback_query(F.data.regexp(BOOKINGS_TAB_RE).as_("tab_match"))
+    async def admin_bookings_tab(callback: types.CallbackQuery, tab_match):
+        """Switch the bookings list to another status in place"""
+        if not db.is_admin(callback.from_user.id):
+            await callback.answer("❌ Доступ запрещён", show_alert=True)
+            return
+        _, (text, markup) = await asyncio.gather(
+            callback.answer(), render_bookings(tab_match.group(1))
+        )
+        await edit_text_if_changed(callback.message, None, text, reply_markup=markup, parse_mode="HTML")
+
+    @dp_or_router.message(F.text == "📦 Товары")
+    async def admin_all_offers(message: types.Message):
+        """Active offers overview; rows are database.Offer, read by field name"""
+        if not db.is_admin(message.from_user.id):
+            return
         
-        await message.answer(text, parse_mode="HTML", reply_markup=kb.as_markup())
+        offers, total = await db.run(db.get_active_offers_page, OFFERS_LIST_LIMIT)
+        parts = [f"📦 <b>Активные товары</b> (всего: {total})"]
+        for i, offer in enumerate(offers, 1):
+            parts.append(
+                f"\n\n{i}. <b>{html.escape(offer.title or '')}</b>\n"
+                f"   💰 {int(offer.original_price or 0):,} ➜ {int(offer.discount_price or 0):,} сум"
+                f" | 📦 {offer.quantity} {html.escape(offer.unit or 'шт')}\n"
+                f"   🏪 {html.escape(offer.store_name or '')} ({html.escape(offer.store_city or '')})"
+                f" | ⏰ {offer.expiry_date or '—'}"
+            )
+        if not offers:
+            parts.append("\n\nАктивных товаров нет")
+        elif total > len(offers):
+            parts.append(f"\n\n… и ещё {total - len(offers)}")
+        await message.answer("".join(parts), parse_mode="HTML")
 
     @dp_or_router.message(F.text == "🔙 Выход")
     async def admin_exit(message: types.Message):
@@ -133,11 +491,8 @@ def setup(dp_or_router, db, get_text, admin_menu):
         if not db.is_admin(message.from_user.id):
             return
         
-        lang = db.get_user_language(message.from_user.id)
-        user = db.get_user(message.from_user.id)
-        
-        # Import here to avoid circular dependencies
-        from keyboards import main_menu_customer, main_menu_seller
+        user = await db.run(db.get_user, message.from_user.id)
+        lang = await db.run(db.get_user_language, message.from_user.id)
         
         # Return to appropriate main menu based on user role
         menu = main_menu_seller(lang) if user and user[6] == "seller" else main_menu_customer(lang)
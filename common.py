@@ -1,11 +1,26 @@
 """
 Common utilities, state classes, and middleware
 """
+import asyncio
+import hashlib
+import html
+import logging
+import os
+from array import array
+from functools import lru_cache
+
 from aiogram.fsm.state import State, StatesGroup
-from aiogram import BaseMiddleware
+from aiogram import BaseMiddleware, F, Router
 from aiogram.types import Update
-from typing import Callable, Dict, Any, Awaitable
-from datetime import timezone, timedelta, datetime
+from typing import Callable, Dict, Any, Awaitable, Optional, Tuple
+from datetime import timezone, timedelta, datetime, date
+
+from database import TTLCache
+from logging_config import logger
+from keyboards import get_labels, moderation_list_keyboard, offer_card_keyboard, stores_digest_keyboard
+
+# Catch-all logging of unhandled text messages; off unless BOT_DEBUG=1
+BOT_DEBUG = os.getenv('BOT_DEBUG') == '1'
 
 # In-memory per-session view mode override: {'seller'|'customer'}
 user_view_mode = {}
@@ -36,6 +51,20 @@ def get_uzb_time():
     return datetime.now(UZB_TZ)
 
 
+@lru_cache(maxsize=32)
+def _format_ordinal(ordinal: int, fmt: str) -> str:
+    return date.fromordinal(ordinal).strftime(fmt)
+
+
+def format_uzb_date(fmt: str = '%Y-%m-%d', days: int = 0) -> str:
+    """Format today's date (Uzbek time) shifted by `days`.
+
+    Results are cached per (day, format), so strftime runs once per calendar
+    day instead of on every callback.
+    """
+    return _format_ordinal(get_uzb_time().toordinal() + days, fmt)
+
+
 def has_approved_store(user_id: int, db) -> bool:
     """Check if user has an approved store"""
     stores = db.get_user_stores(user_id)
@@ -63,6 +92,410 @@ def get_appropriate_menu(user_id: int, lang: str, db, main_menu_seller, main_men
     return main_menu_customer(lang)
 
 
+# ============== OUTGOING SENDS ==============
+
+class AsyncTokenBucket:
+    """Bot-wide token bucket for outgoing sends, used as `async with limiter:`.
+
+    Holds up to `rate` tokens refilled continuously over `per` seconds, so
+    short bursts go out immediately and sustained traffic is capped at
+    `rate / per` messages per second across all handlers.
+    """
+
+    def __init__(self, rate: int = 28, per: float = 1.0):
+        self._capacity = float(rate)
+        self._fill_rate = rate / per
+        self._tokens = float(rate)
+        self._updated = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # Waiters are served one at a time so tokens are handed out in order
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self._updated:
+                    self._tokens = min(
+                        self._capacity,
+                        self._tokens + (now - self._updated) * self._fill_rate
+                    )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._fill_rate)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+SEND_LIMITER = AsyncTokenBucket(28, 1)
+
+
+class ChatSendQueue:
+    """Per-chat FIFO of outgoing messages, each chat drained by its own worker.
+
+    Handlers that send a series of cards enqueue them and return at once,
+    freeing the dispatcher; order within a chat is preserved, while one
+    chat's long list never delays another chat. Pacing comes only from
+    SEND_LIMITER (no fixed pause per message), and a worker exits as soon
+    as its chat's queue is empty.
+    """
+
+    def __init__(self):
+        self._queues: Dict[int, asyncio.Queue] = {}
+        # Strong references: the loop only keeps weak ones to running tasks
+        self._workers: Dict[int, asyncio.Task] = {}
+
+    async def put(self, bot, chat_id: int, text: str, photo: Optional[str] = None, **kwargs) -> None:
+        """Queue send_message (or send_photo with `text` as caption when `photo` is set,
+        falling back to send_message if the photo is rejected)"""
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = asyncio.Queue()
+            self._workers[chat_id] = asyncio.create_task(self._run(chat_id, queue))
+        queue.put_nowait((bot, text, photo, kwargs))
+
+    def pending(self, chat_id: int) -> int:
+        queue = self._queues.get(chat_id)
+        return queue.qsize() if queue else 0
+
+    async def _run(self, chat_id: int, queue: asyncio.Queue) -> None:
+        try:
+            # No await between the empty() check and the finally block,
+            # so a put() can never land in a queue that is being dropped
+            while not queue.empty():
+                bot, text, photo, kwargs = queue.get_nowait()
+                try:
+                    async with SEND_LIMITER:
+                        if photo:
+                            try:
+                                await bot.send_photo(chat_id=chat_id, photo=photo, caption=text, **kwargs)
+                                continue
+                            except Exception as e:
+                                # Photo no longer available: the card still goes out as text
+                                logger.warning("Queued photo to chat %s failed, sending text: %s", chat_id, e)
+                        await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                except Exception as e:
+                    logger.warning("Queued send to chat %s failed: %s", chat_id, e)
+        finally:
+            self._queues.pop(chat_id, None)
+            self._workers.pop(chat_id, None)
+
+
+send_queue = ChatSendQueue()
+
+
+# Screen hashes for edits made without FSM state (admin panels): (chat_id, message_id) -> digest
+LAST_SCREEN = TTLCache(maxsize=10000, ttl=3600)
+
+
+async def edit_text_if_changed(message, state, text: str, reply_markup=None, **kwargs) -> bool:
+    """Edit message text unless the same screen is already shown.
+
+    A hash of (message_id, text, markup) is kept in FSM data as
+    'last_screen_hash', or in LAST_SCREEN when state is None; repeated taps
+    that would render an identical screen skip the API call (Telegram would
+    reject it as "message is not modified").
+    Returns True if an edit was sent.
+    """
+    markup_json = reply_markup.model_dump_json() if reply_markup is not None else ""
+    screen_hash = hashlib.blake2b(
+        f"{message.message_id}\0{text}\0{markup_json}".encode(), digest_size=8
+    ).hexdigest()
+    screen_key = (message.chat.id, message.message_id)
+
+    if state is not None:
+        data = await state.get_data()
+        if data.get('last_screen_hash') == screen_hash:
+            return False
+    elif LAST_SCREEN.get(screen_key) == screen_hash:
+        return False
+
+    await message.edit_text(text, reply_markup=reply_markup, **kwargs)
+
+    if state is not None:
+        await state.update_data(last_screen_hash=screen_hash)
+    else:
+        LAST_SCREEN.set(screen_key, screen_hash)
+    return True
+
+
+def _short_time(value) -> str:
+    """'YYYY-MM-DD HH:MM' -> 'HH:MM'; other formats are shown as stored"""
+    value = str(value or '')
+    return value[-5:] if len(value) > 5 and value[-3] == ':' else value
+
+
+def render_offer_card(offer, lang: str) -> Tuple[str, Any]:
+    """Build (text, reply_markup) for a seller's offer card.
+
+    Shared by the my_offers listing and in-place card updates so both render
+    identically. Takes a database.Offer row (get_offer, get_offers_for_user).
+    """
+    L = get_labels(lang)
+    original_price = offer.original_price or 0
+    discount_price = offer.discount_price or 0
+    unit = offer.unit or 'шт'
+    is_active = offer.status == 'active'
+
+    discount_percent = int((1 - discount_price / original_price) * 100) if original_price > 0 else 0
+
+    lines = [
+        f"{'✅' if is_active else '⏸'} <b>{html.escape(str(offer.title))}</b>",
+        f"💰 <s>{int(original_price):,}</s> → <b>{int(discount_price):,}</b> {L['currency']} (-{discount_percent}%)",
+        f"📦 {L['left']}: <b>{offer.quantity}</b> {unit}",
+        f"⏰ {L['pickup']}: {_short_time(offer.available_from)} - {_short_time(offer.available_until)}",
+    ]
+    if offer.expiry_date:
+        lines.append(f"📅 {L['expiry']}: {offer.expiry_date}")
+
+    return "\n".join(lines), offer_card_keyboard(offer.offer_id, lang, is_active)
+
+
+def render_stores_digest(stores, lang: str, limit: int = 15) -> Tuple[str, Any]:
+    """Build one (text, reply_markup) message for a list of stores.
+
+    Replaces sending a separate card per store with a sleep between sends:
+    the whole list goes out in a single API call. Rows use the stores table
+    layout ([0] id, [2] name, [4] address, [11] avg_rating, [12]
+    ratings_count).
+    """
+    L = get_labels(lang)
+    stores = stores[:limit]
+    blocks = []
+    for i, store in enumerate(stores, 1):
+        avg = store[11] if len(store) > 11 else 0
+        count = store[12] if len(store) > 12 else 0
+        rating = f"⭐ {avg or 0:.1f} ({count} {L['reviews']})" if count else f"⭐ {L['no_reviews']}"
+        block = f"{i}. <b>{html.escape(str(store[2]))}</b> — {rating}"
+        if store[4]:
+            block += f"\n    📍 {html.escape(str(store[4]))}"
+        blocks.append(block)
+    return "\n\n".join(blocks), stores_digest_keyboard(stores)
+
+
+def render_moderation_page(pending, page: int = 0, per_page: int = 10) -> Tuple[str, Any]:
+    """Build one (text, reply_markup) message for a page of pending stores.
+
+    Replaces one message per store with a sleep between sends. Rows come
+    from db.get_pending_stores(), which already carries the owner's
+    first_name [11] and username [12], so no per-store lookups are needed.
+    """
+    total = len(pending)
+    pages = max(1, (total + per_page - 1) // per_page)
+    page = min(max(page, 0), pages - 1)
+    start = page * per_page
+    lines = [f"⏳ <b>Заявки на модерацию: {total}</b> (стр. {page + 1}/{pages})"]
+    for i, store in enumerate(pending[start:start + per_page], start + 1):
+        owner = html.escape(str(store[11] or ''))
+        if store[12]:
+            owner += f" (@{html.escape(str(store[12]))})"
+        lines.append(
+            f"{i}. <b>{html.escape(str(store[2]))}</b> — {html.escape(str(store[6] or ''))}\n"
+            f"    📍 {html.escape(str(store[3] or ''))}, {html.escape(str(store[4] or ''))}\n"
+            f"    👤 {owner}  📱 {html.escape(str(store[7] or '—'))}"
+        )
+    return "\n\n".join(lines), moderation_list_keyboard(pending, page, per_page)
+
+
+# ============== METRICS ==============
+
+# In-process counters as integer-indexed slots of a C array: the webhook does
+# `METRIC_SLOTS[M_UPDATES_RECEIVED] += 1` with no dict hashing or .get();
+# names are attached only when /metrics is scraped
+METRIC_NAMES = ("updates_received", "updates_errors", "bookings_created", "bookings_cancelled",
+                "updates_dropped")
+(M_UPDATES_RECEIVED, M_UPDATES_ERRORS, M_BOOKINGS_CREATED, M_BOOKINGS_CANCELLED,
+ M_UPDATES_DROPPED) = range(len(METRIC_NAMES))
+METRIC_SLOTS = array('Q', [0] * len(METRIC_NAMES))
+
+METRIC_HELP = {
+    "updates_received": "Total updates received",
+    "updates_errors": "Total webhook errors",
+    "bookings_created": "Total bookings created",
+    "bookings_cancelled": "Total bookings cancelled",
+    "updates_dropped": "Total updates dropped because the update queue was full",
+}
+
+
+def metrics_snapshot() -> Dict[str, int]:
+    """Counter values by name, copied from the slots once (for /metrics.json)"""
+    return dict(zip(METRIC_NAMES, METRIC_SLOTS.tolist()))
+
+
+# Encoded once: "# HELP"/"# TYPE" lines plus the sample name, per slot
+_METRIC_PREFIXES = tuple(
+    f"# HELP fudly_{name} {METRIC_HELP[name]}\n# TYPE fudly_{name} counter\nfudly_{name} ".encode()
+    for name in METRIC_NAMES
+)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+
+def prometheus_metrics_body() -> bytes:
+    """Prometheus text exposition of the counters as bytes, for
+    web.Response(body=..., content_type=PROMETHEUS_CONTENT_TYPE).
+
+    Only the values are formatted per scrape, from one snapshot of the slots.
+    """
+    return b"".join(
+        prefix + b"%d\n" % value
+        for prefix, value in zip(_METRIC_PREFIXES, METRIC_SLOTS.tolist())
+    )
+
+
+# ============== WEBHOOK ==============
+
+async def read_update(request) -> Update:
+    """Parse a webhook POST body straight into an Update.
+
+    model_validate_json() lets pydantic-core parse the raw bytes, skipping
+    the request.json() -> dict -> model_validate() round trip.
+    """
+    raw = await request.read()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Update data: %s", raw[:2000])
+    return Update.model_validate_json(raw)
+
+
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '8'))
+UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE', '10000'))
+
+
+def update_chat_key(update) -> int:
+    """Chat id an update belongs to (sender id if it has no chat; 0 if neither).
+
+    Same key as ChatLockMiddleware: the chat of a message, or of the message
+    under a pressed button.
+    """
+    try:
+        event = update.event
+    except Exception:
+        return 0
+    chat = getattr(event, 'chat', None)
+    if chat is None:
+        chat = getattr(getattr(event, 'message', None), 'chat', None)
+    if chat is not None:
+        return chat.id
+    from_user = getattr(event, 'from_user', None)
+    return from_user.id if from_user is not None else 0
+
+
+class UpdateQueue:
+    """Bounded queues between the webhook and dp.feed_update(), one per worker.
+
+    The webhook put()s the parsed update and answers 200 at once, so
+    Telegram's request no longer waits for DB calls and API sends. Updates
+    are sharded by chat (update_chat_key() % workers): different chats run
+    concurrently, while one chat's updates are handled one at a time in
+    arrival order (registration steps, fast +1/-1 presses).
+    A full shard drops the update (counted in updates_dropped) rather than
+    making Telegram retry into the same backlog.
+    """
+
+    def __init__(self, dp, bot, workers: int = UPDATE_WORKERS, maxsize: int = UPDATE_QUEUE_SIZE):
+        self._dp = dp
+        self._bot = bot
+        self._workers_count = max(1, workers)
+        self._shard_size = max(1, maxsize // self._workers_count)
+        self._queues: list = []
+        # Strong references: the loop only keeps weak ones to running tasks
+        self._workers: list = []
+
+    def start(self) -> None:
+        # Created here, not in __init__: the queues and tasks need a running loop
+        if not self._queues:
+            self._queues = [asyncio.Queue(maxsize=self._shard_size) for _ in range(self._workers_count)]
+        self._workers = [asyncio.create_task(self._run(queue)) for queue in self._queues]
+
+    def put(self, update) -> bool:
+        """Enqueue without waiting; False if the chat's shard is full and the update was dropped"""
+        queue = self._queues[hash(update_chat_key(update)) % self._workers_count]
+        try:
+            queue.put_nowait(update)
+        except asyncio.QueueFull:
+            METRIC_SLOTS[M_UPDATES_DROPPED] += 1
+            logger.warning("Update queue full, dropping update %s", getattr(update, 'update_id', None))
+            return False
+        return True
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        while True:
+            update = await queue.get()
+            try:
+                await self._dp.feed_update(self._bot, update)
+            except Exception as e:
+                METRIC_SLOTS[M_UPDATES_ERRORS] += 1
+                logger.error("Update %s failed: %s", getattr(update, 'update_id', None), e, exc_info=True)
+            finally:
+                queue.task_done()
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Let the workers finish queued updates (already acknowledged to Telegram), then cancel them"""
+        if self._queues:
+            try:
+                await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues)), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Update queue not drained on shutdown: %s left",
+                               sum(q.qsize() for q in self._queues))
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+
+def setup_webhook_routes(app, update_queue: UpdateQueue, path: str = '/webhook',
+                         secret_token: Optional[str] = None) -> None:
+    """Register the webhook and metrics endpoints on an aiohttp web.Application.
+
+    Replaces the inline handlers of bot.py's webhook mode: POST bodies go
+    through read_update() into update_queue and are answered 200 at once;
+    /metrics serves prometheus_metrics_body(), /metrics.json the same
+    counters as JSON. Health and version endpoints stay in bot.py.
+    update_queue must be start()ed by the caller (on startup).
+    """
+    from aiohttp import web
+
+    async def webhook_handler(request):
+        if secret_token and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret_token:
+            logger.warning("Invalid secret token from %s", request.remote)
+            return web.Response(status=403, text="Forbidden")
+        try:
+            update = await read_update(request)
+        except Exception as e:
+            METRIC_SLOTS[M_UPDATES_ERRORS] += 1
+            logger.error("Webhook error: %s", e)
+            # 200 anyway: Telegram would keep retrying a body we cannot parse
+            return web.Response(status=200, text="OK")
+        METRIC_SLOTS[M_UPDATES_RECEIVED] += 1
+        update_queue.put(update)
+        return web.Response(status=200, text="OK")
+
+    async def webhook_get(_request):
+        return web.Response(status=200, text="OK")
+
+    async def metrics_prom(_request):
+        return web.Response(body=prometheus_metrics_body(), headers={'Content-Type': PROMETHEUS_CONTENT_TYPE})
+
+    async def metrics_json(_request):
+        return web.json_response(metrics_snapshot())
+
+    # With and without the trailing slash
+    path_main = path if path.startswith('/') else f'/{path}'
+    for route in dict.fromkeys((path_main, path_main.rstrip('/') + '/')):
+        app.router.add_post(route, webhook_handler)
+        app.router.add_get(route, webhook_get)
+    app.router.add_get('/metrics', metrics_prom)
+    app.router.add_get('/metrics.json', metrics_json)
+
 # ============== FSM STATES ==============
 
 class Registration(StatesGroup):
@@ -115,6 +548,124 @@ class BookOffer(StatesGroup):
     quantity = State()
 
 
+# ============== FALLBACK HANDLERS ==============
+
+def setup_debug_fallback(dp_or_router) -> bool:
+    """Register a last-resort text handler that logs unhandled messages.
+
+    Only with BOT_DEBUG=1: otherwise every stray message would pay for the
+    handler and the formatting. Must be registered after all other routers.
+    Returns True if the handler was registered.
+    """
+    if not BOT_DEBUG:
+        return False
+
+    @dp_or_router.message(F.text)
+    async def unknown_message_debug(message):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Unhandled message from %s: %r", message.from_user.id, message.text)
+
+    return True
+
+
+def setup_unknown_callback_fallback(dp) -> Router:
+    """Mount a terminal router that closes the spinner of unmatched callbacks.
+
+    Include it after all other routers: aiogram stops at the first matching
+    handler, so this only runs for callback_data nobody handles (stale
+    buttons etc.) instead of adding work to every click. Logging is at
+    DEBUG level and skipped entirely when DEBUG is off.
+    """
+    router = Router(name="unknown_callbacks")
+
+    @router.callback_query()
+    async def unknown_callback(callback):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Unhandled callback %r from %s", callback.data, callback.from_user.id)
+        try:
+            await callback.answer()
+        except Exception:
+            pass
+
+    dp.include_router(router)
+    return router
+
+
+# ============== MIDDLEWARE: PER-CHAT ORDERING ==============
+
+class ChatLockMiddleware(BaseMiddleware):
+    """Serialize callback handling per chat while other chats run concurrently.
+
+    Register on callback queries: dp.callback_query.middleware(ChatLockMiddleware()).
+    A slow upload or DB call for one seller only delays that seller's own
+    next press (keeping +1/-1 in order), not unrelated users.
+    """
+
+    def __init__(self):
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._waiters: Dict[int, int] = {}
+        super().__init__()
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        message = getattr(event, 'message', None)
+        chat_id = message.chat.id if message else getattr(event.from_user, 'id', None)
+        if chat_id is None:
+            return await handler(event, data)
+
+        lock = self._locks.get(chat_id)
+        if lock is None:
+            lock = self._locks[chat_id] = asyncio.Lock()
+        self._waiters[chat_id] = self._waiters.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                return await handler(event, data)
+        finally:
+            # Drop idle locks so the dict does not grow with every chat ever seen
+            remaining = self._waiters[chat_id] - 1
+            if remaining:
+                self._waiters[chat_id] = remaining
+            else:
+                del self._waiters[chat_id]
+                del self._locks[chat_id]
+
+
+# ============== MIDDLEWARE: USER CONTEXT ==============
+
+class UserContextMiddleware(BaseMiddleware):
+    """Resolve the users row once per event and expose it to handlers.
+
+    Register on messages and callback queries:
+        dp.message.middleware(UserContextMiddleware(db))
+        dp.callback_query.middleware(UserContextMiddleware(db))
+    Handlers then accept `user` (row or None) and `lang` instead of calling
+    db.get_user() and db.get_user_language() themselves; the language is
+    taken from the same row (users.language, index 5). If the outer
+    RegistrationCheckMiddleware already loaded the row, it is reused.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        super().__init__()
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        from_user = getattr(event, 'from_user', None)
+        if from_user is not None and 'user' not in data:
+            user = self.db.get_user(from_user.id)
+            data['user'] = user
+            data['lang'] = (user[5] if user and len(user) > 5 else None) or 'ru'
+        return await handler(event, data)
+
+
 # ============== MIDDLEWARE: REGISTRATION CHECK ==============
 
 class RegistrationCheckMiddleware(BaseMiddleware):
@@ -166,10 +717,13 @@ class RegistrationCheckMiddleware(BaseMiddleware):
                 # User is in registration process — allow
                 return await handler(event, data)
         
-        # Check user registration
+        # Check user registration; the row is passed on so handlers and
+        # UserContextMiddleware do not look it up again
         user = self.db.get_user(user_id)
+        lang = (user[5] if user and len(user) > 5 else None) or 'ru'
+        data['user'] = user
+        data['lang'] = lang
         if not user or not user[3]:  # user[3] is phone
-            lang = self.db.get_user_language(user_id) if user else 'ru'
             
             # If this is a message
             if event.message:
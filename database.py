@@ -1,8 +1,17 @@
 # type: ignore
+import asyncio
+import json
 import sqlite3
 import os
+import random
+import string
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from datetime import datetime, timedelta
-from typing import List, Optional, Tuple
+from typing import List, NamedTuple, Optional, Tuple
 
 # Простое логирование (fallback если нет logging_config)
 try:
@@ -32,25 +41,485 @@ except ImportError:
 # Module-level settings
 DB_PATH = os.environ.get('DATABASE_PATH', 'fudly.db')
 
+# Исходные колонки stores ([0]..[10]); для запросов, добавляющих поля после s.*,
+# чтобы добавленные позже avg_rating/ratings_count не сдвигали их индексы
+STORE_COLUMNS = (
+    's.store_id, s.owner_id, s.name, s.city, s.address, s.description, '
+    's.category, s.phone, s.status, s.rejection_reason, s.created_at'
+)
+
+# Исходные колонки bookings ([0]..[7]) вместо b.*: добавленный миграцией savings
+# (и quantity в старых БД) оказался бы в конце и сдвинул o.title, u.first_name...
+BOOKING_COLUMNS = (
+    'b.booking_id, b.offer_id, b.user_id, b.status, b.booking_code, '
+    'b.pickup_time, b.quantity, b.created_at'
+)
+
+# Пересчёт кэшированного рейтинга (stores.avg_rating / stores.ratings_count) по таблице ratings
+RECALC_STORE_RATING_SQL = '''
+    UPDATE stores SET
+        avg_rating = COALESCE((SELECT AVG(rating) FROM ratings r WHERE r.store_id = stores.store_id), 0),
+        ratings_count = (SELECT COUNT(*) FROM ratings r WHERE r.store_id = stores.store_id)
+'''
+
+# Новая бронь; savings (экономия покупателя) считается один раз при записи.
+# Параметры: (offer_id, user_id, booking_code, quantity, quantity, offer_id)
+INSERT_BOOKING_SQL = '''
+    INSERT INTO bookings (offer_id, user_id, booking_code, status, quantity, savings)
+    VALUES (?, ?, ?, 'pending', ?,
+            (SELECT (original_price - discount_price) * ? FROM offers WHERE offer_id = ?))
+'''
+
+# Счётчики бронирований по статусам (store_booking_counts): +delta для магазина товара
+BUMP_BOOKING_COUNT_SQL = '''
+    INSERT INTO store_booking_counts (store_id, status, count)
+    SELECT store_id, ?, ? FROM offers WHERE offer_id = ?
+    ON CONFLICT(store_id, status) DO UPDATE SET count = count + excluded.count
+'''
+
+# Полный пересчёт счётчиков из bookings (бэкфилл и массовые удаления)
+REBUILD_BOOKING_COUNTS_SQL = '''
+    INSERT INTO store_booking_counts (store_id, status, count)
+    SELECT o.store_id, b.status, COUNT(*)
+    FROM bookings b
+    JOIN offers o ON b.offer_id = o.offer_id
+'''
+
+# Дневная сводка магазина (daily_stats) по дате создания брони: bookings - все брони,
+# orders/items/revenue/savings - только неотменённые. Параметры:
+# (d_bookings, d_orders x4, booking_id), d_orders = +1/-1/0
+RECORD_BOOKING_DELTA_SQL = '''
+    INSERT INTO daily_stats (date, store_id, bookings, orders, items, revenue, savings)
+    SELECT DATE(b.created_at), o.store_id, ?, ?,
+           ? * COALESCE(b.quantity, 1),
+           ? * o.discount_price * COALESCE(b.quantity, 1),
+           ? * (o.original_price - o.discount_price) * COALESCE(b.quantity, 1)
+    FROM bookings b
+    JOIN offers o ON b.offer_id = o.offer_id
+    WHERE b.booking_id = ?
+    ON CONFLICT(date, store_id) DO UPDATE SET
+        bookings = bookings + excluded.bookings,
+        orders = orders + excluded.orders,
+        items = items + excluded.items,
+        revenue = revenue + excluded.revenue,
+        savings = savings + excluded.savings
+'''
+
+REBUILD_DAILY_STATS_SQL = '''
+    INSERT INTO daily_stats (date, store_id, bookings, orders, items, revenue, savings)
+    SELECT DATE(b.created_at), o.store_id, COUNT(*),
+           SUM(b.status != 'cancelled'),
+           SUM(CASE WHEN b.status != 'cancelled' THEN COALESCE(b.quantity, 1) ELSE 0 END),
+           SUM(CASE WHEN b.status != 'cancelled'
+               THEN o.discount_price * COALESCE(b.quantity, 1) ELSE 0 END),
+           SUM(CASE WHEN b.status != 'cancelled'
+               THEN (o.original_price - o.discount_price) * COALESCE(b.quantity, 1) ELSE 0 END)
+    FROM bookings b
+    JOIN offers o ON b.offer_id = o.offer_id
+'''
+
+# Итоги за всё время (lifetime_stats: ключ -> значение) с теми же дельтами, что и
+# daily_stats. Параметры: (booking_id, d_bookings, d_orders x4)
+RECORD_LIFETIME_DELTA_SQL = '''
+    WITH d AS (
+        SELECT COALESCE(b.quantity, 1) AS q, o.discount_price AS price,
+               o.original_price - o.discount_price AS saved
+        FROM bookings b
+        JOIN offers o ON b.offer_id = o.offer_id
+        WHERE b.booking_id = ?
+    )
+    INSERT INTO lifetime_stats (k, v)
+    SELECT 'bookings', ? FROM d
+    UNION ALL SELECT 'orders', ? FROM d
+    UNION ALL SELECT 'items', ? * q FROM d
+    UNION ALL SELECT 'revenue', ? * price * q FROM d
+    UNION ALL SELECT 'savings', ? * saved * q FROM d WHERE true
+    ON CONFLICT(k) DO UPDATE SET v = v + excluded.v
+'''
+
+# Пересчёт lifetime_stats из daily_stats (после бэкфилла и удалений магазинов/пользователей)
+REBUILD_LIFETIME_STATS_SQL = '''
+    INSERT OR REPLACE INTO lifetime_stats (k, v)
+    SELECT 'bookings', COALESCE(SUM(bookings), 0) FROM daily_stats
+    UNION ALL SELECT 'orders', COALESCE(SUM(orders), 0) FROM daily_stats
+    UNION ALL SELECT 'items', COALESCE(SUM(items), 0) FROM daily_stats
+    UNION ALL SELECT 'revenue', COALESCE(SUM(revenue), 0) FROM daily_stats
+    UNION ALL SELECT 'savings', COALESCE(SUM(savings), 0) FROM daily_stats
+'''
+
+# Самые бронируемые товары магазина за день (store_daily_top): +/-1 неотменённая бронь.
+# Параметры: (delta, booking_id)
+BUMP_DAILY_TOP_SQL = '''
+    INSERT INTO store_daily_top (date, store_id, offer_title, cnt)
+    SELECT DATE(b.created_at), o.store_id, o.title, ?
+    FROM bookings b
+    JOIN offers o ON b.offer_id = o.offer_id
+    WHERE b.booking_id = ?
+    ON CONFLICT(date, store_id, offer_title) DO UPDATE SET cnt = cnt + excluded.cnt
+'''
+
+REBUILD_DAILY_TOP_SQL = '''
+    INSERT INTO store_daily_top (date, store_id, offer_title, cnt)
+    SELECT DATE(b.created_at), o.store_id, o.title, SUM(b.status != 'cancelled')
+    FROM bookings b
+    JOIN offers o ON b.offer_id = o.offer_id
+'''
+
+# Сводные таблицы по bookings: (таблица, SQL пересчёта, GROUP BY)
+BOOKING_ROLLUPS = (
+    ('store_booking_counts', REBUILD_BOOKING_COUNTS_SQL, 'o.store_id, b.status'),
+    ('daily_stats', REBUILD_DAILY_STATS_SQL, 'DATE(b.created_at), o.store_id'),
+    ('store_daily_top', REBUILD_DAILY_TOP_SQL, 'DATE(b.created_at), o.store_id, o.title'),
+)
+
+# Счётчики админ-панели (get_dashboard_counts). Готовые строки, а не сборка при
+# каждом вызове: кэш подготовленных выражений sqlite3 (cached_statements) ищет по
+# тексту SQL. Ключ: (из _counts, с разделом 'today')
+_DASHBOARD_FROM_COUNTS = "SELECT table_name, NULLIF(key, ''), n FROM _counts WHERE n > 0"
+_DASHBOARD_GROUP_BY = '''
+    SELECT 'users', role, COUNT(*) FROM users GROUP BY role
+    UNION ALL SELECT 'stores', status, COUNT(*) FROM stores GROUP BY status
+    UNION ALL SELECT 'offers', status, COUNT(*) FROM offers GROUP BY status
+    UNION ALL SELECT 'bookings', status, COUNT(*) FROM bookings GROUP BY status
+'''
+# Параметры: (date, day_start, next_day, date)
+_DASHBOARD_TODAY = '''
+    UNION ALL SELECT 'today', 'bookings', COALESCE(SUM(bookings), 0) FROM daily_stats WHERE date = ?
+    UNION ALL SELECT 'today', 'users', COUNT(*) FROM users WHERE created_at >= ? AND created_at < ?
+    UNION ALL SELECT 'today', 'revenue', COALESCE(SUM(revenue), 0) FROM daily_stats WHERE date = ?
+'''
+DASHBOARD_COUNTS_SQL = {
+    (True, False): _DASHBOARD_FROM_COUNTS,
+    (True, True): _DASHBOARD_FROM_COUNTS + _DASHBOARD_TODAY,
+    (False, False): _DASHBOARD_GROUP_BY,
+    (False, True): _DASHBOARD_GROUP_BY + _DASHBOARD_TODAY,
+}
+
+# Отчёт аналитики (get_analytics_report) одним запросом: (раздел, ключ, n, a, b).
+# Ключ: use_counts_table
+_ANALYTICS_REST = '''
+    UNION ALL SELECT 'offers', status, COUNT(*), SUM(original_price), SUM(discount_price)
+        FROM offers GROUP BY status
+    UNION ALL SELECT 'bookings', status, COUNT(*), SUM(COALESCE(quantity, 1)), NULL
+        FROM bookings GROUP BY status
+    UNION ALL SELECT 'lifetime', k, v, NULL, NULL FROM lifetime_stats
+'''
+ANALYTICS_REPORT_SQL = {
+    True: '''
+    SELECT table_name, NULLIF(key, ''), n, NULL, NULL FROM _counts
+        WHERE table_name IN ('users', 'stores') AND n > 0
+    ''' + _ANALYTICS_REST,
+    False: '''
+    SELECT 'users', role, COUNT(*), NULL, NULL FROM users GROUP BY role
+    UNION ALL SELECT 'stores', status, COUNT(*), NULL, NULL FROM stores GROUP BY status
+    ''' + _ANALYTICS_REST,
+}
+
+# Топы аналитики одним запросом: (раздел, название, количество), по LIMIT ? в каждом
+# разделе. Магазины - из store_booking_counts, покупатели - по неотменённым броням
+ANALYTICS_TOPS_SQL = '''
+    SELECT * FROM (
+        SELECT 'stores', s.name, SUM(c.count) AS n
+        FROM store_booking_counts c JOIN stores s ON s.store_id = c.store_id
+        WHERE c.status != 'cancelled'
+        GROUP BY c.store_id HAVING n > 0 ORDER BY n DESC LIMIT ?
+    )
+    UNION ALL SELECT * FROM (
+        SELECT 'customers', COALESCE(u.first_name, u.username, b.user_id), COUNT(*) AS n
+        FROM bookings b JOIN users u ON u.user_id = b.user_id
+        WHERE b.status != 'cancelled'
+        GROUP BY b.user_id ORDER BY n DESC LIMIT ?
+    )
+    UNION ALL SELECT * FROM (
+        SELECT 'cities', city, COUNT(*) AS n FROM stores
+        WHERE status = 'active' GROUP BY city ORDER BY n DESC LIMIT ?
+    )
+    UNION ALL SELECT * FROM (
+        SELECT 'categories', category, COUNT(*) AS n FROM stores
+        WHERE status = 'active' GROUP BY category ORDER BY n DESC LIMIT ?
+    )
+'''
+
+# Допустимые сортировки get_stores_by_category (значения подставляются в SQL как есть)
+STORES_BY_CATEGORY_ORDER = {
+    'rating': 'avg_rating DESC, ratings_count DESC, name',
+    'name': 'name',
+}
+
+# Таблицы и колонки, по которым _counts хранит количество строк (поддерживается триггерами)
+COUNTED_COLUMNS = (
+    ('users', 'role'),
+    ('stores', 'status'),
+    ('offers', 'status'),
+    ('bookings', 'status'),
+)
+
+
+class TTLCache:
+    """Небольшой in-process кэш с TTL и LRU-вытеснением (без внешних зависимостей).
+
+    Методы Database вызываются и из event loop, и из потоков (Database.run),
+    поэтому операции с OrderedDict защищены блокировкой.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            if item[0] < time.monotonic():
+                self._data.pop(key, None)
+                return default
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[1] if item is not None else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class Offer(NamedTuple):
+    """Строка товара с полями магазина (порядок совпадает с документацией get_offer).
+
+    Остаётся кортежем, поэтому старый доступ offer[N] продолжает работать,
+    но новый код должен использовать offer.title, offer.expiry_date и т.д.
+    """
+    offer_id: int
+    store_id: int
+    title: str
+    description: Optional[str]
+    original_price: float
+    discount_price: float
+    quantity: int
+    available_from: Optional[str]
+    available_until: Optional[str]
+    status: str
+    photo: Optional[str]
+    created_at: Optional[str]
+    expiry_date: Optional[str]
+    unit: Optional[str]
+    category: Optional[str]
+    store_name: Optional[str]
+    store_address: Optional[str]
+    store_city: Optional[str]
+    store_category: Optional[str]
+
+
+# Явный список колонок вместо o.*: в старых (ALTER TABLE) и новых (CREATE TABLE)
+# базах физический порядок колонок offers разный, а индексы должны совпадать
+OFFER_COLUMNS = (
+    'o.offer_id, o.store_id, o.title, o.description, o.original_price, o.discount_price, '
+    'o.quantity, o.available_from, o.available_until, o.status, o.photo, o.created_at, '
+    'o.expiry_date, o.unit, o.category, s.name, s.address, s.city, s.category'
+)
+
+# Активные товары активных магазинов (как в get_active_offers без фильтров): общие
+# FROM/WHERE для страницы и для COUNT(*), чтобы итог всегда совпадал со списком
+ACTIVE_OFFERS_FROM = '''
+    FROM offers o
+    JOIN stores s ON o.store_id = s.store_id
+    WHERE o.status = 'active' AND o.quantity > 0 AND s.status = 'active'
+        AND date(o.expiry_date) >= date('now')
+'''
+
+
+class BookingBundle(NamedTuple):
+    """Всё, что нужно после подтверждения выдачи: бронь, товар, магазин и язык покупателя.
+
+    booking - как get_booking(), offer - Offer, store - как get_store()
+    ([0]..[10] + avg_rating, ratings_count).
+    """
+    booking: Tuple
+    offer: Offer
+    store: Tuple
+    customer_lang: str
+
+
+# Список id одним параметром (JSON-массив): текст SQL не зависит от длины списка,
+# поэтому подготовленное выражение переиспользуется для любого партнёра
+IN_JSON_IDS = 'IN (SELECT value FROM json_each(?))'
+
+
+def _json_ids(ids) -> str:
+    """Параметр для IN_JSON_IDS"""
+    return json.dumps(list(ids))
+
+
+@lru_cache(maxsize=64)
+def _placeholders(count: int) -> str:
+    """'?, ?, ?' для IN (...) из count параметров"""
+    return ', '.join('?' * count)
+
+
+def _day_range(day: str) -> Tuple[str, str]:
+    """Полуоткрытый интервал [day, day+1) для created_at >= ? AND created_at < ?
+
+    В отличие от DATE(created_at) = ? такое условие может использовать индекс.
+    """
+    next_day = datetime.strptime(day, '%Y-%m-%d') + timedelta(days=1)
+    return day, next_day.strftime('%Y-%m-%d')
+
+
+def _offer_row(cursor, row) -> Offer:
+    """row_factory для курсоров, выбирающих OFFER_COLUMNS"""
+    return Offer._make(row)
+
+
+class _PooledConnection:
+    """Обёртка над sqlite3.Connection: close() возвращает соединение в пул потока.
+
+    Код, написанный в стиле `conn = db.get_connection(); ...; conn.close()`,
+    продолжает работать без изменений, но файл БД не переоткрывается,
+    а кэш страниц и подготовленных выражений сохраняется между вызовами.
+    """
+    __slots__ = ('_conn', '_pool')
+
+    def __init__(self, conn: sqlite3.Connection, pool: threading.local):
+        self._conn = conn
+        self._pool = pool
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        # conn.row_factory = ... и т.п. должны попасть в настоящее соединение
+        if name in _PooledConnection.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._conn, name, value)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def close(self):
+        conn = self._conn
+        if conn is None:
+            return
+        self._conn = None
+        try:
+            # Незакоммиченное откатываем - как при настоящем закрытии
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        if getattr(self._pool, 'conn', None) is None:
+            # Настройки, выставленные вызывающим, не должны достаться следующему
+            conn.row_factory = None
+            self._pool.conn = conn
+        else:
+            conn.close()
+
+
 class Database:
     def __init__(self, db_name: str = "fudly.db"):
         self.db_name = db_name or DB_PATH
+        # Одно свободное соединение на поток (sqlite3 привязывает соединение к потоку)
+        self._pool = threading.local()
+        # Язык читается почти в каждом хендлере - держим его в памяти
+        self._lang_cache = TTLCache(maxsize=50000, ttl=int(os.environ.get('LANG_CACHE_TTL', 300)))
+        # Строка users (роль, телефон, город, уведомления) читается почти в каждом callback
+        self._user_cache = TTLCache(maxsize=100000, ttl=int(os.environ.get('USER_CACHE_TTL', 300)))
+        # Магазины владельца проверяются почти в каждом callback партнёра
+        self._stores_cache = TTLCache(maxsize=10000, ttl=int(os.environ.get('STORES_CACHE_TTL', 60)))
+        # Счётчики админ-панели из _counts (False - прямые COUNT(*), например для сверки)
+        self.use_counts_table = True
+        # Карточки товаров перечитываются на каждое нажатие +1/-1/продлить
+        self._offer_cache = TTLCache(maxsize=10000, ttl=int(os.environ.get('OFFER_CACHE_TTL', 60)))
+        # Множество admin id: is_admin проверяется в каждом admin-callback,
+        # а меняется только через set_admin/delete_user (там же сбрасывается)
+        self._admin_ids: Optional[frozenset] = None
+        self._admin_ids_loaded = 0.0
+        self._admin_ids_ttl = int(os.environ.get('ADMIN_CACHE_TTL', 300))
+        self._admin_lock = threading.Lock()
+        # Свой пул потоков для БД: запросы не конкурируют с прочими to_thread-задачами,
+        # а число потоков (и их соединений из _pool) ограничено DB_THREADS.
+        # Каждый поток при старте открывает своё соединение и держит его до конца
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.environ.get('DB_THREADS', 4)), thread_name_prefix='db',
+            initializer=self._warm_connection
+        )
+        # Запись в SQLite всё равно идёт по одной: async-записи ждут здесь,
+        # а не занимают потоки пула в busy-ожидании
+        self._write_lock = asyncio.Lock()
         self.init_db()
     
-    def get_connection(self):
-        """Возвращает подключение к базе данных"""
-        conn = sqlite3.connect(self.db_name, timeout=int(os.environ.get('DB_TIMEOUT', 30)))
-        try:
-            conn.execute('PRAGMA journal_mode=WAL')
+    def _connect(self) -> sqlite3.Connection:
+        """Открыть новое соединение и один раз настроить его PRAGMA.
+
+        journal_mode=WAL хранится в самом файле БД и включается один раз в init_db;
+        здесь - только настройки, действующие в пределах соединения.
+        """
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=int(os.environ.get('DB_TIMEOUT', 30)),
+            cached_statements=256,
+        )
+        try:
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            # Отрицательное значение - размер кэша страниц в КиБ (по умолчанию ~64 МБ)
+            conn.execute(f"PRAGMA cache_size=-{int(os.environ.get('DB_CACHE_SIZE_KB', 64000))}")
+            # Чтение страниц через mmap вместо read() в буфер (0 - выключить)
+            conn.execute(f"PRAGMA mmap_size={int(os.environ.get('DB_MMAP_SIZE', 268435456))}")
         except Exception:
             pass
         return conn
+
+    def _warm_connection(self):
+        """Открыть и положить в пул соединение текущего потока (initializer пула БД)"""
+        try:
+            self.get_connection().close()
+        except sqlite3.Error as e:
+            logger.warning("DB worker connection warm-up failed: %s", e)
+
+    def get_connection(self):
+        """Возвращает подключение к базе данных.
+
+        Соединение берётся из пула текущего потока и возвращается туда при
+        conn.close(); вложенные вызовы получают отдельное соединение.
+        """
+        conn = getattr(self._pool, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+        else:
+            self._pool.conn = None
+            if conn.in_transaction:
+                # Предыдущий вызов упал, не дойдя до commit/close
+                conn.rollback()
+        return _PooledConnection(conn, self._pool)
     
     def init_db(self):
         """Инициализация базы данных"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
+        # WAL: читатели (админ-отчёты) не ждут писателей (брони, товары)
+        journal_mode = cursor.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+        if journal_mode != 'wal':
+            logger.warning("SQLite WAL not enabled for %s (journal_mode=%s)", self.db_name, journal_mode)
+        
         # Таблица пользователей
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -128,6 +597,16 @@ class Database:
         except:
             pass  # Поле уже существует
         
+        # Кэшированный рейтинг магазина: [11] avg_rating, [12] ratings_count
+        try:
+            cursor.execute('ALTER TABLE stores ADD COLUMN avg_rating REAL DEFAULT 0')
+            cursor.execute('ALTER TABLE stores ADD COLUMN ratings_count INTEGER DEFAULT 0')
+            # Заполняем по уже существующим отзывам
+            cursor.execute(RECALC_STORE_RATING_SQL)
+            conn.commit()
+        except Exception:
+            pass  # Поля уже существуют
+        
         # Добавляем поле expiry_date если его нет (для старых БД)
         try:
             cursor.execute('ALTER TABLE offers ADD COLUMN expiry_date TEXT')
@@ -193,6 +672,105 @@ class Database:
             )
         ''')
         
+        # Счётчики бронирований магазина по статусам: экран статистики читает
+        # несколько строк вместо пересчёта всей истории bookings
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'store_booking_counts'")
+        booking_counts_exist = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS store_booking_counts (
+                store_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (store_id, status)
+            ) WITHOUT ROWID
+        ''')
+        if not booking_counts_exist:
+            cursor.execute(REBUILD_BOOKING_COUNTS_SQL + ' GROUP BY o.store_id, b.status')
+            conn.commit()
+        
+        # Дневная сводка по магазинам: выручка/брони за день без JOIN и DATE() по всей bookings
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_stats'")
+        daily_stats_exist = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_stats (
+                date TEXT NOT NULL,
+                store_id INTEGER NOT NULL,
+                bookings INTEGER NOT NULL DEFAULT 0,
+                orders INTEGER NOT NULL DEFAULT 0,
+                items INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                savings REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (date, store_id)
+            ) WITHOUT ROWID
+        ''')
+        if not daily_stats_exist:
+            cursor.execute(REBUILD_DAILY_STATS_SQL + ' GROUP BY DATE(b.created_at), o.store_id')
+            conn.commit()
+        
+        # Итоги за всё время для детальной статистики - без SUM по всей bookings
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'lifetime_stats'")
+        lifetime_stats_exist = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS lifetime_stats (
+                k TEXT PRIMARY KEY,
+                v REAL NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+        if not lifetime_stats_exist:
+            cursor.execute(REBUILD_LIFETIME_STATS_SQL)
+            conn.commit()
+        
+        # Топ товаров магазина за день: "хит дня" партнёра - одно чтение по индексу
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'store_daily_top'")
+        daily_top_exist = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS store_daily_top (
+                date TEXT NOT NULL,
+                store_id INTEGER NOT NULL,
+                offer_title TEXT NOT NULL,
+                cnt INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (date, store_id, offer_title)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute(
+            'CREATE INDEX IF NOT EXISTS idx_store_daily_top_rank ON store_daily_top(date, store_id, cnt DESC)'
+        )
+        if not daily_top_exist:
+            cursor.execute(REBUILD_DAILY_TOP_SQL + ' GROUP BY DATE(b.created_at), o.store_id, o.title')
+            conn.commit()
+        
+        # Количество строк users/stores/offers/bookings по роли/статусу - COUNT(*) в
+        # SQLite всегда сканирует таблицу, а админ-панель читает эти числа постоянно
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '_counts'")
+        counts_exist = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS _counts (
+                table_name TEXT NOT NULL,
+                key TEXT NOT NULL,
+                n INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (table_name, key)
+            ) WITHOUT ROWID
+        ''')
+        for table, column in COUNTED_COLUMNS:
+            bump = '''
+                INSERT INTO _counts (table_name, key, n) VALUES ('{t}', COALESCE({row}.{c}, ''), {d})
+                ON CONFLICT(table_name, key) DO UPDATE SET n = n + excluded.n;
+            '''
+            inc = bump.format(t=table, c=column, row='NEW', d=1)
+            dec = bump.format(t=table, c=column, row='OLD', d=-1)
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {table}_counts_ai AFTER INSERT ON {table} BEGIN {inc} END')
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {table}_counts_ad AFTER DELETE ON {table} BEGIN {dec} END')
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {table}_counts_au AFTER UPDATE OF {column} ON {table} '
+                f'WHEN OLD.{column} IS NOT NEW.{column} BEGIN {dec} {inc} END'
+            )
+            if not counts_exist:
+                cursor.execute(
+                    f"INSERT INTO _counts (table_name, key, n) "
+                    f"SELECT '{table}', COALESCE({column}, ''), COUNT(*) FROM {table} GROUP BY 1, 2"
+                )
+        conn.commit()
+        
         # Таблица избранных магазинов
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS favorites (
@@ -255,6 +833,19 @@ class Database:
         except:
             pass
         
+        # Экономия покупателя по брони - для SUM(savings) без JOIN offers
+        try:
+            cursor.execute('ALTER TABLE bookings ADD COLUMN savings REAL')
+            cursor.execute('''
+                UPDATE bookings SET savings = (
+                    SELECT (o.original_price - o.discount_price) * COALESCE(bookings.quantity, 1)
+                    FROM offers o WHERE o.offer_id = bookings.offer_id
+                )
+            ''')
+            conn.commit()
+        except sqlite3.OperationalError:
+            pass
+        
         # Добавляем поле referral_code в users если его нет
         try:
             cursor.execute('ALTER TABLE users ADD COLUMN referral_code TEXT UNIQUE')
@@ -284,7 +875,39 @@ class Database:
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_ratings_store ON ratings(store_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_ratings_user ON ratings(user_id)')
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_favorites_user_store ON favorites(user_id, store_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_stores_owner_status ON stores(owner_id, status)')
+            # Брони магазина: offers(store_id, status) -> bookings(offer_id, status) без сканирования
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookings_offer_status ON bookings(offer_id, status)')
+            # Админ-списки броней по статусу (новые сверху) и сводки по статусам с quantity
+            # (get_booking_status_totals, get_analytics_report) - только по индексу
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookings_status_created ON bookings(status, created_at DESC)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookings_status_offer ON bookings(status, offer_id, quantity)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookings_status_savings ON bookings(status, savings)')
+            # Диапазонные условия по датам (новые пользователи за день, истёкшие товары)
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_offers_status_expiry ON offers(status, expiry_date)')
+            # Витрина по категории (с городом и без) - только одобренные магазины
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_stores_active_category_city
+                ON stores(category, city) WHERE status = 'active'
+            ''')
+            # Оценка магазина без бронирования - одна на пользователя (для upsert_store_rating).
+            # Старые дубли схлопываем до последней оценки, иначе уникальный индекс не создать
+            cursor.execute('''
+                DELETE FROM ratings
+                WHERE booking_id IS NULL AND rating_id NOT IN (
+                    SELECT MAX(rating_id) FROM ratings WHERE booking_id IS NULL GROUP BY store_id, user_id
+                )
+            ''')
+            if cursor.rowcount:
+                cursor.execute(RECALC_STORE_RATING_SQL)
+            cursor.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS ux_ratings_store_user
+                ON ratings(store_id, user_id) WHERE booking_id IS NULL
+            ''')
             conn.commit()
+            # ANALYZE только для таблиц, где статистика устарела или отсутствует
+            cursor.execute('PRAGMA optimize')
         except Exception:
             pass
         finally:
@@ -306,23 +929,36 @@ class Database:
             conn.close()
         except Exception:
             pass
+        self.invalidate_user(user_id)
         try:
             cache.delete('offers:all')
         except Exception:
             pass
     
     def get_user(self, user_id: int) -> Optional[Tuple]:
+        """Строка users (кэшируется в памяти на USER_CACHE_TTL секунд; сбрасывается при записи)"""
+        user = self._user_cache.get(user_id)
+        if user is not None:
+            return user
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
             user = cursor.fetchone()
-            return user
         finally:
             try:
                 conn.close()
             except Exception:
                 pass
+        # Незарегистрированных не кэшируем: add_user должен быть виден сразу
+        if user is not None:
+            self._user_cache.set(user_id, user)
+        return user
+
+    def invalidate_user(self, user_id: int):
+        """Сбросить кэш строки пользователя и его языка (после любой записи в users)"""
+        self._user_cache.pop(user_id)
+        self._lang_cache.pop(user_id)
     
     def update_user_city(self, user_id: int, city: str):
         conn = self.get_connection()
@@ -335,6 +971,7 @@ class Database:
                 conn.close()
             except Exception:
                 pass
+        self.invalidate_user(user_id)
     
     def update_user_role(self, user_id: int, role: str):
         conn = self.get_connection()
@@ -347,6 +984,7 @@ class Database:
                 conn.close()
             except Exception:
                 pass
+        self.invalidate_user(user_id)
     
     def update_user_phone(self, user_id: int, phone: str):
         conn = self.get_connection()
@@ -359,6 +997,7 @@ class Database:
                 conn.close()
             except Exception:
                 pass
+        self.invalidate_user(user_id)
     
     def update_user_language(self, user_id: int, language: str):
         """Обновить язык пользователя"""
@@ -367,15 +1006,25 @@ class Database:
         cursor.execute('UPDATE users SET language = ? WHERE user_id = ?', (language, user_id))
         conn.commit()
         conn.close()
+        self.invalidate_user(user_id)
     
     def get_user_language(self, user_id: int) -> str:
-        """Получить язык пользователя"""
+        """Получить язык пользователя (кэшируется в памяти на LANG_CACHE_TTL секунд)"""
+        lang = self._lang_cache.get(user_id)
+        if lang is not None:
+            return lang
+        user = self._user_cache.get(user_id)
+        if user is not None:
+            return user[5] or 'ru'
+
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('SELECT language FROM users WHERE user_id = ?', (user_id,))
         result = cursor.fetchone()
         conn.close()
-        return result[0] if result else 'ru'
+        lang = result[0] if result else 'ru'
+        self._lang_cache.set(user_id, lang)
+        return lang
     
     # Методы для магазинов
     def add_store(self, owner_id: int, name: str, city: str, address: Optional[str] = None, description: Optional[str] = None, category: str = 'Ресторан', phone: Optional[str] = None) -> int:
@@ -397,14 +1046,25 @@ class Database:
             cache.delete('offers:all')
         except Exception:
             pass
+        self.invalidate_user_stores(owner_id)
         return store_id
+
+    def invalidate_user_stores(self, owner_id: int):
+        """Сбросить кэш магазинов владельца (вызывать после любых изменений его магазинов)"""
+        for kind in ('all', 'approved', 'ids'):
+            self._stores_cache.pop((kind, owner_id))
     
     def get_user_stores(self, owner_id: int) -> List[Tuple]:
         """Получить ВСЕ магазины пользователя (любой статус)"""
+        key = ('all', owner_id)
+        stores = self._stores_cache.get(key)
+        if stores is not None:
+            return stores
+
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT s.*, u.first_name, u.username 
+        cursor.execute(f'''
+            SELECT {STORE_COLUMNS}, u.first_name, u.username
             FROM stores s
             LEFT JOIN users u ON s.owner_id = u.user_id
             WHERE s.owner_id = ?
@@ -412,21 +1072,37 @@ class Database:
         ''', (owner_id,))
         stores = cursor.fetchall()
         conn.close()
+        self._stores_cache.set(key, stores)
         return stores
     
     def get_approved_stores(self, owner_id: int) -> List[Tuple]:
         """Получить только ОДОБРЕННЫЕ магазина пользователя"""
+        key = ('approved', owner_id)
+        stores = self._stores_cache.get(key)
+        if stores is not None:
+            return stores
+
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM stores WHERE owner_id = ? AND status = "active"', (owner_id,))
             stores = cursor.fetchall()
+            self._stores_cache.set(key, stores)
             return stores
         finally:
             try:
                 conn.close()
             except Exception:
                 pass
+
+    def get_user_store_ids(self, owner_id: int) -> set:
+        """ID всех магазинов владельца - для O(1) проверки владения товаром"""
+        key = ('ids', owner_id)
+        store_ids = self._stores_cache.get(key)
+        if store_ids is None:
+            store_ids = {store[0] for store in self.get_user_stores(owner_id)}
+            self._stores_cache.set(key, store_ids)
+        return store_ids
     
     def get_store(self, store_id: int) -> Optional[Tuple]:
         key = f'store:{store_id}'
@@ -482,8 +1158,6 @@ class Database:
         """
         Преобразует различные форматы времени в стандартный формат YYYY-MM-DD HH:MM
         """
-        from datetime import datetime, timedelta
-        
         if not time_input:
             return ""
             
@@ -565,7 +1239,7 @@ class Database:
         except Exception:
             pass
         return offer_id
-    
+
     def get_active_offers(self, city: str = None, store_id: int = None) -> List[Tuple]:
         # Cache keys: offers:all, offers:city:<city>, offers:store:<id>
         cache_key = 'offers:all'
@@ -582,11 +1256,12 @@ class Database:
 
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.row_factory = _offer_row
         
         if store_id:
             # Фильтр по конкретному магазину
-            cursor.execute('''
-                SELECT o.*, s.name as store_name, s.address, s.city, s.category
+            cursor.execute(f'''
+                SELECT {OFFER_COLUMNS}
                 FROM offers o
                 JOIN stores s ON o.store_id = s.store_id
                 WHERE o.status = 'active' AND o.quantity > 0 AND s.store_id = ? AND s.status = 'active'
@@ -595,8 +1270,8 @@ class Database:
             ''', (store_id,))
         elif city:
             # Фильтр по городу
-            cursor.execute('''
-                SELECT o.*, s.name as store_name, s.address, s.city, s.category
+            cursor.execute(f'''
+                SELECT {OFFER_COLUMNS}
                 FROM offers o
                 JOIN stores s ON o.store_id = s.store_id
                 WHERE o.status = 'active' AND o.quantity > 0 AND s.city = ? AND s.status = 'active'
@@ -605,8 +1280,8 @@ class Database:
             ''', (city,))
         else:
             # Все предложения
-            cursor.execute('''
-                SELECT o.*, s.name as store_name, s.address, s.city, s.category
+            cursor.execute(f'''
+                SELECT {OFFER_COLUMNS}
                 FROM offers o
                 JOIN stores s ON o.store_id = s.store_id
                 WHERE o.status = 'active' AND o.quantity > 0 AND s.status = 'active'
@@ -621,16 +1296,15 @@ class Database:
             pass
         
         # Фильтруем товары с истёкшим сроком годности
-        from datetime import datetime
         valid_offers = []
         for offer in offers:
-            # Проверяем срок годности если он указан (индекс 12 - expiry_date после ALTER TABLE)
-            if len(offer) > 12 and offer[12]:
+            # Проверяем срок годности если он указан
+            if offer.expiry_date:
                 try:
                     # Преобразуем дату из формата DD.MM.YYYY или YYYY-MM-DD
-                    expiry_str = str(offer[12])
+                    expiry_str = str(offer.expiry_date).strip()
                     if '.' in expiry_str:
-                        expiry_parts = expiry_str.split('.')
+                        expiry_parts = expiry_str.split('.', 2)
                         if len(expiry_parts) == 3:
                             expiry_date = datetime(int(expiry_parts[2]), int(expiry_parts[1]), int(expiry_parts[0]))
                         else:
@@ -657,10 +1331,35 @@ class Database:
 
         return valid_offers
     
-    def get_offer(self, offer_id: int) -> Optional[Tuple]:
+    def get_active_offers_page(self, limit: int = 10, offset: int = 0) -> Tuple[List[Offer], int]:
+        """Новые активные товары (LIMIT/OFFSET в SQL) и их общее число для админки.
+
+        Returns:
+            (offers, total)
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) ' + ACTIVE_OFFERS_FROM)
+            total = cursor.fetchone()[0]
+            cursor.row_factory = _offer_row
+            cursor.execute(
+                f'SELECT {OFFER_COLUMNS} {ACTIVE_OFFERS_FROM} '
+                'ORDER BY o.created_at DESC, o.offer_id DESC LIMIT ? OFFSET ?',
+                (limit, max(offset, 0))
+            )
+            offers = cursor.fetchall()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        return offers, total
+
+    def get_offer(self, offer_id: int) -> Optional[Offer]:
         """Получить предложение с информацией о магазине.
         
-        Returns tuple structure (АКТУАЛЬНАЯ структура после ALTER TABLE):
+        Returns Offer (NamedTuple) со структурой:
         [0] offer_id
         [1] store_id
         [2] title
@@ -682,16 +1381,23 @@ class Database:
         [17] city (from stores)
         [18] category (from stores - category магазина)
         """
+        offer = self._offer_cache.get(offer_id)
+        if offer is not None:
+            return offer
+
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT o.*, s.name as store_name, s.address, s.city, s.category
+            cursor.row_factory = _offer_row
+            cursor.execute(f'''
+                SELECT {OFFER_COLUMNS}
                 FROM offers o
                 JOIN stores s ON o.store_id = s.store_id
                 WHERE o.offer_id = ?
             ''', (offer_id,))
             offer = cursor.fetchone()
+            if offer is not None:
+                self._offer_cache.set(offer_id, offer)
             return offer
         finally:
             try:
@@ -699,13 +1405,14 @@ class Database:
             except Exception:
                 pass
     
-    def get_store_offers(self, store_id: int) -> List[Tuple]:
+    def get_store_offers(self, store_id: int) -> List[Offer]:
         """Получить товары магазина с информацией о магазине (оптимизировано с JOIN)"""
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT o.*, s.name as store_name, s.address, s.city, s.category as store_category
+            cursor.row_factory = _offer_row
+            cursor.execute(f'''
+                SELECT {OFFER_COLUMNS}
                 FROM offers o
                 JOIN stores s ON o.store_id = s.store_id
                 WHERE o.store_id = ? AND o.status != "deleted"
@@ -718,7 +1425,27 @@ class Database:
                 conn.close()
             except Exception:
                 pass
-    
+
+    def get_offers_for_user(self, owner_id: int) -> List[Offer]:
+        """Получить товары всех магазинов владельца одним запросом (вместо get_store_offers в цикле)"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.row_factory = _offer_row
+            cursor.execute(f'''
+                SELECT {OFFER_COLUMNS}
+                FROM offers o
+                JOIN stores s ON o.store_id = s.store_id
+                WHERE s.owner_id = ? AND o.status != "deleted"
+                ORDER BY o.created_at DESC
+            ''', (owner_id,))
+            return cursor.fetchall()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
     def update_offer_quantity(self, offer_id: int, new_quantity: int):
         """Обновить количество товара и автоматически управлять статусом"""
         conn = self.get_connection()
@@ -733,7 +1460,49 @@ class Database:
         
         conn.commit()
         conn.close()
-    
+        self._offer_cache.pop(offer_id)
+
+    def adjust_quantity(self, offer_id: int, delta: int, owner_id: int) -> Optional[Offer]:
+        """Атомарно изменить количество товара на delta (кнопки +1/-1 партнёра).
+
+        Один UPDATE ... RETURNING вместо get_offer + get_user_stores +
+        update_offer_quantity + повторного get_offer. Количество не уходит
+        ниже нуля, статус переключается как в update_offer_quantity.
+
+        Returns:
+            Offer (тот же формат, что и get_offer)
+            или None, если товар не найден или не принадлежит owner_id.
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.row_factory = _offer_row
+            cursor.execute('''
+                UPDATE offers
+                SET quantity = MAX(0, COALESCE(quantity, 0) + ?),
+                    status = CASE WHEN COALESCE(quantity, 0) + ? <= 0 THEN 'inactive' ELSE 'active' END
+                WHERE offer_id = ? AND status != 'deleted'
+                  AND store_id IN (SELECT store_id FROM stores WHERE owner_id = ?)
+                RETURNING offer_id, store_id, title, description, original_price, discount_price,
+                          quantity, available_from, available_until, status, photo, created_at,
+                          expiry_date, unit, category,
+                          (SELECT name FROM stores s WHERE s.store_id = offers.store_id),
+                          (SELECT address FROM stores s WHERE s.store_id = offers.store_id),
+                          (SELECT city FROM stores s WHERE s.store_id = offers.store_id),
+                          (SELECT category FROM stores s WHERE s.store_id = offers.store_id)
+            ''', (delta, delta, offer_id, owner_id))
+            offer = cursor.fetchone()
+            conn.commit()
+            # Свежая строка уже в формате get_offer - кладём её в кэш сразу
+            if offer is not None:
+                self._offer_cache.set(offer_id, offer)
+            return offer
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
     def increment_offer_quantity(self, offer_id: int, amount: int = 1):
         """Увеличить количество товара (при отмене бронирования)"""
         conn = self.get_connection()
@@ -765,6 +1534,7 @@ class Database:
             cache.delete('offers:all')
         except Exception:
             pass
+        self._offer_cache.pop(offer_id)
     
     def activate_offer(self, offer_id: int):
         """Активировать товар"""
@@ -780,6 +1550,7 @@ class Database:
             cache.delete('offers:all')
         except Exception:
             pass
+        self._offer_cache.pop(offer_id)
     
     def update_offer_expiry(self, offer_id: int, new_expiry: str):
         """Обновить срок годности товара"""
@@ -795,6 +1566,28 @@ class Database:
             cache.delete('offers:all')
         except Exception:
             pass
+        self._offer_cache.pop(offer_id)
+    
+    def update_offer_pickup_time(self, offer_id: int, available_from: str, available_until: str):
+        """Обновить время забора товара (ЧЧ:ММ - ЧЧ:ММ)"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                'UPDATE offers SET available_from = ?, available_until = ? WHERE offer_id = ?',
+                (available_from, available_until, offer_id)
+            )
+            conn.commit()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        try:
+            cache.delete('offers:all')
+        except Exception:
+            pass
+        self._offer_cache.pop(offer_id)
     
     def delete_offer(self, offer_id: int) -> bool:
         """Удалить товар (установить статус deleted)"""
@@ -810,11 +1603,11 @@ class Database:
             cache.delete('offers:all')
         except Exception:
             pass
+        self._offer_cache.pop(offer_id)
         return True
     
     def delete_expired_offers(self):
         """Удаляет предложения с истёкшим сроком годности"""
-        from datetime import datetime
         conn = self.get_connection()
         cursor = conn.cursor()
         
@@ -823,8 +1616,8 @@ class Database:
             UPDATE offers 
             SET status = 'inactive' 
             WHERE status = 'active' 
-            AND expiry_date IS NOT NULL
-            AND date(expiry_date) < date('now')
+            AND expiry_date < date('now')
+            AND expiry_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*'
         ''')
         
         deleted_count = cursor.rowcount
@@ -840,6 +1633,8 @@ class Database:
             cache.delete('offers:all')
         except Exception:
             pass
+        if deleted_count:
+            self._offer_cache.clear()
             
         return deleted_count
     
@@ -849,11 +1644,10 @@ class Database:
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO bookings (offer_id, user_id, booking_code, status, quantity)
-                VALUES (?, ?, ?, 'pending', ?)
-            ''', (offer_id, user_id, booking_code, quantity))
+            cursor.execute(INSERT_BOOKING_SQL, (offer_id, user_id, booking_code, quantity, quantity, offer_id))
             booking_id = cursor.lastrowid
+            cursor.execute(BUMP_BOOKING_COUNT_SQL, ('pending', 1, offer_id))
+            self._record_booking_delta(cursor, booking_id, 1, 1)
             conn.commit()
             return booking_id
         finally:
@@ -880,8 +1674,6 @@ class Database:
             Использует транзакцию SQLite с IMMEDIATE для предотвращения race conditions.
             Уменьшает quantity предложения атомарно перед созданием бронирования.
         """
-        import random
-        import string
         conn = None
         try:
             conn = self.get_connection()
@@ -920,14 +1712,14 @@ class Database:
             booking_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
             
             # Создаем бронирование
-            cursor.execute('''
-                INSERT INTO bookings (offer_id, user_id, booking_code, status, quantity)
-                VALUES (?, ?, ?, 'pending', ?)
-            ''', (offer_id, user_id, booking_code, quantity))
+            cursor.execute(INSERT_BOOKING_SQL, (offer_id, user_id, booking_code, quantity, quantity, offer_id))
             booking_id = cursor.lastrowid
+            cursor.execute(BUMP_BOOKING_COUNT_SQL, ('pending', 1, offer_id))
+            self._record_booking_delta(cursor, booking_id, 1, 1)
             
             # Коммитим транзакцию
             conn.commit()
+            self._offer_cache.pop(offer_id)
             return (True, booking_id, booking_code)
             
         except Exception as e:
@@ -936,7 +1728,7 @@ class Database:
                     conn.rollback()
                 except Exception:
                     pass
-            logger.error(f"Error in create_booking_atomic: {e}", exc_info=True)
+            logger.error("Error in create_booking_atomic: %s", e, exc_info=True)
             return (False, None, None)
         finally:
             if conn:
@@ -1012,7 +1804,15 @@ class Database:
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
+            cursor.execute('SELECT offer_id, status FROM bookings WHERE booking_id = ?', (booking_id,))
+            row = cursor.fetchone()
             cursor.execute('UPDATE bookings SET status = ? WHERE booking_id = ?', (status, booking_id))
+            if row and row[1] != status:
+                # Перенос брони между счётчиками в той же транзакции
+                cursor.execute(BUMP_BOOKING_COUNT_SQL, (row[1], -1, row[0]))
+                cursor.execute(BUMP_BOOKING_COUNT_SQL, (status, 1, row[0]))
+                if 'cancelled' in (row[1], status):
+                    self._record_booking_delta(cursor, booking_id, 0, -1 if status == 'cancelled' else 1)
             conn.commit()
         finally:
             try:
@@ -1023,18 +1823,60 @@ class Database:
     def complete_booking(self, booking_id: int):
         """Завершить бронирование"""
         self.update_booking_status(booking_id, 'completed')
+
+    def get_booking_complete_bundle(self, booking_id: int) -> Optional[BookingBundle]:
+        """Бронь + товар + магазин + язык покупателя одним JOIN вместо
+        get_booking(), get_offer(), get_store() и get_user_language() подряд.
+
+        Returns:
+            BookingBundle или None, если бронь (или её товар/магазин) не найдены
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT b.booking_id, b.offer_id, b.user_id, b.status, b.booking_code,
+                       b.pickup_time, COALESCE(b.quantity, 1), b.created_at,
+                       {OFFER_COLUMNS},
+                       {STORE_COLUMNS}, s.avg_rating, s.ratings_count,
+                       COALESCE(u.language, 'ru')
+                FROM bookings b
+                JOIN offers o ON b.offer_id = o.offer_id
+                JOIN stores s ON o.store_id = s.store_id
+                LEFT JOIN users u ON b.user_id = u.user_id
+                WHERE b.booking_id = ?
+            ''', (booking_id,))
+            row = cursor.fetchone()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        if row is None:
+            return None
+        offer_end = 8 + len(Offer._fields)
+        return BookingBundle(
+            booking=row[:8],
+            offer=Offer._make(row[8:offer_end]),
+            store=row[offer_end:-1],
+            customer_lang=row[-1],
+        )
     
     def cancel_booking(self, booking_id: int):
         """Отменить бронирование"""
         self.update_booking_status(booking_id, 'cancelled')
     
     def get_store_bookings(self, store_id: int) -> List[Tuple]:
-        """Получить все бронирования для магазина"""
+        """Получить все бронирования для магазина.
+
+        Строка: [0]..[7] BOOKING_COLUMNS, [8] title товара,
+        [9] first_name, [10] username, [11] phone покупателя
+        """
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT b.*, o.title, u.first_name, u.username, u.phone
+            cursor.execute(f'''
+                SELECT {BOOKING_COLUMNS}, o.title, u.first_name, u.username, u.phone
                 FROM bookings b
                 JOIN offers o ON b.offer_id = o.offer_id
                 JOIN users u ON b.user_id = u.user_id
@@ -1048,23 +1890,248 @@ class Database:
                 conn.close()
             except Exception:
                 pass
-    
-    # Методы для админа
-    def set_admin(self, user_id: int):
+
+    def get_bookings_for_stores(self, store_ids: List[int], status: str = None) -> List[Tuple]:
+        """Бронирования сразу нескольких магазинов одним запросом (формат как у get_store_bookings)
+
+        Args:
+            store_ids: ID магазинов партнёра
+            status: Если указан - только бронирования с этим статусом
+        """
+        if not store_ids:
+            return []
+        params = [_json_ids(store_ids)]
+        status_filter = ''
+        if status:
+            status_filter = ' AND b.status = ?'
+            params.append(status)
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE users SET is_admin = 1 WHERE user_id = ?', (user_id,))
-        conn.commit()
-        conn.close()
-    
-    def is_admin(self, user_id: int) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {BOOKING_COLUMNS}, o.title, u.first_name, u.username, u.phone
+                FROM bookings b
+                JOIN offers o ON b.offer_id = o.offer_id
+                JOIN users u ON b.user_id = u.user_id
+                WHERE o.store_id {IN_JSON_IDS}{status_filter}
+                ORDER BY b.created_at DESC
+            ''', params)
+            return cursor.fetchall()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def get_bookings_for_owner(self, owner_id: int, status: str = None) -> List[Tuple]:
+        """Бронирования всех одобренных магазинов владельца одним запросом
+        (формат как у get_store_bookings) - без get_approved_stores + цикла по магазинам
+        """
+        params = [owner_id]
+        status_filter = ''
+        if status:
+            status_filter = ' AND b.status = ?'
+            params.append(status)
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT is_admin FROM users WHERE user_id = ?', (user_id,))
-        result = cursor.fetchone()
-        conn.close()
-        return result and result[0] == 1
-    
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {BOOKING_COLUMNS}, o.title, u.first_name, u.username, u.phone
+                FROM stores s
+                JOIN offers o ON o.store_id = s.store_id
+                JOIN bookings b ON b.offer_id = o.offer_id
+                JOIN users u ON b.user_id = u.user_id
+                WHERE s.owner_id = ? AND s.status = 'active'{status_filter}
+                ORDER BY b.created_at DESC
+            ''', params)
+            return cursor.fetchall()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def get_booking_status_counts(self, store_ids: List[int]) -> dict:
+        """Количество бронирований магазинов по статусам: {status: count}
+
+        Читает готовые счётчики store_booking_counts - не зависит от объёма истории.
+        """
+        if not store_ids:
+            return {}
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT status, SUM(count)
+                FROM store_booking_counts
+                WHERE store_id {IN_JSON_IDS}
+                GROUP BY status
+                HAVING SUM(count) > 0
+            ''', (_json_ids(store_ids),))
+            return dict(cursor.fetchall())
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def rebuild_booking_counts(self, store_ids: Optional[List[int]] = None):
+        """Пересчитать сводки BOOKING_ROLLUPS из bookings (для всех магазинов или для store_ids).
+
+        Разовый бэкфилл выполняется в init_db при создании таблицы; вручную:
+            python -c "from database import Database; Database().rebuild_booking_counts()"
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            self._rebuild_booking_counts(cursor, store_ids)
+            conn.commit()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _rebuild_booking_counts(cursor, store_ids: Optional[List[int]] = None):
+        if store_ids is None:
+            for table, rebuild_sql, group_by in BOOKING_ROLLUPS:
+                cursor.execute(f'DELETE FROM {table}')
+                cursor.execute(f'{rebuild_sql} GROUP BY {group_by}')
+        elif store_ids:
+            marks = _placeholders(len(store_ids))
+            for table, rebuild_sql, group_by in BOOKING_ROLLUPS:
+                cursor.execute(f'DELETE FROM {table} WHERE store_id IN ({marks})', list(store_ids))
+                cursor.execute(
+                    f'{rebuild_sql} WHERE o.store_id IN ({marks}) GROUP BY {group_by}',
+                    list(store_ids)
+                )
+        cursor.execute(REBUILD_LIFETIME_STATS_SQL)
+
+    @staticmethod
+    def _record_booking_delta(cursor, booking_id: int, d_bookings: int, d_orders: int):
+        cursor.execute(
+            RECORD_BOOKING_DELTA_SQL,
+            (d_bookings, d_orders, d_orders, d_orders, d_orders, booking_id)
+        )
+        cursor.execute(
+            RECORD_LIFETIME_DELTA_SQL,
+            (booking_id, d_bookings, d_orders, d_orders, d_orders, d_orders)
+        )
+        if d_orders:
+            cursor.execute(BUMP_DAILY_TOP_SQL, (d_orders, booking_id))
+
+    def get_daily_stats(self, day: str, store_ids: Optional[List[int]] = None) -> dict:
+        """Сводка за день 'YYYY-MM-DD' из daily_stats (по всем магазинам или по store_ids).
+
+        Returns:
+            {'bookings', 'orders', 'items', 'revenue', 'savings'} - bookings включает
+            отменённые, остальное - только неотменённые брони
+        """
+        query = '''
+            SELECT COALESCE(SUM(bookings), 0), COALESCE(SUM(orders), 0), COALESCE(SUM(items), 0),
+                   COALESCE(SUM(revenue), 0), COALESCE(SUM(savings), 0)
+            FROM daily_stats WHERE date = ?
+        '''
+        params = [day]
+        if store_ids is not None:
+            if not store_ids:
+                return dict.fromkeys(('bookings', 'orders', 'items', 'revenue', 'savings'), 0)
+            query += f' AND store_id {IN_JSON_IDS}'
+            params.append(_json_ids(store_ids))
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            row = cursor.fetchone()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        return dict(zip(('bookings', 'orders', 'items', 'revenue', 'savings'), row))
+    
+    def get_daily_top_item(self, day: str, store_ids: List[int]) -> Optional[Tuple[str, int]]:
+        """Самый бронируемый товар магазинов за день 'YYYY-MM-DD' из store_daily_top.
+
+        Returns:
+            (offer_title, cnt) или None, если неотменённых броней не было
+        """
+        if not store_ids:
+            return None
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT offer_title, cnt FROM store_daily_top
+                WHERE date = ? AND store_id {IN_JSON_IDS} AND cnt > 0
+                ORDER BY cnt DESC LIMIT 1
+            ''', (day, _json_ids(store_ids)))
+            return cursor.fetchone()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+    
+    def get_lifetime_stats(self) -> dict:
+        """Итоги за всё время из lifetime_stats: {'bookings', 'orders', 'items', 'revenue', 'savings'}
+
+        bookings включает отменённые, остальное - только неотменённые брони.
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT k, v FROM lifetime_stats')
+            stats = dict(cursor.fetchall())
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        result = {k: int(stats.get(k, 0)) for k in ('bookings', 'orders', 'items')}
+        result.update((k, stats.get(k, 0.0)) for k in ('revenue', 'savings'))
+        return result
+    
+    # Методы для админа
+    def set_admin(self, user_id: int):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('UPDATE users SET is_admin = 1 WHERE user_id = ?', (user_id,))
+        conn.commit()
+        conn.close()
+        self.invalidate_user(user_id)
+        self.invalidate_admins()
+    
+    def invalidate_admins(self):
+        """Сбросить кэш admin id (после изменения users.is_admin или удаления пользователя)"""
+        with self._admin_lock:
+            self._admin_ids = None
+    
+    def _get_admin_ids(self) -> frozenset:
+        """Множество admin id, перечитывается раз в ADMIN_CACHE_TTL секунд"""
+        with self._admin_lock:
+            ids = self._admin_ids
+            if ids is not None and time.monotonic() - self._admin_ids_loaded < self._admin_ids_ttl:
+                return ids
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT user_id FROM users WHERE is_admin = 1')
+            ids = frozenset(row[0] for row in cursor.fetchall())
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        with self._admin_lock:
+            self._admin_ids = ids
+            self._admin_ids_loaded = time.monotonic()
+        return ids
+    
+    def is_admin(self, user_id: int) -> bool:
+        return user_id in self._get_admin_ids()
+    
     def get_all_admins(self) -> List[Tuple]:
         """Получить всех администраторов"""
         conn = self.get_connection()
@@ -1077,8 +2144,8 @@ class Database:
     def get_pending_stores(self) -> List[Tuple]:
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT s.*, u.first_name, u.username
+        cursor.execute(f'''
+            SELECT {STORE_COLUMNS}, u.first_name, u.username
             FROM stores s
             JOIN users u ON s.owner_id = u.user_id
             WHERE s.status = 'pending'
@@ -1088,6 +2155,35 @@ class Database:
         conn.close()
         return stores
     
+    def get_stores_page(self, status: str = 'active', page: int = 0,
+                        page_size: int = 20) -> Tuple[List[Tuple], bool]:
+        """Страница магазинов со статусом status для админки (новые сверху).
+
+        Строки как у get_pending_stores(): STORE_COLUMNS + first_name, username владельца.
+        Запрашивается page_size + 1 строк, чтобы узнать, есть ли следующая страница.
+
+        Returns:
+            (stores, has_more)
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {STORE_COLUMNS}, u.first_name, u.username
+                FROM stores s
+                LEFT JOIN users u ON s.owner_id = u.user_id
+                WHERE s.status = ?
+                ORDER BY s.created_at DESC, s.store_id DESC
+                LIMIT ? OFFSET ?
+            ''', (status, page_size + 1, max(page, 0) * page_size))
+            rows = cursor.fetchall()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        return rows[:page_size], len(rows) > page_size
+    
     def approve_store(self, store_id: int):
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -1103,7 +2199,7 @@ class Database:
         result = cursor.fetchone()
         if not result:
             conn.close()
-            logger.error(f"Store {store_id} not found")
+            logger.error("Store %s not found", store_id)
             return False
             
         owner_id, user_exists, current_status, store_name = result
@@ -1111,13 +2207,13 @@ class Database:
         # Проверяем что владелец существует
         if not user_exists:
             conn.close()
-            logger.error(f"Owner {owner_id} for store {store_id} ({store_name}) not found")
+            logger.error("Owner %s for store %s (%s) not found", owner_id, store_id, store_name)
             return False
         
         # Проверяем что магазин еще не одобрен
         if current_status != 'pending':
             conn.close()
-            logger.warning(f"Store {store_id} already has status: {current_status}")
+            logger.warning("Store %s already has status: %s", store_id, current_status)
             return False
         
         # Обновляем статус магазина
@@ -1135,16 +2231,22 @@ class Database:
             cache.delete(f'user:{owner_id}')
         except:
             pass
+        self.invalidate_user_stores(owner_id)
+        self.invalidate_user(owner_id)
         
-        logger.info(f"Store {store_id} ({store_name}) approved, owner {owner_id} promoted to seller")
+        logger.info("Store %s (%s) approved, owner %s promoted to seller", store_id, store_name, owner_id)
         return True
     
     def reject_store(self, store_id: int, reason: str):
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('UPDATE stores SET status = ?, rejection_reason = ? WHERE store_id = ?', ('rejected', reason, store_id))
+        cursor.execute('SELECT owner_id FROM stores WHERE store_id = ?', (store_id,))
+        owner = cursor.fetchone()
         conn.commit()
         conn.close()
+        if owner:
+            self.invalidate_user_stores(owner[0])
     
     def get_store_owner(self, store_id: int) -> Optional[int]:
         conn = self.get_connection()
@@ -1155,56 +2257,291 @@ class Database:
         return result[0] if result else None
     
     def get_statistics(self) -> dict:
+        counts = self.get_dashboard_counts()
+        users, stores = counts['users'], counts['stores']
+        offers, bookings = counts['offers'], counts['bookings']
+        return {
+            # Пользователи
+            'users': sum(users.values()),
+            'customers': users.get('customer', 0),
+            'sellers': users.get('seller', 0),
+            # Магазины
+            'stores': sum(stores.values()),
+            'approved_stores': stores.get('active', 0),
+            'pending_stores': stores.get('pending', 0),
+            'rejected_stores': stores.get('rejected', 0),
+            # Предложения
+            'offers': sum(offers.values()),
+            'active_offers': offers.get('active', 0),
+            # Бронирования
+            'bookings': sum(bookings.values()),
+            'pending_bookings': bookings.get('pending', 0),
+            'completed_bookings': bookings.get('completed', 0),
+            'cancelled_bookings': bookings.get('cancelled', 0),
+        }
+
+    def get_analytics_report(self) -> dict:
+        """Все цифры админ-аналитики одним запросом (UNION ALL с меткой раздела).
+
+        Returns:
+            {'users': {role: n}, 'stores': {status: n},
+             'offers': {status: (n, sum_original_price, sum_discount_price)},
+             'bookings': {status: (n, quantity)},
+             'lifetime': {'bookings', 'orders', 'items', 'revenue', 'savings'}}
+        """
+        report = {'users': {}, 'stores': {}, 'offers': {}, 'bookings': {}, 'lifetime': {}}
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        stats = {}
-        
-        # Пользователи
-        cursor.execute('SELECT COUNT(*) FROM users')
-        stats['users'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM users WHERE role = ?', ('customer',))
-        stats['customers'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM users WHERE role = ?', ('seller',))
-        stats['sellers'] = cursor.fetchone()[0]
-        
-        # Магазины
-        cursor.execute('SELECT COUNT(*) FROM stores')
-        stats['stores'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM stores WHERE status = ?', ('active',))
-        stats['approved_stores'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM stores WHERE status = ?', ('pending',))
-        stats['pending_stores'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM stores WHERE status = ?', ('rejected',))
-        stats['rejected_stores'] = cursor.fetchone()[0]
-        
-        # Предложения
-        cursor.execute('SELECT COUNT(*) FROM offers')
-        stats['offers'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM offers WHERE status = ?', ('active',))
-        stats['active_offers'] = cursor.fetchone()[0]
-        
-        # Бронирования
-        cursor.execute('SELECT COUNT(*) FROM bookings')
-        stats['bookings'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM bookings WHERE status = ?', ('pending',))
-        stats['pending_bookings'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM bookings WHERE status = ?', ('completed',))
-        stats['completed_bookings'] = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM bookings WHERE status = ?', ('cancelled',))
-        stats['cancelled_bookings'] = cursor.fetchone()[0]
-        
-        conn.close()
-        return stats
+        try:
+            cursor = conn.cursor()
+            cursor.execute(ANALYTICS_REPORT_SQL[self.use_counts_table])
+            for section, key, n, a, b in cursor.fetchall():
+                if section == 'offers':
+                    report[section][key] = (n, a or 0, b or 0)
+                elif section == 'bookings':
+                    report[section][key] = (n, a or 0)
+                else:
+                    report[section][key] = n
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        return report
+
+    def get_analytics_tops(self, limit: int = 5) -> dict:
+        """Топы для аналитики (магазины, покупатели, города, категории) одним запросом.
+
+        Returns:
+            {'stores' | 'customers' | 'cities' | 'categories': [(name, count), ...]}
+            - каждый список по убыванию, не длиннее limit
+        """
+        tops = {'stores': [], 'customers': [], 'cities': [], 'categories': []}
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(ANALYTICS_TOPS_SQL, (limit,) * 4)
+            for section, name, n in cursor.fetchall():
+                tops[section].append((name, n))
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        # Порядок строк внутри UNION ALL SQLite не гарантирует
+        for rows in tops.values():
+            rows.sort(key=lambda row: row[1], reverse=True)
+        return tops
+
+    def get_recent_bookings(self, status: str, limit: int = 15) -> List[Tuple]:
+        """Последние бронирования со статусом status по всем магазинам (для админки).
+
+        Идёт по idx_bookings_status_created без сортировки всей таблицы.
+
+        Returns:
+            [(booking_id, booking_code, quantity, created_at, title, discount_price,
+              original_price, store_name, first_name, username), ...]
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT b.booking_id, b.booking_code, COALESCE(b.quantity, 1), b.created_at,
+                       o.title, o.discount_price, o.original_price, s.name, u.first_name, u.username
+                FROM bookings b
+                JOIN offers o ON b.offer_id = o.offer_id
+                JOIN stores s ON o.store_id = s.store_id
+                LEFT JOIN users u ON b.user_id = u.user_id
+                WHERE b.status = ?
+                ORDER BY b.created_at DESC
+                LIMIT ?
+            ''', (status, limit))
+            return cursor.fetchall()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def get_total_savings(self, statuses: Tuple[str, ...] = ('pending', 'confirmed', 'completed')) -> float:
+        """Суммарная экономия покупателей по броням со статусами statuses.
+
+        Читает bookings.savings (считается при создании брони) по индексу
+        idx_bookings_status_savings - без JOIN offers и умножения по строкам.
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f'SELECT COALESCE(SUM(savings), 0) FROM bookings WHERE status {IN_JSON_IDS}',
+                (json.dumps(list(statuses)),)
+            )
+            return cursor.fetchone()[0]
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def get_booking_status_totals(self) -> dict:
+        """Количество и сумма quantity бронирований по статусам одним GROUP BY.
+
+        Returns:
+            {status: (count, quantity)}
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT status, COUNT(*), COALESCE(SUM(COALESCE(quantity, 1)), 0)
+                FROM bookings GROUP BY status
+            ''')
+            return {status: (count, quantity) for status, count, quantity in cursor.fetchall()}
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def get_top_stores_by_bookings(self, limit: int = 5,
+                                   statuses: Tuple[str, ...] = ('pending', 'confirmed', 'completed')) -> List[Tuple]:
+        """Магазины с наибольшим числом бронирований в статусах statuses (по умолчанию - неотменённые).
+
+        Считает по store_booking_counts (строка на магазин и статус), а не по
+        bookings x offers; к stores обращается только для limit победителей.
+
+        Returns:
+            [(store_id, name, city, bookings_count), ...]
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT s.store_id, s.name, s.city, x.cnt
+                FROM (
+                    SELECT store_id, SUM(count) AS cnt
+                    FROM store_booking_counts
+                    WHERE status IN (SELECT value FROM json_each(?))
+                    GROUP BY store_id
+                    HAVING cnt > 0
+                    ORDER BY cnt DESC
+                    LIMIT ?
+                ) x
+                JOIN stores s ON s.store_id = x.store_id
+                ORDER BY x.cnt DESC
+            ''', (json.dumps(list(statuses)), limit))
+            return cursor.fetchall()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def get_dashboard_counts(self, today: Optional[str] = None) -> dict:
+        """Все счётчики админ-панели одним запросом (UNION ALL вместо десятка COUNT(*)).
+
+        Группы по роли/статусу берутся из _counts (поддерживается триггерами),
+        если use_counts_table не выключен.
+
+        Args:
+            today: Дата 'YYYY-MM-DD' - если указана, добавляется раздел 'today'
+
+        Returns:
+            {'users': {role: n}, 'stores': {status: n}, 'offers': {status: n},
+             'bookings': {status: n}[, 'today': {'bookings': n, 'users': n, 'revenue': x}]}
+        """
+        query = DASHBOARD_COUNTS_SQL[self.use_counts_table, bool(today)]
+        params = (today, *_day_range(today), today) if today else ()
+
+        result = {'users': {}, 'stores': {}, 'offers': {}, 'bookings': {}}
+        if today:
+            result['today'] = {}
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            for section, key, value in cursor.fetchall():
+                result[section][key] = value
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        return result
+    
+    def _count_by_key(self, table: str, column: str, key: str) -> int:
+        """Число строк table с column = key: из _counts, либо COUNT(*) без таблицы счётчиков.
+
+        (table, column) - только пары из COUNTED_COLUMNS (подставляются в SQL как есть).
+        """
+        if (table, column) not in COUNTED_COLUMNS:
+            raise ValueError(f"{table}.{column} is not in COUNTED_COLUMNS")
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            if self.use_counts_table:
+                cursor.execute(
+                    "SELECT n FROM _counts WHERE table_name = ? AND key = ?", (table, key)
+                )
+            else:
+                cursor.execute(f'SELECT COUNT(*) FROM {table} WHERE {column} = ?', (key,))
+            row = cursor.fetchone()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        return row[0] if row else 0
+
+    def count_users_by_role(self, role: str) -> int:
+        """Количество пользователей с ролью (из _counts, без прохода по users)"""
+        return self._count_by_key('users', 'role', role)
+
+    def count_stores_by_status(self, status: str) -> int:
+        """Количество магазинов со статусом (из _counts, без прохода по stores)"""
+        return self._count_by_key('stores', 'status', status)
+
+    def get_sellers_page(self, page: int = 0, page_size: int = 20) -> Tuple[List[Tuple], bool]:
+        """Страница партнёров для админки: LIMIT/OFFSET в SQL вместо среза в Python.
+
+        Запрашивается page_size + 1 строк - лишняя строка только сообщает, есть ли
+        следующая страница. Магазины и активные товары агрегируются по владельцу
+        одним проходом (товары - по store_id через idx_offers_store_status), без
+        COUNT(DISTINCT ...) по размноженному users x stores x offers.
+
+        Returns:
+            ([(user_id, username, first_name, phone, city, created_at,
+               stores_count, active_stores, offers_count), ...], has_more)
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT u.user_id, u.username, u.first_name, u.phone, u.city, u.created_at,
+                       IFNULL(st.stores_count, 0), IFNULL(st.active_stores, 0),
+                       IFNULL(st.offers_count, 0)
+                FROM users u
+                LEFT JOIN (
+                    SELECT s.owner_id, COUNT(*) AS stores_count,
+                           SUM(s.status = 'active') AS active_stores,
+                           SUM(IFNULL(oc.n, 0)) AS offers_count
+                    FROM stores s
+                    LEFT JOIN (
+                        SELECT store_id, COUNT(*) AS n FROM offers
+                        WHERE status = 'active' GROUP BY store_id
+                    ) oc ON oc.store_id = s.store_id
+                    GROUP BY s.owner_id
+                ) st ON st.owner_id = u.user_id
+                WHERE u.role = 'seller'
+                ORDER BY u.created_at DESC, u.user_id DESC
+                LIMIT ? OFFSET ?
+            ''', (page_size + 1, max(page, 0) * page_size))
+            rows = cursor.fetchall()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        return rows[:page_size], len(rows) > page_size
     
     def get_all_users(self) -> List[Tuple]:
         conn = self.get_connection()
@@ -1230,6 +2567,7 @@ class Database:
         cursor.execute('UPDATE users SET notifications_enabled = ? WHERE user_id = ?', (new_value, user_id))
         conn.commit()
         conn.close()
+        self.invalidate_user(user_id)
         return new_value == 1
     
     # Методы для рейтингов
@@ -1305,15 +2643,138 @@ class Database:
 
     # Методы для рейтингов
     def add_rating(self, booking_id: int, user_id: int, store_id: int, rating: int, comment: str = None):
-        """Добавить рейтинг"""
+        """Добавить рейтинг (и инкрементально обновить avg_rating/ratings_count магазина)"""
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO ratings (booking_id, user_id, store_id, rating, comment)
             VALUES (?, ?, ?, ?, ?)
         ''', (booking_id, user_id, store_id, rating, comment))
+        cursor.execute('''
+            UPDATE stores
+            SET avg_rating = (COALESCE(avg_rating, 0) * COALESCE(ratings_count, 0) + ?) / (COALESCE(ratings_count, 0) + 1),
+                ratings_count = COALESCE(ratings_count, 0) + 1
+            WHERE store_id = ?
+        ''', (rating, store_id))
         conn.commit()
         conn.close()
+
+    def upsert_store_rating(self, store_id: int, user_id: int, rating: int) -> bool:
+        """Поставить или изменить оценку магазина пользователем (без бронирования).
+
+        Вместо SELECT COUNT(*) + ветвления INSERT/UPDATE - три запроса в одной
+        транзакции: INSERT OR IGNORE по уникальному индексу ux_ratings_store_user,
+        UPDATE только если строка уже была, затем пересчёт avg_rating магазина.
+        Гонки между проверкой и записью нет.
+
+        OR IGNORE гасит и нарушение CHECK(rating 1..5), поэтому оценка
+        проверяется заранее - иначе она молча терялась бы как "обновлённая".
+
+        Returns:
+            True если оценка обновлена, False если добавлена новая
+
+        Raises:
+            ValueError: rating не целое от 1 до 5
+        """
+        if isinstance(rating, bool) or not isinstance(rating, int) or not 1 <= rating <= 5:
+            raise ValueError(f"rating must be an integer from 1 to 5, got {rating!r}")
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                'INSERT OR IGNORE INTO ratings (store_id, user_id, rating) VALUES (?, ?, ?)',
+                (store_id, user_id, rating)
+            )
+            updated = cursor.rowcount == 0
+            if updated:
+                cursor.execute(
+                    'UPDATE ratings SET rating = ? WHERE store_id = ? AND user_id = ? AND booking_id IS NULL',
+                    (rating, store_id, user_id)
+                )
+            cursor.execute(RECALC_STORE_RATING_SQL + ' WHERE store_id = ?', (store_id,))
+            conn.commit()
+            return updated
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    async def run(self, func, *args, **kwargs):
+        """Выполнить синхронный метод БД в пуле потоков БД, не блокируя event loop.
+
+        Каждый поток берёт своё соединение из пула get_connection(), поэтому
+        методы Database можно безопасно вызывать так из async-обработчиков:
+            await db.run(db.get_offer, offer_id)
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    def _execute_sync(self, sql: str, params=(), many: bool = False) -> List[Tuple]:
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            if many:
+                cursor.executemany(sql, params)
+            else:
+                cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            if conn.in_transaction:
+                conn.commit()
+            return rows
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    async def execute(self, sql: str, params=()) -> List[Tuple]:
+        """Выполнить один SQL-запрос вне event loop и вернуть строки результата.
+
+        Для обработчиков, которым не хватает готового метода Database, вместо
+        ручного get_connection()/cursor/commit/close. Изменяющие запросы
+        выполняются по очереди под общим asyncio.Lock; кэши Database
+        (_lang_cache, _offer_cache, ...) при этом не сбрасываются.
+        """
+        if sql.lstrip()[:6].upper() == 'SELECT':
+            return await self.run(self._execute_sync, sql, params)
+        async with self._write_lock:
+            return await self.run(self._execute_sync, sql, params)
+
+    async def fetchall_async(self, sql: str, params=()) -> List[Tuple]:
+        """SELECT вне event loop: все строки результата"""
+        return await self.execute(sql, params)
+
+    async def fetchone_async(self, sql: str, params=()) -> Optional[Tuple]:
+        """SELECT вне event loop: первая строка результата или None"""
+        rows = await self.execute(sql, params)
+        return rows[0] if rows else None
+
+    async def executemany(self, sql: str, seq_of_params) -> None:
+        """executemany() в одной транзакции вне event loop (под общим asyncio.Lock записи)"""
+        async with self._write_lock:
+            await self.run(self._execute_sync, sql, list(seq_of_params), True)
+
+    async def upsert_store_rating_async(self, store_id: int, user_id: int, rating: int) -> bool:
+        """Асинхронная версия upsert_store_rating() для обработчиков оценки магазина"""
+        async with self._write_lock:
+            return await self.run(self.upsert_store_rating, store_id, user_id, rating)
+
+    def refresh_store_rating(self, store_id: int):
+        """Пересчитать кэшированный рейтинг магазина по таблице ratings.
+
+        Нужен после изменения или удаления отзыва, где инкрементальная
+        формула не применима.
+        """
+        conn = self.get_connection()
+        try:
+            conn.execute(RECALC_STORE_RATING_SQL + ' WHERE store_id = ?', (store_id,))
+            conn.commit()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
     
     def get_store_ratings(self, store_id: int) -> List[Tuple]:
         """Получить все рейтинги магазина"""
@@ -1370,15 +2831,32 @@ class Database:
             ''', (store_id,))
             # Удаляем предложения магазина
             cursor.execute('DELETE FROM offers WHERE store_id = ?', (store_id,))
+            cursor.execute('DELETE FROM store_booking_counts WHERE store_id = ?', (store_id,))
+            cursor.execute('DELETE FROM daily_stats WHERE store_id = ?', (store_id,))
+            cursor.execute('DELETE FROM store_daily_top WHERE store_id = ?', (store_id,))
         
         # Удаляем магазины пользователя
         cursor.execute('DELETE FROM stores WHERE owner_id = ?', (user_id,))
         
-        # Удаляем бронирования пользователя (как клиента)
+        # Удаляем бронирования пользователя (как клиента) и пересчитываем счётчики их магазинов
+        cursor.execute('''
+            SELECT DISTINCT o.store_id FROM bookings b
+            JOIN offers o ON b.offer_id = o.offer_id
+            WHERE b.user_id = ?
+        ''', (user_id,))
+        booked_store_ids = [row[0] for row in cursor.fetchall()]
         cursor.execute('DELETE FROM bookings WHERE user_id = ?', (user_id,))
+        self._rebuild_booking_counts(cursor, booked_store_ids)
         
-        # Удаляем рейтинги пользователя
+        # Удаляем рейтинги пользователя и пересчитываем рейтинг затронутых магазинов
+        cursor.execute('SELECT DISTINCT store_id FROM ratings WHERE user_id = ?', (user_id,))
+        rated_store_ids = [row[0] for row in cursor.fetchall()]
         cursor.execute('DELETE FROM ratings WHERE user_id = ?', (user_id,))
+        if rated_store_ids:
+            cursor.execute(
+                RECALC_STORE_RATING_SQL + f' WHERE store_id IN ({_placeholders(len(rated_store_ids))})',
+                rated_store_ids
+            )
         
         # Удаляем уведомления пользователя
         cursor.execute('DELETE FROM notifications WHERE user_id = ?', (user_id,))
@@ -1388,6 +2866,10 @@ class Database:
         
         conn.commit()
         conn.close()
+        self.invalidate_user(user_id)
+        self.invalidate_user_stores(user_id)
+        self.invalidate_admins()
+        self._offer_cache.clear()
     
     # ============== НОВЫЕ МЕТОДЫ ==============
     
@@ -1521,13 +3003,13 @@ class Database:
     
     # Реферальная система
     def generate_referral_code(self, user_id: int) -> str:
-        import random, string
         code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
             cursor.execute('UPDATE users SET referral_code = ? WHERE user_id = ?', (code, user_id))
             conn.commit()
+            self.invalidate_user(user_id)
             return code
         finally:
             try:
@@ -1549,6 +3031,8 @@ class Database:
                 cursor.execute('UPDATE users SET bonus_balance = bonus_balance + 5000 WHERE user_id = ?', (referrer[0],))
                 cursor.execute('UPDATE users SET bonus_balance = bonus_balance + 3000 WHERE user_id = ?', (referred_id,))
                 conn.commit()
+                self.invalidate_user(referrer[0])
+                self.invalidate_user(referred_id)
                 return True
             return False
         finally:
@@ -1561,17 +3045,80 @@ class Database:
     def log_error(self, error_message: str, user_id: int = None):
         import logging
         logging.basicConfig(filename='fudly_errors.log', level=logging.ERROR)
-        logging.error(f"User {user_id}: {error_message}")
+        logging.error("User %s: %s", user_id, error_message)
     
     # Бэкап базы данных
     def backup_database(self):
         import shutil
-        from datetime import datetime
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         backup_file = f'fudly_backup_{timestamp}.db'
         shutil.copy2(self.db_name, backup_file)
         return backup_file
 
+    def delete_user_stores(self, user_id: int) -> int:
+        """Снять с публикации все магазины партнёра (удаление из админки).
+
+        Товары, магазины и роль владельца обновляются тремя UPDATE в одной
+        транзакции - без цикла UPDATE offers по каждому магазину.
+
+        Returns:
+            Количество помеченных магазинов
+        """
+        conn = self.get_connection()
+        try:
+            with conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE offers SET status = 'deleted'
+                    WHERE store_id IN (SELECT store_id FROM stores WHERE owner_id = ?)
+                ''', (user_id,))
+                cursor.execute(
+                    "UPDATE stores SET status = 'deleted' WHERE owner_id = ? AND status != 'deleted'",
+                    (user_id,)
+                )
+                deleted = cursor.rowcount
+                cursor.execute("UPDATE users SET role = 'customer' WHERE user_id = ?", (user_id,))
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self.invalidate_user(user_id)
+        self.invalidate_user_stores(user_id)
+        self._offer_cache.clear()
+        return deleted
+    
+    def demote_storeless_sellers(self, user_ids: List[int]) -> List[int]:
+        """Вернуть роль customer партнёрам из user_ids, у которых не осталось магазинов.
+
+        Для массового удаления магазинов из админки: роль меняется здесь, а не
+        прямым UPDATE в хендлере, чтобы кэш пользователей не отдавал старую роль.
+
+        Returns:
+            user_id, чья роль была изменена
+        """
+        if not user_ids:
+            return []
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                UPDATE users SET role = 'customer'
+                WHERE user_id IN ({_placeholders(len(user_ids))}) AND role = 'seller'
+                  AND NOT EXISTS (SELECT 1 FROM stores s WHERE s.owner_id = users.user_id)
+                RETURNING user_id
+            ''', list(user_ids))
+            demoted = [row[0] for row in cursor.fetchall()]
+            conn.commit()
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        for user_id in demoted:
+            self.invalidate_user(user_id)
+        return demoted
+    
     def delete_store(self, store_id: int):
         """Полное удаление магазина и всех связанных данных"""
         conn = self.get_connection()
@@ -1595,8 +3142,12 @@ class Database:
                 WHERE offer_id IN (SELECT offer_id FROM offers WHERE store_id = ?)
             ''', (store_id,))
             
-            # Удаляем предложения магазина
+            # Удаляем предложения магазина и счётчики бронирований
             cursor.execute('DELETE FROM offers WHERE store_id = ?', (store_id,))
+            cursor.execute('DELETE FROM store_booking_counts WHERE store_id = ?', (store_id,))
+            cursor.execute('DELETE FROM daily_stats WHERE store_id = ?', (store_id,))
+            cursor.execute('DELETE FROM store_daily_top WHERE store_id = ?', (store_id,))
+            cursor.execute(REBUILD_LIFETIME_STATS_SQL)
             
             # Удаляем сам магазин
             cursor.execute('DELETE FROM stores WHERE store_id = ?', (store_id,))
@@ -1610,6 +3161,9 @@ class Database:
                 cursor.execute('UPDATE users SET role = "customer" WHERE user_id = ?', (user_id,))
             
             conn.commit()
+            self.invalidate_user_stores(user_id)
+            self.invalidate_user(user_id)
+            self._offer_cache.clear()
         finally:
             try:
                 conn.close()
@@ -1680,39 +3234,45 @@ class Database:
                 return "🕐 Годен: менее часа"
                 
         except (ValueError, TypeError) as e:
-            print(f"Error parsing expiry_date: {expiry_date}, error: {e}")
+            logger.warning("Error parsing expiry_date %r: %s", expiry_date, e)
             return ""
     
-    def get_stores_by_category(self, category: str, city: str = None) -> List[Tuple]:
-        """Получить магазины по категории и опционально по городу"""
+    def get_stores_by_category(self, category: str, city: str = None,
+                               order_by: str = 'name', limit: Optional[int] = None) -> List[Tuple]:
+        """Получить магазины по категории и опционально по городу.
+
+        По умолчанию - все магазины по названию (на это рассчитаны пагинация
+        store_selection и счётчик "Найдено"). Для топа карточек передавать
+        order_by='rating', limit=15: сортировка по кэшированному
+        avg_rating/ratings_count и LIMIT выполняются в SQL.
+        """
+        order = STORES_BY_CATEGORY_ORDER.get(order_by, STORES_BY_CATEGORY_ORDER['name'])
+        query = "SELECT * FROM stores WHERE category = ? AND status = 'active'"
+        params = [category]
+        if city:
+            query += ' AND city = ?'
+            params.append(city)
+        query += ' ORDER BY ' + order
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+
         conn = self.get_connection()
         cursor = conn.cursor()
         try:
-            if city:
-                cursor.execute('''
-                    SELECT * 
-                    FROM stores 
-                    WHERE category = ? AND city = ? AND status = 'active'
-                    ORDER BY name
-                ''', (category, city))
-            else:
-                cursor.execute('''
-                    SELECT * 
-                    FROM stores 
-                    WHERE category = ? AND status = 'active'
-                    ORDER BY name
-                ''', (category,))
+            cursor.execute(query, params)
             return cursor.fetchall()
         finally:
             conn.close()
     
-    def get_offers_by_store(self, store_id: int) -> List[Tuple]:
+    def get_offers_by_store(self, store_id: int) -> List[Offer]:
         """Получить активные предложения магазина"""
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.row_factory = _offer_row
         try:
-            cursor.execute('''
-                SELECT o.*, s.name, s.address, s.city, s.category
+            cursor.execute(f'''
+                SELECT {OFFER_COLUMNS}
                 FROM offers o
                 JOIN stores s ON o.store_id = s.store_id
                 WHERE o.store_id = ? AND o.quantity > 0 AND date(o.expiry_date) >= date('now')
@@ -1784,8 +3344,8 @@ class Database:
         conn = self.get_connection()
         cursor = conn.cursor()
         try:
-            cursor.execute('''
-                SELECT s.*, 
+            cursor.execute(f'''
+                SELECT {STORE_COLUMNS},
                        COALESCE(AVG(r.rating), 0) as avg_rating,
                        COUNT(r.rating_id) as ratings_count
                 FROM stores s
@@ -1811,7 +3371,7 @@ class Database:
             conn.commit()
             return True
         except Exception as e:
-            print(f"Error adding favorite: {e}")
+            logger.error("Error adding favorite: %s", e)
             return False
         finally:
             conn.close()
@@ -1826,7 +3386,7 @@ class Database:
             conn.commit()
             return True
         except Exception as e:
-            print(f"Error removing favorite: {e}")
+            logger.error("Error removing favorite: %s", e)
             return False
         finally:
             conn.close()
@@ -1861,21 +3421,42 @@ class Database:
     
     def get_store_analytics(self, store_id: int) -> dict:
         """Получить аналитику магазина"""
+        bundle = self.get_store_analytics_bundle(store_id)
+        if bundle is None:
+            return {
+                'total_bookings': 0, 'completed': 0, 'cancelled': 0, 'conversion_rate': 0,
+                'days_of_week': {}, 'popular_categories': [], 'avg_rating': 0, 'rating_count': 0
+            }
+        return bundle[1]
+
+    def get_store_analytics_bundle(self, store_id: int) -> Optional[Tuple[Tuple, dict]]:
+        """Магазин и его аналитика для экрана статистики партнёра.
+
+        Магазин, итоги по статусам (store_booking_counts) и рейтинг (кэш в stores)
+        читаются одним запросом; отдельно - только дни недели и топ категорий.
+
+        Returns:
+            (store, analytics) - store как в get_store(), analytics как в
+            get_store_analytics(); None если магазин не найден
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
         
         try:
-            # Общая статистика
-            cursor.execute('''
-                SELECT 
-                    COUNT(*) as total_bookings,
-                    SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed,
-                    SUM(CASE WHEN status = 'cancelled' THEN 1 ELSE 0 END) as cancelled
-                FROM bookings b
-                JOIN offers o ON b.offer_id = o.offer_id
-                WHERE o.store_id = ?
+            cursor.execute(f'''
+                SELECT {STORE_COLUMNS}, s.avg_rating, s.ratings_count,
+                       COALESCE(SUM(c.count), 0),
+                       COALESCE(SUM(CASE WHEN c.status = 'completed' THEN c.count END), 0),
+                       COALESCE(SUM(CASE WHEN c.status = 'cancelled' THEN c.count END), 0)
+                FROM stores s
+                LEFT JOIN store_booking_counts c ON c.store_id = s.store_id
+                WHERE s.store_id = ?
+                GROUP BY s.store_id
             ''', (store_id,))
-            stats = cursor.fetchone()
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            store, (total, completed, cancelled) = row[:-3], row[-3:]
             
             # Продажи по дням недели
             cursor.execute('''
@@ -1903,23 +3484,15 @@ class Database:
             ''', (store_id,))
             categories = cursor.fetchall()
             
-            # Средний рейтинг
-            cursor.execute('''
-                SELECT AVG(rating) as avg_rating, COUNT(*) as rating_count
-                FROM ratings
-                WHERE store_id = ?
-            ''', (store_id,))
-            rating = cursor.fetchone()
-            
-            return {
-                'total_bookings': stats[0] or 0,
-                'completed': stats[1] or 0,
-                'cancelled': stats[2] or 0,
-                'conversion_rate': (stats[1] / stats[0] * 100) if stats[0] > 0 else 0,
+            return store, {
+                'total_bookings': total,
+                'completed': completed,
+                'cancelled': cancelled,
+                'conversion_rate': (completed / total * 100) if total > 0 else 0,
                 'days_of_week': dict(days) if days else {},
                 'popular_categories': categories or [],
-                'avg_rating': rating[0] or 0,
-                'rating_count': rating[1] or 0
+                'avg_rating': store[11] or 0,
+                'rating_count': store[12] or 0
             }
         finally:
             conn.close()
@@ -1,22 +1,102 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
-from localization import get_text, LANGUAGES
+from aiogram.filters.callback_data import CallbackData
+from localization import get_text, LANGUAGES, CITIES, CATEGORIES
+
+# Список городов Узбекистана и категории заведений - из localization (единый источник)
+CITIES_RU, CITIES_UZ = CITIES['ru'], CITIES['uz']
+CATEGORIES_RU, CATEGORIES_UZ = CATEGORIES['ru'], CATEGORIES['uz']
+
+# Статические подписи кнопок и полей, собранные один раз при импорте
+# (вместо тернарников `'...' if lang == 'ru' else '...'` на каждую кнопку)
+LABELS = {
+    'ru': {
+        'left': "Осталось",
+        'currency': "сум",
+        'pickup': "Забрать",
+        'expiry': "Годен до",
+        'reviews': "отзывов",
+        'no_reviews': "нет отзывов",
+        'edit': "📝 Изменить",
+        'extend': "🔄 Продлить",
+        'activate': "✅ Активировать",
+        'deactivate': "⏸ Снять с продажи",
+        'delete': "🗑 Удалить",
+        'switch_to_customer': "🔄 Режим покупателя",
+        'change_city': "🌆 Сменить город",
+        'all_offers': "🔥 Все",
+        'top_rated': "⭐ Топ по рейтингу",
+        'filter_price': "💰 По цене",
+        'filter_category': "🏷 По категории",
+        'filter_rating': "⭐ По рейтингу",
+        'filter_reset': "❌ Сбросить",
+        'edit_time': "🕐 Изменить время",
+        'back': "🔙 Назад",
+        'cancel': "❌ Отмена",
+        'today': "Сегодня",
+        'tomorrow': "Завтра",
+        'plus_days': "+{} дня",
+        'week': "Неделя",
+    },
+    'uz': {
+        'left': "Qoldi",
+        'currency': "so'm",
+        'pickup': "Olib ketish",
+        'expiry': "Yaroqlilik muddati",
+        'reviews': "sharh",
+        'no_reviews': "sharhlar yo'q",
+        'edit': "📝 Tahrirlash",
+        'extend': "🔄 Uzaytirish",
+        'activate': "✅ Faollashtirish",
+        'deactivate': "⏸ Sotuvdan olish",
+        'delete': "🗑 O'chirish",
+        'switch_to_customer': "🔄 Xaridor rejimi",
+        'change_city': "🌆 Shaharni o'zgartirish",
+        'all_offers': "🔥 Hammasi",
+        'top_rated': "⭐ Top reytingli",
+        'filter_price': "💰 Narx bo'yicha",
+        'filter_category': "🏷 Kategoriya bo'yicha",
+        'filter_rating': "⭐ Reyting bo'yicha",
+        'filter_reset': "❌ Tozalash",
+        'edit_time': "🕐 Vaqtni o'zgartirish",
+        'back': "🔙 Orqaga",
+        'cancel': "❌ Bekor qilish",
+        'today': "Bugun",
+        'tomorrow': "Ertaga",
+        'plus_days': "+{} kun",
+        'week': "Hafta",
+    },
+}
+
+# ============== CALLBACK DATA ==============
+
+class OfferCb(CallbackData, prefix="o"):
+    """Действие над товаром партнёра: o:<action>:<offer_id>
+
+    action: qty_add, qty_sub, edit, edit_time, extend, back,
+            deactivate, activate, delete (обработчики - offers.py)
+    Хендлеры регистрируются как OfferCb.filter(F.action == "qty_add")
+    и получают уже разобранный callback_data: OfferCb вместо split("_").
+    """
+    action: str
+    offer_id: int
 
-# Список городов Узбекистана
-CITIES_RU = ["Ташкент", "Самарканд", "Бухара", "Андижан", "Наманган", "Фергана", "Хива", "Нукус"]
-CITIES_UZ = ["Toshkent", "Samarqand", "Buxoro", "Andijon", "Namangan", "Farg'ona", "Xiva", "Nukus"]
+class ExpiryCb(CallbackData, prefix="oe"):
+    """Новый срок годности товара: oe:<offer_id>:<days> (сегодня + days)"""
+    offer_id: int
+    days: int
 
-# Категории заведений
-CATEGORIES_RU = ["Ресторан", "Кафе", "Пекарня", "Супермаркет", "Кондитерская", "Фастфуд"]
-CATEGORIES_UZ = ["Restoran", "Kafe", "Nonvoyxona", "Supermarket", "Qandolatxona", "Fastfud"]
+def get_labels(lang: str) -> dict:
+    """Получить словарь подписей для языка (по умолчанию русский)"""
+    return LABELS.get(lang, LABELS['ru'])
 
 def get_cities(lang: str) -> list:
-    """Получить список городов на нужном языке"""
-    return CITIES_UZ if lang == 'uz' else CITIES_RU
+    """Получить список городов на нужном языке (новый список - его можно менять)"""
+    return list(CITIES_UZ if lang == 'uz' else CITIES_RU)
 
 def get_categories(lang: str) -> list:
-    """Получить список категорий на нужном языке"""
-    return CATEGORIES_UZ if lang == 'uz' else CATEGORIES_RU
+    """Получить список категорий на нужном языке (новый список - его можно менять)"""
+    return list(CATEGORIES_UZ if lang == 'uz' else CATEGORIES_RU)
 
 # ============== ВЫБОР ЯЗЫКА ==============
 
@@ -103,6 +183,61 @@ def offer_manage_keyboard(offer_id: int, lang: str = 'ru'):
     builder.adjust(2)
     return builder.as_markup()
 
+def _offer_card_template(lang: str, is_active: bool) -> tuple:
+    """Строки кнопок карточки товара: ((text, callback_data с {oid}), ...)"""
+    L = get_labels(lang)
+    # Формат совпадает с OfferCb(...).pack(): o:<action>:<offer_id>
+    cb = lambda action: f"{OfferCb.__prefix__}:{action}:{{oid}}"
+    status_btn = (L['deactivate'], cb("deactivate")) if is_active else (L['activate'], cb("activate"))
+    return (
+        (("➖ 1", cb("qty_sub")), ("➕ 1", cb("qty_add"))),
+        ((L['edit'], cb("edit")), (L['extend'], cb("extend"))),
+        (status_btn, (L['delete'], cb("delete"))),
+    )
+
+# Шаблоны строятся один раз; при рендере подставляется только offer_id
+OFFER_CARD_TEMPLATES = {
+    (lang, is_active): _offer_card_template(lang, is_active)
+    for lang in LABELS for is_active in (True, False)
+}
+
+def offer_card_keyboard(offer_id: int, lang: str = 'ru', is_active: bool = True):
+    """Клавиатура карточки товара партнёра (количество, изменение, продление, статус)"""
+    template = OFFER_CARD_TEMPLATES.get((lang, is_active)) or OFFER_CARD_TEMPLATES[('ru', is_active)]
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=text, callback_data=cb.format(oid=offer_id)) for text, cb in row]
+        for row in template
+    ])
+
+# Варианты продления срока годности: дней от сегодня
+EXTEND_DAYS = (0, 1, 2, 3, 7)
+
+def offer_expiry_keyboard(offer_id: int, dates: dict, lang: str = 'ru'):
+    """Выбор нового срока годности вместо кнопок карточки.
+
+    Args:
+        dates: {days: 'дд.мм'} для EXTEND_DAYS - даты считает вызывающий
+               (по узбекскому времени, как и сам срок)
+    """
+    L = get_labels(lang)
+    names = {0: L['today'], 1: L['tomorrow'], 7: L['week']}
+    builder = InlineKeyboardBuilder()
+    for days in EXTEND_DAYS:
+        name = names.get(days) or L['plus_days'].format(days)
+        builder.button(text=f"{name} {dates[days]}", callback_data=ExpiryCb(offer_id=offer_id, days=days))
+    builder.button(text=L['cancel'], callback_data=OfferCb(action="back", offer_id=offer_id))
+    builder.adjust(2, 2, 1, 1)
+    return builder.as_markup()
+
+def offer_edit_keyboard(offer_id: int, lang: str = 'ru'):
+    """Меню изменения товара (вместо кнопок карточки)"""
+    L = get_labels(lang)
+    builder = InlineKeyboardBuilder()
+    builder.button(text=L['edit_time'], callback_data=OfferCb(action="edit_time", offer_id=offer_id))
+    builder.button(text=L['back'], callback_data=OfferCb(action="back", offer_id=offer_id))
+    builder.adjust(1)
+    return builder.as_markup()
+
 def booking_keyboard(booking_id: int, lang: str = 'ru'):
     """Клавиатура для бронирования"""
     builder = InlineKeyboardBuilder()
@@ -177,12 +312,20 @@ def cancel_keyboard(lang: str = 'ru'):
     return builder.as_markup(resize_keyboard=True)
 
 # ============== ФИЛЬТРЫ БРОНИРОВАНИЙ ==============
+
+# Названия фильтров по суффиксу callback_data bookings_<filter>
+BOOKING_FILTER_NAMES = {
+    'ru': {'active': "🟢 Активные", 'completed': "✅ Завершенные", 'cancelled': "❌ Отмененные"},
+    'uz': {'active': "🟢 Faol", 'completed': "✅ Yakunlangan", 'cancelled': "❌ Bekor qilingan"},
+}
+
 def booking_filters_keyboard(lang: str = 'ru', active: int = 0, completed: int = 0, cancelled: int = 0):
     """Клавиатура фильтров для бронирований"""
+    names = BOOKING_FILTER_NAMES.get(lang, BOOKING_FILTER_NAMES['ru'])
     builder = InlineKeyboardBuilder()
-    builder.button(text=f"🟢 Активные ({active})", callback_data="bookings_active")
-    builder.button(text=f"✅ Завершенные ({completed})", callback_data="bookings_completed")
-    builder.button(text=f"❌ Отмененные ({cancelled})", callback_data="bookings_cancelled")
+    builder.button(text=f"{names['active']} ({active})", callback_data="bookings_active")
+    builder.button(text=f"{names['completed']} ({completed})", callback_data="bookings_completed")
+    builder.button(text=f"{names['cancelled']} ({cancelled})", callback_data="bookings_cancelled")
     builder.adjust(1)
     return builder.as_markup()
 
@@ -211,6 +354,53 @@ def moderation_keyboard(store_id: int):
     builder.adjust(2)
     return builder.as_markup()
 
+def moderation_list_keyboard(stores, page: int = 0, per_page: int = 10):
+    """Одна клавиатура на страницу заявок: строка "✅ Название" + "❌" на магазин.
+
+    Callback'и те же, что у moderation_keyboard; страницы - mod_page_{n}.
+    """
+    builder = InlineKeyboardBuilder()
+    start = page * per_page
+    for store in stores[start:start + per_page]:
+        name = store[2] if len(store[2]) <= 40 else store[2][:37] + "..."
+        builder.button(text=f"✅ {name}", callback_data=f"approve_store_{store[0]}")
+        builder.button(text="❌", callback_data=f"reject_store_{store[0]}")
+    sizes = [2] * len(stores[start:start + per_page])
+
+    nav = 0
+    if page > 0:
+        builder.button(text="⬅️", callback_data=f"mod_page_{page - 1}")
+        nav += 1
+    if start + per_page < len(stores):
+        builder.button(text="➡️", callback_data=f"mod_page_{page + 1}")
+        nav += 1
+    if nav:
+        sizes.append(nav)
+    builder.adjust(*sizes)
+    return builder.as_markup()
+
+def admin_stores_keyboard(stores, status: str, page: int, has_more: bool, per_page: int = 20):
+    """Клавиатура страницы магазинов в админке: "🗑 N" на магазин сеткой по 4 + навигация.
+
+    Номера совпадают с нумерацией в тексте страницы; страницы - admin_stores_{status}_p{n}.
+    """
+    builder = InlineKeyboardBuilder()
+    for i, store in enumerate(stores, page * per_page + 1):
+        builder.button(text=f"🗑 {i}", callback_data=f"delete_store_{store[0]}")
+    sizes = [4] * ((len(stores) + 3) // 4)
+
+    nav = 0
+    if page > 0:
+        builder.button(text="⬅️", callback_data=f"admin_stores_{status}_p{page - 1}")
+        nav += 1
+    if has_more:
+        builder.button(text="➡️", callback_data=f"admin_stores_{status}_p{page + 1}")
+        nav += 1
+    if nav:
+        sizes.append(nav)
+    builder.adjust(*sizes)
+    return builder.as_markup()
+
 def settings_keyboard(notifications_enabled: bool, lang: str = 'ru', role: str | None = None):
     """Клавиатура настроек профиля с учётом роли пользователя.
     
@@ -219,13 +409,12 @@ def settings_keyboard(notifications_enabled: bool, lang: str = 'ru', role: str |
         lang: Язык интерфейса
         role: Роль пользователя ('seller' или 'customer')
     """
-    from localization import get_text
-
     builder = InlineKeyboardBuilder()
+    L = get_labels(lang)
     
     # Для партнёра показываем переключение в режим покупателя
     if role == 'seller':
-        builder.button(text="🔄 Режим покупателя" if lang == 'ru' else "🔄 Xaridor rejimi", callback_data="switch_to_customer")
+        builder.button(text=L['switch_to_customer'], callback_data="switch_to_customer")
     else:
         # Для покупателя показываем "Стать партнёром"
         builder.button(text=get_text(lang, 'become_partner'), callback_data="become_partner_cb")
@@ -235,7 +424,7 @@ def settings_keyboard(notifications_enabled: bool, lang: str = 'ru', role: str |
     builder.button(text=notif_text, callback_data="toggle_notifications")
     
     # Смена города
-    builder.button(text="🌆 Сменить город" if lang == 'ru' else "🌆 Shaharni o'zgartirish", callback_data="profile_change_city")
+    builder.button(text=L['change_city'], callback_data="profile_change_city")
     
     # Смена языка
     builder.button(text=get_text(lang, 'change_language'), callback_data="change_language")
@@ -314,12 +503,12 @@ def offers_category_filter(lang: str = 'ru'):
     categories = get_categories(lang)
     
     # Кнопка "Все предложения"
-    builder.button(text="🔥 Все" if lang == 'ru' else "🔥 Hammasi", callback_data="offers_all")
+    builder.button(text=get_labels(lang)['all_offers'], callback_data="offers_all")
     
     # Категории для фильтрации
     for i, category in enumerate(categories):
         # Убираем эмодзи для компактности, оставляем только текст
-        cat_text = category.split()[0] if len(category.split()) > 0 else category
+        cat_text = category.split(None, 1)[0] if category.strip() else category
         builder.button(text=cat_text, callback_data=f"offers_cat_{i}")
     
     builder.adjust(2, 2, 2, 1)  # 2-2-2-1 кнопок в рядах
@@ -332,8 +521,7 @@ def stores_category_selection(lang: str = 'ru', counts: dict = None):
     categories = get_categories(lang)
     
     # Кнопка "Топ по рейтингу"
-    builder.button(text="⭐ Топ по рейтингу" if lang == 'ru' else "⭐ Top reytingli", 
-                   callback_data="stores_top")
+    builder.button(text=get_labels(lang)['top_rated'], callback_data="stores_top")
     
     # Категории с количеством магазинов
     for i, category in enumerate(categories):
@@ -344,6 +532,16 @@ def stores_category_selection(lang: str = 'ru', counts: dict = None):
     builder.adjust(1, 2, 2, 2)  # 1 кнопка топ, потом по 2
     return builder.as_markup()
 
+def stores_digest_keyboard(stores):
+    """Одна кнопка на магазин для сводного списка (открывает магазин как store_selection)"""
+    builder = InlineKeyboardBuilder()
+    for store in stores:
+        name = store[2]
+        builder.button(text=f"🏪 {name[:47] + '...' if len(name) > 50 else name}",
+                       callback_data=f"store_{store[0]}")
+    builder.adjust(1)
+    return builder.as_markup()
+
 def store_selection(stores, lang: str = 'ru', cat_index: int | None = None, offset: int = 0, page_size: int = 10):
     """Inline клавиатура для выбора магазина с пагинацией."""
     builder = InlineKeyboardBuilder()
@@ -421,7 +619,7 @@ def offer_selection(offers, lang: str = 'ru', store_id: int | None = None, offse
         except (IndexError, ZeroDivisionError, TypeError) as e:
             # Пропускаем проблемные записи
             import logging
-            logging.warning(f"Error creating offer button: {e}, offer={offer}")
+            logging.warning("Error creating offer button: %s, offer=%s", e, offer)
             continue
 
     # Навигация
@@ -444,10 +642,11 @@ def offer_selection(offers, lang: str = 'ru', store_id: int | None = None, offse
 def filters_keyboard(lang: str = 'ru'):
     """Клавиатура фильтров"""
     builder = InlineKeyboardBuilder()
-    builder.button(text="💰 По цене" if lang == 'ru' else "💰 Narx bo'yicha", callback_data="filter_price")
-    builder.button(text="🏷 По категории" if lang == 'ru' else "🏷 Kategoriya bo'yicha", callback_data="filter_category")
-    builder.button(text="⭐ По рейтингу" if lang == 'ru' else "⭐ Reyting bo'yicha", callback_data="filter_rating")
-    builder.button(text="❌ Сбросить" if lang == 'ru' else "❌ Tozalash", callback_data="filter_reset")
+    L = get_labels(lang)
+    builder.button(text=L['filter_price'], callback_data="filter_price")
+    builder.button(text=L['filter_category'], callback_data="filter_category")
+    builder.button(text=L['filter_rating'], callback_data="filter_rating")
+    builder.button(text=L['filter_reset'], callback_data="filter_reset")
     builder.adjust(1)
     return builder.as_markup()
 
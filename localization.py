@@ -1,4 +1,5 @@
 # Локализация для бота Fudly
+import logging
 
 LANGUAGES = {
     'ru': '🇷🇺 Русский',
@@ -247,6 +248,8 @@ Fudly помогает спасать еду от выбрасывания и э
         # Рейтинг
         'rate_store': '⭐ <b>Оцените магазин</b>\n\n🏪 {store_name}\n\nКак вам понравилось?',
         'rating_saved': '✅ <b>Спасибо за оценку!</b>\n\nВаш отзыв поможет другим покупателям!',
+        # Всплывающее уведомление (callback.answer) вместо редактирования сообщения - без HTML
+        'rating_saved_toast': '✅ Спасибо за оценку! {stars}',
         'already_rated': 'Вы уже оценили этот заказ',
         
         # Статистика
@@ -579,6 +582,7 @@ Mijoz do'koningizni baholash uchun xabar oladi.''',
         # Baho
         'rate_store': '⭐ <b>Do\'konni baholang</b>\n\n🏪 {store_name}\n\nSizga qanday yoqdi?',
         'rating_saved': '✅ <b>Baholaganingiz uchun rahmat!</b>\n\nSizning fikringiz boshqa xaridorlarga yordam beradi!',
+        'rating_saved_toast': '✅ Baholaganingiz uchun rahmat! {stars}',
         'already_rated': 'Siz bu buyurtmani allaqachon baholagansiz',
         
         # Statistika
@@ -671,6 +675,11 @@ Bu harakatni qaytarib bo\'lmaydi!''',
     }
 }
 
+# Тексты по языку с уже подставленным русским fallback - get_text делает один dict lookup
+RESOLVED_TEXTS = {
+    lang: {**TEXTS['ru'], **texts} for lang, texts in TEXTS.items()
+}
+
 def get_text(lang: str, key: str, **kwargs) -> str:
     """Получить текст на нужном языке с форматированием
     
@@ -682,62 +691,61 @@ def get_text(lang: str, key: str, **kwargs) -> str:
     Returns:
         Отформатированная строка текста или сам ключ, если текст не найден
     """
-    try:
-        texts = TEXTS.get(lang, TEXTS.get('ru', {}))
-        text = texts.get(key, key)
-        
-        # Если текст не найден, пробуем русский
-        if text == key and lang != 'ru':
-            text = TEXTS.get('ru', {}).get(key, key)
-        
-        # Форматируем, если есть параметры и текст содержит плейсхолдеры
-        if kwargs and text != key:
-            try:
-                return text.format(**kwargs)
-            except (KeyError, ValueError) as e:
-                # Если форматирование не удалось, возвращаем текст без форматирования
-                import logging
-                logging.warning(f"Format error in get_text: {e}, key={key}, lang={lang}")
-                return text
-        
-        return text
-    except Exception as e:
-        import logging
-        logging.error(f"Error in get_text: {e}, key={key}, lang={lang}")
+    texts = RESOLVED_TEXTS.get(lang) or RESOLVED_TEXTS['ru']
+    text = texts.get(key)
+    if text is None:
         return key
+    
+    # Форматируем, если есть параметры
+    if kwargs:
+        try:
+            return text.format(**kwargs)
+        except (KeyError, ValueError, IndexError) as e:
+            # Если форматирование не удалось, возвращаем текст без форматирования
+            logging.warning("Format error in get_text: %s, key=%s, lang=%s", e, key, lang)
+    
+    return text
 
 def get_language_name(lang: str) -> str:
     """Получить название языка"""
     return LANGUAGES.get(lang, LANGUAGES['ru'])
 
+# Списки городов и категорий не зависят от запроса - собираем один раз при импорте.
+# Кортежи: общие для всех пользователей, наружу отдаются только копии (get_cities и т.п.)
+CITIES = {
+    'ru': ("Ташкент", "Самарканд", "Бухара", "Андижан", "Наманган", "Фергана", "Хива", "Нукус"),
+    'uz': ("Toshkent", "Samarqand", "Buxoro", "Andijon", "Namangan", "Farg'ona", "Xiva", "Nukus"),
+}
+
+CATEGORIES = {
+    'ru': ("Ресторан", "Кафе", "Пекарня", "Супермаркет", "Кондитерская", "Фастфуд"),
+    'uz': ("Restoran", "Kafe", "Nonvoyxona", "Supermarket", "Qandolatxona", "Fastfud"),
+}
+
+CATEGORY_UZ_TO_RU = dict(zip(CATEGORIES['uz'], CATEGORIES['ru']))
+
 def get_cities(lang: str) -> list:
-    """Получить список городов на нужном языке"""
-    return [
-        "Ташкент" if lang == 'ru' else "Toshkent",
-        "Самарканд" if lang == 'ru' else "Samarqand",
-        "Бухара" if lang == 'ru' else "Buxoro",
-        "Андижан" if lang == 'ru' else "Andijon",
-        "Наманган" if lang == 'ru' else "Namangan",
-        "Фергана" if lang == 'ru' else "Farg'ona",
-        "Хива" if lang == 'ru' else "Xiva",
-        "Нукус" if lang == 'ru' else "Nukus"
-    ]
+    """Получить список городов на нужном языке (новый список - его можно менять)"""
+    return list(CITIES['ru'] if lang == 'ru' else CITIES['uz'])
 
 def get_categories(lang: str) -> list:
-    """Получить список категорий на нужном языке"""
-    if lang == 'ru':
-        return ["Ресторан", "Кафе", "Пекарня", "Супермаркет", "Кондитерская", "Фастфуд"]
-    else:
-        return ["Restoran", "Kafe", "Nonvoyxona", "Supermarket", "Qandolatxona", "Fastfud"]
+    """Получить список категорий на нужном языке (новый список - его можно менять)"""
+    return list(CATEGORIES['ru'] if lang == 'ru' else CATEGORIES['uz'])
 
 def normalize_category(category: str) -> str:
     """Нормализовать категорию к русскому для БД"""
-    mapping = {
-        'Restoran': 'Ресторан',
-        'Kafe': 'Кафе',
-        'Nonvoyxona': 'Пекарня',
-        'Supermarket': 'Супермаркет',
-        'Qandolatxona': 'Кондитерская',
-        'Fastfud': 'Фастфуд'
-    }
-    return mapping.get(category, category)
+    return CATEGORY_UZ_TO_RU.get(category, category)
+
+# Категории в том виде, в каком они хранятся в БД, по индексу из get_categories(lang)
+NORMALIZED_CATEGORIES = {
+    lang: tuple(normalize_category(c) for c in cats) for lang, cats in CATEGORIES.items()
+}
+
+def get_normalized_category(lang: str, index: int) -> str:
+    """Категория для запроса в БД по индексу кнопки (stores_cat_{index})"""
+    return NORMALIZED_CATEGORIES['ru' if lang == 'ru' else 'uz'][index]
+
+def localized_category_counts(lang: str, counts: dict) -> dict:
+    """{категория на языке lang: количество} из {категория в БД: количество}"""
+    key = 'ru' if lang == 'ru' else 'uz'
+    return dict(zip(CATEGORIES[key], (counts.get(nc, 0) for nc in NORMALIZED_CATEGORIES[key])))
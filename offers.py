@@ -0,0 +1,247 @@
+"""
+Seller offer handlers: the "My offers" list and the offer card actions
+
+The cards come from common.render_offer_card and their buttons carry typed
+OfferCb / ExpiryCb payloads, parsed by the filters below.
+
+This module owns the following texts and callbacks. Their bot.py copies
+must be commented out when setup() is wired in; the old string payloads
+are no longer emitted by the cards:
+  texts:     "Мои товары" / "Mening mahsulotlarim" (my_offers)
+  callbacks: o:<action>:<offer_id> and oe:<offer_id>:<days>, replacing
+             qty_add_, qty_sub_, extend_offer_, setexp_, cancel_extend,
+             deactivate_offer_, activate_offer_, delete_offer_,
+             edit_offer_, edit_time_ and the edit_time_from/until
+             message handlers
+"""
+from aiogram import Router, types, F
+from aiogram.fsm.context import FSMContext
+
+from keyboards import EXTEND_DAYS, ExpiryCb, OfferCb, offer_edit_keyboard, offer_expiry_keyboard
+
+router = Router()
+
+# my_offers shows at most this many cards; the rest is summarised in one line
+MY_OFFERS_LIMIT = 20
+
+# Per-language text fragments, picked once per render instead of per-string ternaries
+OFFER_TEXT = {
+    'ru': {
+        'header': "📦 <b>Ваши товары</b>\nНайдено: {} товаров",
+        'more': "... и ещё {} товаров",
+        'added': "✅ +1 (теперь {})",
+        'removed': "✅ -1 (теперь {})",
+        'sold_out': "⚠️ Количество 0 - товар снят с продажи",
+        'deactivated': "✅ Товар снят с продажи",
+        'activated': "✅ Товар активирован",
+        'deleted': "🗑 Товар удалён",
+        'pick_expiry': "📅 Выберите новый срок годности",
+        'extended': "✅ Срок продлён до {}",
+        'time_prompt': "🕐 <b>Изменение времени забора</b>\n\nТекущее время: {} - {}\n\n"
+                       "Введите новое время начала (например: 18:00):",
+        'time_until': "Введите время окончания (например: 21:00):",
+        'time_invalid': "❌ Неверный формат! Введите время в формате ЧЧ:ММ (например: 18:00)",
+        'time_saved': "✅ Время забора обновлено!\n\n🕐 {} - {}",
+    },
+    'uz': {
+        'header': "📦 <b>Sizning mahsulotlaringiz</b>\nTopildi: {} mahsulot",
+        'more': "... va yana {} mahsulot",
+        'added': "✅ +1 (endi {})",
+        'removed': "✅ -1 (endi {})",
+        'sold_out': "⚠️ Miqdor 0 - mahsulot sotuvdan olindi",
+        'deactivated': "✅ Mahsulot sotuvdan olindi",
+        'activated': "✅ Mahsulot faollashtirildi",
+        'deleted': "🗑 Mahsulot o'chirildi",
+        'pick_expiry': "📅 Yangi yaroqlilik muddatini tanlang",
+        'extended': "✅ Muddat {} gacha uzaytirildi",
+        'time_prompt': "🕐 <b>Olib ketish vaqtini o'zgartirish</b>\n\nJoriy vaqt: {} - {}\n\n"
+                       "Yangi boshlanish vaqtini kiriting (masalan: 18:00):",
+        'time_until': "Tugash vaqtini kiriting (masalan: 21:00):",
+        'time_invalid': "❌ Noto'g'ri format! ЧЧ:ММ formatida vaqt kiriting (masalan: 18:00)",
+        'time_saved': "✅ Olib ketish vaqti yangilandi!\n\n🕐 {} - {}",
+    },
+}
+
+
+def offer_text(lang: str) -> dict:
+    return OFFER_TEXT.get(lang, OFFER_TEXT['ru'])
+
+
+def setup(dp_or_router, db, get_text, main_menu_seller, validator):
+    """Setup seller offer handlers with dependencies"""
+    from handlers.common import EditOffer, format_uzb_date, render_offer_card, send_queue
+
+    async def show_card(message, offer, lang: str) -> None:
+        """Re-render an offer card in place (caption for photo cards, text otherwise)"""
+        text, markup = render_offer_card(offer, lang)
+        try:
+            if message.photo:
+                await message.edit_caption(caption=text, parse_mode="HTML", reply_markup=markup)
+            else:
+                await message.edit_text(text, parse_mode="HTML", reply_markup=markup)
+        except Exception:
+            # "message is not modified" and the like: the card already shows this
+            pass
+
+    async def owned_offer(callback: types.CallbackQuery, offer_id: int, lang: str):
+        """The offer if it exists and belongs to the caller; otherwise answer and return None"""
+        offer = db.get_offer(offer_id)
+        if not offer:
+            await callback.answer(get_text(lang, "offer_not_found"), show_alert=True)
+            return None
+        if offer.store_id not in db.get_user_store_ids(callback.from_user.id):
+            await callback.answer(get_text(lang, "not_your_offer"), show_alert=True)
+            return None
+        return offer
+
+    @dp_or_router.message(
+        F.text.contains("Мои товары") | F.text.contains("Мои предложения")
+        | F.text.contains("Mening mahsulotlarim") | F.text.contains("Mening taklif")
+    )
+    async def my_offers(message: types.Message, lang: str = None):
+        lang = lang or db.get_user_language(message.from_user.id)
+        if not db.get_user_store_ids(message.from_user.id):
+            await message.answer(get_text(lang, 'no_stores'))
+            return
+
+        offers = db.get_offers_for_user(message.from_user.id)
+        if not offers:
+            await message.answer(get_text(lang, 'no_offers_yet'))
+            return
+
+        T = offer_text(lang)
+        await message.answer(T['header'].format(len(offers)), parse_mode="HTML")
+        # Cards go through the per-chat queue: the handler returns at once
+        # and a long list never holds up other chats
+        chat_id = message.chat.id
+        for offer in offers[:MY_OFFERS_LIMIT]:
+            text, markup = render_offer_card(offer, lang)
+            await send_queue.put(message.bot, chat_id, text, photo=offer.photo,
+                                 parse_mode="HTML", reply_markup=markup)
+        if len(offers) > MY_OFFERS_LIMIT:
+            await send_queue.put(message.bot, chat_id, T['more'].format(len(offers) - MY_OFFERS_LIMIT))
+
+    @dp_or_router.callback_query(OfferCb.filter(F.action.in_({"qty_add", "qty_sub"})))
+    async def offer_quantity(callback: types.CallbackQuery, callback_data: OfferCb, lang: str = None):
+        lang = lang or db.get_user_language(callback.from_user.id)
+        delta = 1 if callback_data.action == "qty_add" else -1
+        # One UPDATE ... RETURNING: ownership check, clamp at 0 and status switch
+        offer = db.adjust_quantity(callback_data.offer_id, delta, callback.from_user.id)
+        if offer is None:
+            await owned_offer(callback, callback_data.offer_id, lang)
+            return
+
+        await show_card(callback.message, offer, lang)
+        T = offer_text(lang)
+        if delta > 0:
+            await callback.answer(T['added'].format(offer.quantity))
+        elif offer.quantity == 0:
+            await callback.answer(T['sold_out'], show_alert=True)
+        else:
+            await callback.answer(T['removed'].format(offer.quantity))
+
+    @dp_or_router.callback_query(OfferCb.filter(F.action.in_({"deactivate", "activate"})))
+    async def offer_status(callback: types.CallbackQuery, callback_data: OfferCb, lang: str = None):
+        lang = lang or db.get_user_language(callback.from_user.id)
+        if not await owned_offer(callback, callback_data.offer_id, lang):
+            return
+
+        if callback_data.action == "deactivate":
+            db.deactivate_offer(callback_data.offer_id)
+        else:
+            db.activate_offer(callback_data.offer_id)
+        await show_card(callback.message, db.get_offer(callback_data.offer_id), lang)
+        await callback.answer(offer_text(lang)[callback_data.action + 'd'])
+
+    @dp_or_router.callback_query(OfferCb.filter(F.action == "delete"))
+    async def offer_delete(callback: types.CallbackQuery, callback_data: OfferCb, lang: str = None):
+        lang = lang or db.get_user_language(callback.from_user.id)
+        if not await owned_offer(callback, callback_data.offer_id, lang):
+            return
+
+        db.delete_offer(callback_data.offer_id)
+        try:
+            await callback.message.delete()
+        except Exception:
+            pass
+        await callback.answer(offer_text(lang)['deleted'])
+
+    @dp_or_router.callback_query(OfferCb.filter(F.action == "extend"))
+    async def offer_extend(callback: types.CallbackQuery, callback_data: OfferCb, lang: str = None):
+        lang = lang or db.get_user_language(callback.from_user.id)
+        if not await owned_offer(callback, callback_data.offer_id, lang):
+            return
+
+        dates = {days: format_uzb_date('%d.%m', days) for days in EXTEND_DAYS}
+        await callback.message.edit_reply_markup(
+            reply_markup=offer_expiry_keyboard(callback_data.offer_id, dates, lang)
+        )
+        await callback.answer(offer_text(lang)['pick_expiry'])
+
+    @dp_or_router.callback_query(ExpiryCb.filter())
+    async def offer_set_expiry(callback: types.CallbackQuery, callback_data: ExpiryCb, lang: str = None):
+        lang = lang or db.get_user_language(callback.from_user.id)
+        if not await owned_offer(callback, callback_data.offer_id, lang):
+            return
+
+        new_expiry = format_uzb_date('%Y-%m-%d', callback_data.days)
+        db.update_offer_expiry(callback_data.offer_id, new_expiry)
+        await show_card(callback.message, db.get_offer(callback_data.offer_id), lang)
+        await callback.answer(offer_text(lang)['extended'].format(new_expiry))
+
+    @dp_or_router.callback_query(OfferCb.filter(F.action == "edit"))
+    async def offer_edit(callback: types.CallbackQuery, callback_data: OfferCb, lang: str = None):
+        lang = lang or db.get_user_language(callback.from_user.id)
+        if not await owned_offer(callback, callback_data.offer_id, lang):
+            return
+
+        await callback.message.edit_reply_markup(reply_markup=offer_edit_keyboard(callback_data.offer_id, lang))
+        await callback.answer()
+
+    @dp_or_router.callback_query(OfferCb.filter(F.action == "back"))
+    async def offer_back(callback: types.CallbackQuery, callback_data: OfferCb, lang: str = None):
+        """Leave the edit/extend menu: restore the card buttons"""
+        lang = lang or db.get_user_language(callback.from_user.id)
+        offer = await owned_offer(callback, callback_data.offer_id, lang)
+        if not offer:
+            return
+
+        await show_card(callback.message, offer, lang)
+        await callback.answer()
+
+    @dp_or_router.callback_query(OfferCb.filter(F.action == "edit_time"))
+    async def offer_edit_time(callback: types.CallbackQuery, callback_data: OfferCb, state: FSMContext,
+                              lang: str = None):
+        lang = lang or db.get_user_language(callback.from_user.id)
+        offer = await owned_offer(callback, callback_data.offer_id, lang)
+        if not offer:
+            return
+
+        await state.update_data(offer_id=offer.offer_id, field='available_from')
+        await state.set_state(EditOffer.value)
+        await callback.message.answer(
+            offer_text(lang)['time_prompt'].format(offer.available_from, offer.available_until),
+            parse_mode="HTML"
+        )
+        await callback.answer()
+
+    @dp_or_router.message(EditOffer.value)
+    async def offer_edit_time_value(message: types.Message, state: FSMContext, lang: str = None):
+        """Pickup window: first the start time, then the end time"""
+        lang = lang or db.get_user_language(message.from_user.id)
+        T = offer_text(lang)
+        value = (message.text or '').strip()
+        if not validator.validate_time(value):
+            await message.answer(T['time_invalid'])
+            return
+
+        data = await state.get_data()
+        if data.get('field') == 'available_from':
+            await state.update_data(available_from=value, field='available_until')
+            await message.answer(T['time_until'], reply_markup=types.ReplyKeyboardRemove())
+            return
+
+        db.update_offer_pickup_time(data['offer_id'], data['available_from'], value)
+        await state.clear()
+        await message.answer(T['time_saved'].format(data['available_from'], value),
+                             reply_markup=main_menu_seller(lang))
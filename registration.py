@@ -40,7 +40,7 @@ def setup(dp_or_router, db, get_text, get_cities, city_keyboard, main_menu_custo
                 await message.answer(get_text(lang, 'rate_limit_exceeded'))
                 return
         except Exception as e:
-            logger.warning(f"Rate limiter error: {e}")
+            logger.warning("Rate limiter error: %s", e)
         
         cities = get_cities(lang)
         city_text = validator.sanitize_text(message.text.replace("📍 ", "").strip())
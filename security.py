@@ -1,5 +1,6 @@
 import re
 import html
+import time
 from typing import Optional, Dict, Any
 from logging_config import logger
 
@@ -12,6 +13,7 @@ class InputValidator:
     USERNAME_PATTERN = re.compile(r'^[a-zA-Z0-9_]{3,32}$')
     CITY_PATTERN = re.compile(r'^[a-zA-Zа-яА-Я\s\-]{1,50}$', re.UNICODE)
     PRICE_PATTERN = re.compile(r'^\d+(\.\d{1,2})?$')
+    TIME_PATTERN = re.compile(r'^([01]?\d|2[0-3]):[0-5]\d$')
     
     @staticmethod
     def sanitize_text(text: str, max_length: int = 1000) -> str:
@@ -65,6 +67,13 @@ class InputValidator:
         
         return False, 0.0
     
+    @staticmethod
+    def validate_time(time_str: str) -> bool:
+        """Validate HH:MM time (24h), e.g. offer pickup window bounds."""
+        if not time_str:
+            return False
+        return bool(InputValidator.TIME_PATTERN.match(time_str.strip()))
+    
     @staticmethod
     def validate_quantity(quantity_str: str) -> tuple[bool, int]:
         """Validate and parse quantity string."""
@@ -89,28 +98,23 @@ class RateLimiter:
         
     def is_allowed(self, user_id: int, action: str, max_requests: int = 10, window_seconds: int = 60) -> bool:
         """Check if user is allowed to perform action within rate limit."""
-        import time
-        
         current_time = time.time()
-        
-        if user_id not in self._user_requests:
-            self._user_requests[user_id] = {}
-        
-        if action not in self._user_requests[user_id]:
-            self._user_requests[user_id][action] = []
-        
+
+        # Resolve the per-user bucket once and work on locals afterwards
+        user_actions = self._user_requests.setdefault(user_id, {})
+
         # Clean old timestamps
-        requests = self._user_requests[user_id][action]
-        self._user_requests[user_id][action] = [
-            ts for ts in requests if current_time - ts < window_seconds
+        requests = [
+            ts for ts in user_actions.get(action, ()) if current_time - ts < window_seconds
         ]
-        
+        user_actions[action] = requests
+
         # Check if under limit
-        if len(self._user_requests[user_id][action]) < max_requests:
-            self._user_requests[user_id][action].append(current_time)
+        if len(requests) < max_requests:
+            requests.append(current_time)
             return True
         
-        logger.warning(f"Rate limit exceeded for user {user_id} action {action}")
+        logger.warning("Rate limit exceeded for user %s action %s", user_id, action)
         return False
 
 
@@ -129,7 +133,7 @@ def secure_user_input(func):
     async def wrapper(*args, **kwargs):
         try:
             # Log the function call for security monitoring
-            logger.info(f"Handler called: {func.__name__}")
+            logger.debug("Handler called: %s", func.__name__)
             
             # Если функция асинхронная - вызываем напрямую
             if inspect.iscoroutinefunction(func):
@@ -140,7 +144,7 @@ def secure_user_input(func):
                 return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
                 
         except Exception as e:
-            logger.error(f"Handler {func.__name__} failed: {str(e)}")
+            logger.error("Handler %s failed: %s", func.__name__, e)
             raise
     
     return wrapper
@@ -151,8 +155,8 @@ def validate_admin_action(user_id: int, db) -> bool:
     try:
         is_admin = db.is_admin(user_id)
         if not is_admin:
-            logger.warning(f"Unauthorized admin action attempt by user {user_id}")
+            logger.warning("Unauthorized admin action attempt by user %s", user_id)
         return is_admin
     except Exception as e:
-        logger.error(f"Admin validation failed for user {user_id}: {str(e)}")
+        logger.error("Admin validation failed for user %s: %s", user_id, e)
         return False
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""
+Store browsing handlers for customers: "All stores", top stores and stores by category
+
+Store lists go out as one digest message (common.render_stores_digest)
+instead of a card per store with a pause between sends.
+
+This module owns the following texts and callbacks. Their bot.py copies
+must be commented out when setup() is wired in:
+  texts:     "Все магазины" / "Barcha dokonlar" (all_stores)
+  callbacks: stores_top, stores_cat_<index>
+The digest buttons send store_<id>, which stays with the bot.py store
+handler.
+"""
+import html
+import re
+
+from aiogram import Router, types, F
+
+from keyboards import stores_category_selection
+from localization import CATEGORIES, get_cities, get_normalized_category, localized_category_counts
+
+router = Router()
+
+# Compiled once: the category index is parsed by the filter itself
+STORES_CAT_RE = re.compile(r"^stores_cat_(\d+)$")
+
+# How many stores a top / category digest shows
+TOP_STORES_LIMIT = 10
+CATEGORY_STORES_LIMIT = 15
+
+# Per-language text fragments, picked once per render instead of per-string ternaries
+STORES_TEXT = {
+    'ru': {
+        'title': "🏪 <b>МАГАЗИНЫ</b>\n📍 {}\n\nВсего магазинов: {}\n\nВыберите категорию:",
+        'empty_city': "😔 В городе {} пока нет активных магазинов.\n\nСтаньте первым партнером! 🤝",
+        'top': "⭐ <b>ТОП МАГАЗИНЫ</b>\n📍 {}\n\nЛучшие по рейтингу:",
+        'category': "🏪 <b>{}</b>\n📍 {}\n\nНайдено: {} магазинов",
+        'none_found': "😔 Магазинов не найдено",
+        'empty_category': "😔 В категории {} нет магазинов",
+    },
+    'uz': {
+        'title': "🏪 <b>DOKONLAR</b>\n📍 {}\n\nJami dokonlar: {}\n\nKategoriyani tanlang:",
+        'empty_city': "😔 {} shahrida hali faol dokonlar yo'q.\n\nBirinchi hamkor bo'ling! 🤝",
+        'top': "⭐ <b>TOP DOKONLAR</b>\n📍 {}\n\nEng yaxshi reytingli:",
+        'category': "🏪 <b>{}</b>\n📍 {}\n\nTopildi: {} dokon",
+        'none_found': "😔 Dokonlar topilmadi",
+        'empty_category': "😔 {} kategoriyasida dokonlar yo'q",
+    },
+}
+
+
+def stores_text(lang: str) -> dict:
+    return STORES_TEXT.get(lang, STORES_TEXT['ru'])
+
+
+def setup(dp_or_router, db, get_text):
+    """Setup store browsing handlers with dependencies"""
+    from handlers.common import normalize_city, render_stores_digest
+
+    def resolve_city(user_id, user, lang):
+        """(display city, DB city, lang) from the injected user row, falling back to the DB"""
+        if user is None:
+            user = db.get_user(user_id)
+        if lang is None:
+            lang = (user[5] if user and len(user) > 5 else None) or 'ru'
+        city = (user[4] if user and len(user) > 4 else None) or get_cities(lang)[0]
+        return city, normalize_city(city), lang
+
+    @dp_or_router.message(F.text.contains("Все магазины") | F.text.contains("Barcha dokonlar"))
+    async def all_stores(message: types.Message, user=None, lang: str = None):
+        """Category picker with the number of stores in each category"""
+        city, search_city, lang = resolve_city(message.from_user.id, user, lang)
+        T = stores_text(lang)
+
+        counts = db.get_stores_count_by_category(search_city)
+        total = sum(counts.values())
+        if total == 0:
+            await message.answer(T['empty_city'].format(html.escape(city)), parse_mode="HTML")
+            return
+
+        await message.answer(
+            T['title'].format(html.escape(city), total),
+            parse_mode="HTML",
+            reply_markup=stores_category_selection(lang, localized_category_counts(lang, counts))
+        )
+
+    @dp_or_router.callback_query(F.data == "stores_top")
+    async def show_top_stores(callback: types.CallbackQuery, user=None, lang: str = None):
+        city, search_city, lang = resolve_city(callback.from_user.id, user, lang)
+        T = stores_text(lang)
+
+        stores = db.get_top_stores_by_city(search_city, limit=TOP_STORES_LIMIT)
+        if not stores:
+            await callback.answer(T['none_found'], show_alert=True)
+            return
+
+        digest, markup = render_stores_digest(stores, lang, limit=TOP_STORES_LIMIT)
+        await callback.message.edit_text(
+            T['top'].format(html.escape(city)) + "\n\n" + digest,
+            parse_mode="HTML", reply_markup=markup
+        )
+        await callback.answer()
+
+    @dp_or_router.callback_query(F.data.regexp(STORES_CAT_RE).as_("cat_match"))
+    async def show_stores_by_category(callback: types.CallbackQuery, cat_match: re.Match,
+                                      user=None, lang: str = None):
+        city, search_city, lang = resolve_city(callback.from_user.id, user, lang)
+        T = stores_text(lang)
+        cat_index = int(cat_match.group(1))
+        categories = CATEGORIES['ru' if lang == 'ru' else 'uz']
+        if cat_index >= len(categories):
+            await callback.answer(T['none_found'], show_alert=True)
+            return
+
+        category = categories[cat_index]
+        db_category = get_normalized_category(lang, cat_index)
+        total = db.get_stores_count_by_category(search_city).get(db_category, 0)
+        if not total:
+            await callback.answer(T['empty_category'].format(category), show_alert=True)
+            return
+
+        # Sorting by the cached rating and the LIMIT run in SQL
+        stores = db.get_stores_by_category(db_category, search_city,
+                                           order_by='rating', limit=CATEGORY_STORES_LIMIT)
+        digest, markup = render_stores_digest(stores, lang, limit=CATEGORY_STORES_LIMIT)
+        await callback.message.edit_text(
+            T['category'].format(html.escape(category.upper()), html.escape(city), total) + "\n\n" + digest,
+            parse_mode="HTML", reply_markup=markup
+        )
+        await callback.answer()
@@ -0,0 +1,48 @@
+"""
+Shared fixtures. The handler modules live at the repo root but import each
+other as the `handlers` package (e.g. `from handlers.common import ...`),
+so the root is registered under that name here.
+"""
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+if 'handlers' not in sys.modules:
+    _pkg = types.ModuleType('handlers')
+    _pkg.__path__ = [ROOT]
+    sys.modules['handlers'] = _pkg
+
+from database import Database  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Fresh database file per test"""
+    return Database(str(tmp_path / 'test.db'))
+
+
+class HandlerCollector:
+    """Stands in for a Router in setup(): records handlers by function name"""
+
+    def __init__(self):
+        self.handlers = {}
+
+    def _register(self, *args, **kwargs):
+        def decorator(func):
+            self.handlers[func.__name__] = func
+            return func
+        return decorator
+
+    message = callback_query = _register
+
+    def __getitem__(self, name):
+        return self.handlers[name]
+
+
+@pytest.fixture
+def collector():
+    return HandlerCollector()
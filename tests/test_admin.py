@@ -0,0 +1,93 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from handlers import admin
+from handlers.common import LAST_SCREEN
+
+
+@pytest.fixture
+def handlers(db, collector, monkeypatch):
+    monkeypatch.setattr(admin, 'REFRESH_MIN_INTERVAL', 0)
+    admin.setup(collector, db, lambda *a, **k: '', lambda: None)
+    db.add_user(1, 'admin', 'Admin')
+    db.set_admin(1)
+    return collector
+
+
+def make_callback(message_id=100):
+    callback = MagicMock()
+    callback.from_user.id = 1
+    callback.answer = AsyncMock()
+    callback.message.chat.id = 1
+    callback.message.message_id = message_id
+    callback.message.edit_text = AsyncMock()
+    return callback
+
+
+def test_refresh_shows_new_data_and_skips_identical_screen(db, handlers):
+    LAST_SCREEN.clear()
+    refresh = handlers['admin_refresh_dashboard']
+    callback = make_callback()
+
+    asyncio.run(refresh(callback))
+    assert callback.message.edit_text.await_count == 1
+
+    # Nothing changed: the screen hash matches and no edit is sent
+    asyncio.run(refresh(callback))
+    assert callback.message.edit_text.await_count == 1
+    assert "без изменений" in callback.answer.await_args.args[0]
+
+    # A new user must show up on the very next refresh
+    db.add_user(2, 'user', 'User')
+    asyncio.run(refresh(callback))
+    assert callback.message.edit_text.await_count == 2
+    assert "Всего: 2" in callback.message.edit_text.await_args.args[0]
+
+
+def test_refresh_is_debounced_per_admin(db, handlers, monkeypatch):
+    LAST_SCREEN.clear()
+    admin.LAST_REFRESH.clear()
+    monkeypatch.setattr(admin, 'REFRESH_MIN_INTERVAL', 60)
+    refresh = handlers['admin_refresh_dashboard']
+    callback = make_callback(message_id=101)
+
+    asyncio.run(refresh(callback))
+    db.add_user(2, 'user', 'User')
+    asyncio.run(refresh(callback))
+
+    assert callback.message.edit_text.await_count == 1
+    assert "Слишком часто" in callback.answer.await_args.args[0]
+
+
+def button_data(markup):
+    return [button.callback_data for row in markup.inline_keyboard for button in row]
+
+
+def test_moderation_list_pages_through_pending_stores(db, handlers):
+    LAST_SCREEN.clear()
+    db.add_user(10, 'seller', 'Seller', role='seller')
+    ids = [db.add_store(10, f'Store {i}', 'Ташкент') for i in range(12)]
+
+    callback = make_callback(message_id=102)
+    callback.message.answer = AsyncMock()
+    asyncio.run(handlers['admin_moderation'](callback))
+    first = button_data(callback.message.answer.await_args.kwargs['reply_markup'])
+    assert first[-1] == 'mod_page_1'
+    assert len([d for d in first if d.startswith('approve_store_')]) == admin.MODERATION_PAGE_SIZE
+
+    match = admin.MOD_PAGE_RE.match(first[-1])
+    asyncio.run(handlers['admin_moderation_page'](callback, match))
+    text = callback.message.edit_text.await_args.args[0]
+    second = button_data(callback.message.edit_text.await_args.kwargs['reply_markup'])
+    assert "Заявки на модерацию: 12" in text
+    assert len([d for d in second if d.startswith('approve_store_')]) == 2
+    assert second[-1] == 'mod_page_0'
+
+
+def test_moderation_without_pending_stores(db, handlers):
+    callback = make_callback()
+    callback.message.answer = AsyncMock()
+    asyncio.run(handlers['admin_moderation'](callback))
+    assert callback.message.answer.await_args.kwargs['reply_markup'] is None
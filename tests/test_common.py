@@ -0,0 +1,100 @@
+import asyncio
+import random
+
+from aiogram.types import Update
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from handlers.common import (
+    METRIC_SLOTS, M_UPDATES_ERRORS, M_UPDATES_RECEIVED, UpdateQueue, setup_webhook_routes, update_chat_key,
+)
+
+
+def make_update(update_id, chat_id, callback=False):
+    user = {'id': chat_id, 'is_bot': False, 'first_name': 'U'}
+    message = {'message_id': update_id, 'date': 0, 'chat': {'id': chat_id, 'type': 'private'},
+               'from': user, 'text': str(update_id)}
+    if callback:
+        return Update.model_validate({'update_id': update_id, 'callback_query': {
+            'id': str(update_id), 'from': user, 'chat_instance': 'x', 'data': 'd', 'message': message}})
+    return Update.model_validate({'update_id': update_id, 'message': message})
+
+
+def test_update_chat_key():
+    assert update_chat_key(make_update(1, 42)) == 42
+    assert update_chat_key(make_update(2, 43, callback=True)) == 43
+    assert update_chat_key(Update.model_validate({'update_id': 3})) == 0
+
+
+class RecordingDispatcher:
+    def __init__(self):
+        self.seen = {}
+        self.running = 0
+        self.max_running = 0
+
+    async def feed_update(self, bot, update):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(random.uniform(0, 0.01))
+        self.seen.setdefault(update_chat_key(update), []).append(update.update_id)
+        self.running -= 1
+
+
+def test_update_queue_keeps_per_chat_order():
+    async def run():
+        dp = RecordingDispatcher()
+        queue = UpdateQueue(dp, bot=None, workers=4, maxsize=1000)
+        queue.start()
+        sent = {}
+        for update_id in range(200):
+            chat_id = update_id % 7
+            assert queue.put(make_update(update_id, chat_id, callback=update_id % 2 == 0))
+            sent.setdefault(chat_id, []).append(update_id)
+        await queue.stop()
+        return dp, sent
+
+    dp, sent = asyncio.run(run())
+    assert dp.seen == sent
+    assert dp.max_running > 1
+
+
+def test_update_queue_drops_when_shard_full():
+    async def run():
+        queue = UpdateQueue(RecordingDispatcher(), bot=None, workers=2, maxsize=2)
+        queue.start()
+        results = [queue.put(make_update(i, 2)) for i in range(3)]
+        await queue.stop()
+        return results
+
+    assert asyncio.run(run()) == [True, False, False]
+
+
+def test_webhook_routes_feed_the_update_queue():
+    async def run():
+        dp = RecordingDispatcher()
+        queue = UpdateQueue(dp, bot=None, workers=2)
+        app = web.Application()
+        setup_webhook_routes(app, queue, path='/webhook', secret_token='s3cret')
+        queue.start()
+        received, errors = METRIC_SLOTS[M_UPDATES_RECEIVED], METRIC_SLOTS[M_UPDATES_ERRORS]
+        headers = {'X-Telegram-Bot-Api-Secret-Token': 's3cret'}
+        async with TestClient(TestServer(app)) as client:
+            body = make_update(1, 42).model_dump_json(exclude_none=True)
+            ok = await client.post('/webhook', data=body, headers=headers)
+            slash = await client.post('/webhook/', data=make_update(2, 42).model_dump_json(exclude_none=True),
+                                      headers=headers)
+            forbidden = await client.post('/webhook', data=body, headers={'X-Telegram-Bot-Api-Secret-Token': 'x'})
+            garbage = await client.post('/webhook', data=b'not json', headers=headers)
+            await queue.stop()
+            metrics = await (await client.get('/metrics')).text()
+            snapshot = await (await client.get('/metrics.json')).json()
+        return (ok.status, slash.status, forbidden.status, garbage.status, dp.seen,
+                METRIC_SLOTS[M_UPDATES_RECEIVED] - received, METRIC_SLOTS[M_UPDATES_ERRORS] - errors,
+                metrics, snapshot)
+
+    ok, slash, forbidden, garbage, seen, received, errors, metrics, snapshot = asyncio.run(run())
+
+    assert (ok, slash, forbidden, garbage) == (200, 200, 403, 200)
+    assert seen == {42: [1, 2]}
+    assert (received, errors) == (2, 1)
+    assert f"fudly_updates_received {snapshot['updates_received']}\n" in metrics
@@ -0,0 +1,289 @@
+import sqlite3
+
+import pytest
+
+from database import RECALC_STORE_RATING_SQL, Database
+
+
+@pytest.fixture
+def seller(db):
+    db.add_user(10, 'seller', 'Seller', role='seller')
+    return 10
+
+
+@pytest.mark.parametrize('use_counts_table', [True, False])
+def test_count_stores_by_status(db, seller, use_counts_table):
+    db.use_counts_table = use_counts_table
+    first = db.add_store(seller, 'A', 'Ташкент')
+    db.add_store(seller, 'B', 'Ташкент')
+    db.add_store(seller, 'C', 'Ташкент')
+    db.approve_store(first)
+
+    assert db.count_stores_by_status('active') == 1
+    assert db.count_stores_by_status('pending') == 2
+    assert db.count_stores_by_status('rejected') == 0
+
+
+def add_offer(db, store_id, title='Хлеб', quantity=5, expiry='2999-01-01'):
+    return db.add_offer(store_id, title, '', 10000, 5000, quantity,
+                        '2024-01-01 09:00', '2024-01-01 21:00', expiry_date=expiry)
+
+
+@pytest.fixture
+def store(db, seller):
+    store_id = db.add_store(seller, 'Store', 'Ташкент')
+    db.approve_store(store_id)
+    return store_id
+
+
+def test_active_offers_page_limits_in_sql_and_counts_all(db, seller, store):
+    ids = [add_offer(db, store, title=f'T{i}') for i in range(5)]
+    add_offer(db, store, title='expired', expiry='2000-01-01')
+    add_offer(db, store, title='sold out', quantity=0)
+    pending_store = db.add_store(seller, 'Pending', 'Ташкент')
+    add_offer(db, pending_store, title='not approved')
+
+    offers, total = db.get_active_offers_page(limit=3)
+
+    assert total == 5
+    assert [o.offer_id for o in offers] == ids[::-1][:3]
+    assert db.get_active_offers_page(limit=3, offset=3)[0][-1].offer_id == ids[0]
+
+
+def test_upsert_store_rating_inserts_then_updates(db, store):
+    db.add_user(20, 'buyer', 'Buyer')
+
+    assert db.upsert_store_rating(store, 20, 4) is False
+    assert db.upsert_store_rating(store, 20, 2) is True
+
+    assert len(db.get_store_ratings(store)) == 1
+    assert db.get_store_average_rating(store) == 2
+
+
+@pytest.mark.parametrize('rating', [0, 6, 2.5, True])
+def test_upsert_store_rating_rejects_out_of_range(db, store, rating):
+    db.add_user(20, 'buyer', 'Buyer')
+    db.upsert_store_rating(store, 20, 3)
+
+    with pytest.raises(ValueError):
+        db.upsert_store_rating(store, 20, rating)
+
+    assert len(db.get_store_ratings(store)) == 1
+    assert db.get_store_average_rating(store) == 3
+
+
+def test_pooled_connection_forwards_attribute_writes(db):
+    conn = db.get_connection()
+    conn.row_factory = sqlite3.Row
+    row = conn.execute('SELECT 1 AS one').fetchone()
+    conn.close()
+
+    assert row['one'] == 1
+
+    conn = db.get_connection()
+    try:
+        assert conn.row_factory is None
+        assert conn.execute('SELECT 1').fetchone() == (1,)
+    finally:
+        conn.close()
+
+
+ROLLUP_QUERIES = {
+    'store_booking_counts': 'SELECT store_id, status, count FROM store_booking_counts WHERE count != 0',
+    'daily_stats': 'SELECT * FROM daily_stats WHERE bookings != 0',
+    'store_daily_top': 'SELECT date, store_id, offer_title, cnt FROM store_daily_top WHERE cnt != 0',
+    'lifetime_stats': 'SELECT k, v FROM lifetime_stats WHERE v != 0',
+}
+
+
+def rollups(db):
+    conn = db.get_connection()
+    try:
+        return {name: sorted(conn.execute(sql).fetchall()) for name, sql in ROLLUP_QUERIES.items()}
+    finally:
+        conn.close()
+
+
+def assert_rollups_match_bookings(db):
+    """Incrementally maintained rollups equal a full rebuild from bookings"""
+    maintained = rollups(db)
+    db.rebuild_booking_counts()
+    assert maintained == rollups(db)
+
+
+def test_booking_rollups_follow_writes(db, seller, store):
+    other_store = db.add_store(seller, 'Other', 'Ташкент')
+    db.approve_store(other_store)
+    bread, milk = add_offer(db, store, 'Хлеб'), add_offer(db, store, 'Молоко')
+    cake = add_offer(db, other_store, 'Торт')
+    for user_id in (20, 21):
+        db.add_user(user_id, f'buyer{user_id}', 'Buyer')
+
+    first = db.create_booking(bread, 20, 'A1', quantity=2)
+    second = db.create_booking(milk, 20, 'A2')
+    third = db.create_booking(cake, 21, 'A3', quantity=3)
+    db.create_booking(bread, 21, 'A4')
+    assert_rollups_match_bookings(db)
+    assert db.get_booking_status_counts([store]) == {'pending': 3}
+    assert db.get_lifetime_stats()['items'] == 7
+
+    db.update_booking_status(first, 'confirmed')
+    db.cancel_booking(second)
+    db.complete_booking(third)
+    assert_rollups_match_bookings(db)
+    assert db.get_booking_status_counts([store]) == {'confirmed': 1, 'cancelled': 1, 'pending': 1}
+
+    db.update_booking_status(second, 'pending')
+    db.update_booking_status(second, 'pending')
+    assert_rollups_match_bookings(db)
+    assert db.get_lifetime_stats()['orders'] == 4
+
+    db.delete_user(21)
+    assert_rollups_match_bookings(db)
+    assert db.get_booking_status_counts([other_store]) == {}
+    assert db.get_lifetime_stats()['bookings'] == 2
+
+    db.delete_store(other_store)
+    assert_rollups_match_bookings(db)
+
+    db.delete_user(seller)
+    assert_rollups_match_bookings(db)
+    assert db.get_booking_status_counts([store]) == {}
+    assert db.get_lifetime_stats()['bookings'] == 0
+
+
+def test_adjust_quantity_clamps_at_zero_and_toggles_status(db, seller, store):
+    offer_id = add_offer(db, store, quantity=2)
+
+    offer = db.adjust_quantity(offer_id, -5, seller)
+    assert (offer.quantity, offer.status) == (0, 'inactive')
+    assert db.get_offer(offer_id) == offer
+
+    offer = db.adjust_quantity(offer_id, 1, seller)
+    assert (offer.quantity, offer.status) == (1, 'active')
+    assert offer.store_name == 'Store'
+
+
+def test_adjust_quantity_ignores_foreign_and_deleted_offers(db, seller, store):
+    offer_id = add_offer(db, store, quantity=2)
+    db.add_user(30, 'other', 'Other', role='seller')
+
+    assert db.adjust_quantity(offer_id, 1, 30) is None
+    assert db.get_offer(offer_id).quantity == 2
+
+    db.delete_offer(offer_id)
+    assert db.adjust_quantity(offer_id, 1, seller) is None
+
+
+def fresh_reader(db):
+    """Second instance on the same file: its caches start empty"""
+    return Database(db.db_name)
+
+
+OFFER_WRITES = {
+    'update_offer_quantity': lambda db, offer_id, seller: db.update_offer_quantity(offer_id, 0),
+    'deactivate_offer': lambda db, offer_id, seller: db.deactivate_offer(offer_id),
+    'update_offer_expiry': lambda db, offer_id, seller: db.update_offer_expiry(offer_id, '2999-12-31'),
+    'delete_offer': lambda db, offer_id, seller: db.delete_offer(offer_id),
+    'create_booking_atomic': lambda db, offer_id, seller: db.create_booking_atomic(offer_id, seller, 2),
+    'delete_expired_offers': lambda db, offer_id, seller: (
+        fresh_reader(db).update_offer_expiry(offer_id, '2000-01-01'), db.delete_expired_offers()),
+    'delete_user_stores': lambda db, offer_id, seller: db.delete_user_stores(seller),
+}
+
+
+@pytest.mark.parametrize('write', OFFER_WRITES.values(), ids=OFFER_WRITES.keys())
+def test_offer_cache_is_invalidated_by_writes(db, seller, store, write):
+    offer_id = add_offer(db, store, quantity=5)
+    db.get_offer(offer_id)
+
+    write(db, offer_id, seller)
+
+    assert db.get_offer(offer_id) == fresh_reader(db).get_offer(offer_id)
+
+
+def test_offer_cache_is_invalidated_by_store_deletion(db, seller, store):
+    offer_id = add_offer(db, store)
+    db.get_offer(offer_id)
+
+    db.delete_store(store)
+
+    assert db.get_offer(offer_id) is None
+
+
+USER_WRITES = {
+    'update_user_city': lambda db, user_id: db.update_user_city(user_id, 'Самарканд'),
+    'update_user_role': lambda db, user_id: db.update_user_role(user_id, 'seller'),
+    'update_user_phone': lambda db, user_id: db.update_user_phone(user_id, '+998900000000'),
+    'update_user_language': lambda db, user_id: db.update_user_language(user_id, 'uz'),
+    'set_admin': lambda db, user_id: db.set_admin(user_id),
+    'toggle_notifications': lambda db, user_id: db.toggle_notifications(user_id),
+    'approve_store': lambda db, user_id: db.approve_store(db.add_store(user_id, 'New', 'Ташкент')),
+    'delete_user_stores': lambda db, user_id: (
+        fresh_reader(db).update_user_role(user_id, 'seller'), db.delete_user_stores(user_id)),
+    'delete_user': lambda db, user_id: db.delete_user(user_id),
+}
+
+
+@pytest.mark.parametrize('write', USER_WRITES.values(), ids=USER_WRITES.keys())
+def test_user_cache_is_invalidated_by_writes(db, write):
+    db.add_user(40, 'user', 'User')
+    db.get_user(40)
+    db.get_user_language(40)
+
+    write(db, 40)
+
+    reader = fresh_reader(db)
+    assert db.get_user(40) == reader.get_user(40)
+    assert db.get_user_language(40) == reader.get_user_language(40)
+
+
+
+def test_ratings_migration_collapses_duplicates_before_unique_index(db, store):
+    db.add_user(20, 'buyer', 'Buyer')
+    db.add_user(21, 'other', 'Other')
+    conn = db.get_connection()
+    conn.execute('DROP INDEX ux_ratings_store_user')
+    conn.executemany(
+        'INSERT INTO ratings (store_id, user_id, rating) VALUES (?, ?, ?)',
+        [(store, 20, 1), (store, 20, 5), (store, 21, 3), (store, 20, 4)]
+    )
+    conn.execute(RECALC_STORE_RATING_SQL)
+    conn.commit()
+    conn.close()
+
+    migrated = Database(db.db_name)
+
+    conn = migrated.get_connection()
+    try:
+        rows = conn.execute('SELECT user_id, rating FROM ratings ORDER BY user_id').fetchall()
+        index = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'ux_ratings_store_user'"
+        ).fetchone()
+        cached = conn.execute('SELECT avg_rating, ratings_count FROM stores WHERE store_id = ?', (store,)).fetchone()
+    finally:
+        conn.close()
+    assert rows == [(20, 4), (21, 3)]
+    assert index is not None
+    assert cached == (3.5, 2)
+    assert migrated.upsert_store_rating(store, 20, 2) is True
+
+
+def test_store_bookings_row_layout(db, seller, store):
+    offer_id = add_offer(db, store, 'Bread')
+    db.add_user(20, 'buyer', 'Buyer')
+    db.update_user_phone(20, '+998901234567')
+    booking_id = db.create_booking(offer_id, 20, 'CODE01', quantity=2)
+
+    rows = [
+        db.get_store_bookings(store),
+        db.get_bookings_for_stores([store]),
+        db.get_bookings_for_owner(seller),
+    ]
+
+    for (row,) in rows:
+        assert row[:7] == (booking_id, offer_id, 20, 'pending', 'CODE01', None, 2)
+        assert row[8:] == ('Bread', 'Buyer', 'buyer', '+998901234567')
+    assert rows[0] == rows[1] == rows[2]
+    # savings stays out of the row; it is read through the rollups
+    assert db.get_lifetime_stats()['savings'] == (10000 - 5000) * 2
@@ -0,0 +1,22 @@
+import pytest
+
+import keyboards
+import localization
+
+
+@pytest.mark.parametrize('module', [localization, keyboards])
+@pytest.mark.parametrize('getter', ['get_cities', 'get_categories'])
+def test_returned_lists_are_private_copies(module, getter):
+    first = getattr(module, getter)('ru')
+    first.append('Mutated')
+    first.sort(reverse=True)
+
+    assert getattr(module, getter)('ru') == list(
+        localization.CITIES['ru'] if getter == 'get_cities' else localization.CATEGORIES['ru']
+    )
+
+
+def test_keyboards_share_the_localization_lists():
+    assert keyboards.CITIES_UZ is localization.CITIES['uz']
+    assert keyboards.CATEGORIES_RU is localization.CATEGORIES['ru']
+    assert localization.get_normalized_category('uz', 2) == "Пекарня"
@@ -0,0 +1,143 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from handlers import offers
+from handlers.common import EditOffer, format_uzb_date, send_queue
+from keyboards import ExpiryCb, OfferCb
+from security import InputValidator
+
+SELLER = 10
+
+
+@pytest.fixture
+def handlers(db, collector):
+    offers.setup(collector, db, lambda lang, key: key, lambda lang: None, InputValidator)
+    return collector
+
+
+@pytest.fixture
+def offer_id(db):
+    db.add_user(SELLER, 'seller', 'Seller', role='seller')
+    store_id = db.add_store(SELLER, 'Store', 'Ташкент')
+    db.approve_store(store_id)
+    return db.add_offer(store_id, 'Хлеб', '', 10000, 5000, 1,
+                        '09:00', '21:00', expiry_date='2999-01-01')
+
+
+def make_callback(user_id=SELLER):
+    callback = MagicMock()
+    callback.from_user.id = user_id
+    callback.answer = AsyncMock()
+    callback.message.photo = None
+    callback.message.edit_text = AsyncMock()
+    callback.message.edit_reply_markup = AsyncMock()
+    callback.message.delete = AsyncMock()
+    callback.message.answer = AsyncMock()
+    return callback
+
+
+def callback_payloads(markup):
+    return [button.callback_data for row in markup.inline_keyboard for button in row]
+
+
+def test_card_buttons_are_routed_by_offer_filters(offer_id):
+    # Every o:<action>:<id> button the card emits must parse back into OfferCb
+    from handlers.common import render_offer_card
+    from database import Offer
+    offer = Offer(offer_id, 1, 'Хлеб', '', 10000, 5000, 3, '09:00', '21:00', 'active',
+                  None, '', '2999-01-01', 'шт', 'other', 'Store', '', 'Ташкент', '')
+    _, markup = render_offer_card(offer, 'ru')
+    actions = {OfferCb.unpack(data).action for data in callback_payloads(markup)}
+    assert actions == {'qty_sub', 'qty_add', 'edit', 'extend', 'deactivate', 'delete'}
+
+
+def test_quantity_buttons_update_card_and_stop_at_zero(db, handlers, offer_id):
+    callback = make_callback()
+
+    asyncio.run(handlers['offer_quantity'](callback, OfferCb(action='qty_add', offer_id=offer_id), lang='ru'))
+    assert db.get_offer(offer_id).quantity == 2
+    assert callback.message.edit_text.await_count == 1
+
+    for _ in range(3):
+        asyncio.run(handlers['offer_quantity'](callback, OfferCb(action='qty_sub', offer_id=offer_id), lang='ru'))
+    offer = db.get_offer(offer_id)
+    assert offer.quantity == 0
+    assert offer.status == 'inactive'
+    assert callback.answer.await_args.kwargs == {'show_alert': True}
+
+
+def test_foreign_offer_is_rejected(db, handlers, offer_id):
+    db.add_user(20, 'other', 'Other')
+    callback = make_callback(user_id=20)
+
+    asyncio.run(handlers['offer_quantity'](callback, OfferCb(action='qty_add', offer_id=offer_id), lang='ru'))
+    asyncio.run(handlers['offer_delete'](callback, OfferCb(action='delete', offer_id=offer_id), lang='ru'))
+    asyncio.run(handlers['offer_set_expiry'](callback, ExpiryCb(offer_id=offer_id, days=7), lang='ru'))
+
+    offer = db.get_offer(offer_id)
+    assert (offer.quantity, offer.status, offer.expiry_date) == (1, 'active', '2999-01-01')
+    assert [c.args[0] for c in callback.answer.await_args_list] == ['not_your_offer'] * 3
+    callback.message.delete.assert_not_awaited()
+
+
+def test_extend_sets_expiry_from_picked_days(db, handlers, offer_id):
+    callback = make_callback()
+
+    asyncio.run(handlers['offer_extend'](callback, OfferCb(action='extend', offer_id=offer_id), lang='ru'))
+    markup = callback.message.edit_reply_markup.await_args.kwargs['reply_markup']
+    assert ExpiryCb(offer_id=offer_id, days=7).pack() in callback_payloads(markup)
+
+    asyncio.run(handlers['offer_set_expiry'](callback, ExpiryCb(offer_id=offer_id, days=7), lang='ru'))
+    assert db.get_offer(offer_id).expiry_date == format_uzb_date('%Y-%m-%d', 7)
+
+
+def test_edit_time_validates_and_saves_both_ends(db, handlers, offer_id):
+    callback = make_callback()
+    state = MagicMock()
+    data = {}
+    state.update_data = AsyncMock(side_effect=lambda **kw: data.update(kw))
+    state.get_data = AsyncMock(side_effect=lambda: dict(data))
+    state.set_state = AsyncMock()
+    state.clear = AsyncMock()
+
+    asyncio.run(handlers['offer_edit_time'](callback, OfferCb(action='edit_time', offer_id=offer_id),
+                                            state, lang='ru'))
+    state.set_state.assert_awaited_once_with(EditOffer.value)
+
+    message = MagicMock()
+    message.answer = AsyncMock()
+    for text in ('25:00', '18:00', '22:30'):
+        message.text = text
+        asyncio.run(handlers['offer_edit_time_value'](message, state, lang='ru'))
+
+    offer = db.get_offer(offer_id)
+    assert (offer.available_from, offer.available_until) == ('18:00', '22:30')
+    assert "Неверный формат" in message.answer.await_args_list[0].args[0]
+    state.clear.assert_awaited_once()
+
+
+def test_my_offers_queues_cards_in_order(db, handlers, offer_id):
+    second = db.add_offer(db.get_offer(offer_id).store_id, 'Молоко', '', 8000, 4000, 2,
+                          '09:00', '21:00', expiry_date='2999-01-01', photo='dead-file-id')
+    message = MagicMock()
+    message.from_user.id = SELLER
+    message.chat.id = SELLER
+    message.answer = AsyncMock()
+    message.bot.send_message = AsyncMock()
+    message.bot.send_photo = AsyncMock(side_effect=Exception("wrong file identifier"))
+
+    async def run():
+        await handlers['my_offers'](message, lang='ru')
+        # The handler only enqueues; wait for the chat's worker to drain
+        await asyncio.gather(*send_queue._workers.values())
+
+    asyncio.run(run())
+
+    assert "Найдено: 2" in message.answer.await_args.args[0]
+    sent = [c.kwargs['reply_markup'] for c in message.bot.send_message.await_args_list]
+    # Both cards arrive; the one whose photo is gone falls back to text
+    assert sorted(OfferCb.unpack(callback_payloads(m)[-1]).offer_id for m in sent) == [offer_id, second]
+    message.bot.send_photo.assert_awaited_once()
+    assert not send_queue.pending(SELLER)
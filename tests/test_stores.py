@@ -0,0 +1,88 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from handlers import stores
+from handlers.stores import STORES_CAT_RE
+
+USER = 1
+
+
+@pytest.fixture
+def handlers(db, collector):
+    stores.setup(collector, db, lambda lang, key: key)
+    db.add_user(USER, 'user', 'User')
+    db.add_user(10, 'seller', 'Seller', role='seller')
+    return collector
+
+
+def add_store(db, name, category, city='Ташкент', ratings=()):
+    store_id = db.add_store(10, name, city, address=f'{name} street', category=category)
+    db.approve_store(store_id)
+    for user_id, rating in enumerate(ratings, 100):
+        db.add_user(user_id, f'u{user_id}', 'U')
+        db.upsert_store_rating(store_id, user_id, rating)
+    return store_id
+
+
+def make_callback(data):
+    callback = MagicMock()
+    callback.from_user.id = USER
+    callback.data = data
+    callback.answer = AsyncMock()
+    callback.message.edit_text = AsyncMock()
+    return callback
+
+
+def buttons(markup):
+    return [button.callback_data for row in markup.inline_keyboard for button in row]
+
+
+def test_all_stores_counts_localized_categories(db, handlers):
+    add_store(db, 'A', 'Пекарня')
+    add_store(db, 'B', 'Пекарня')
+    add_store(db, 'C', 'Кафе', city='Самарканд')
+    message = MagicMock()
+    message.from_user.id = USER
+    message.answer = AsyncMock()
+
+    asyncio.run(handlers['all_stores'](message, user=db.get_user(USER), lang='uz'))
+
+    text = message.answer.await_args.args[0]
+    assert "Jami dokonlar: 2" in text
+    labels = [b.text for row in message.answer.await_args.kwargs['reply_markup'].inline_keyboard for b in row]
+    assert "Nonvoyxona (2)" in labels
+    assert "Kafe" in labels
+
+
+def test_category_digest_is_one_edit_sorted_by_rating(db, handlers):
+    low = add_store(db, 'Low', 'Пекарня', ratings=(2,))
+    high = add_store(db, 'High', 'Пекарня', ratings=(5, 4))
+    add_store(db, 'Cafe', 'Кафе')
+    callback = make_callback('stores_cat_2')
+
+    asyncio.run(handlers['show_stores_by_category'](callback, STORES_CAT_RE.match(callback.data), lang='ru'))
+
+    callback.message.edit_text.assert_awaited_once()
+    text = callback.message.edit_text.await_args.args[0]
+    assert "Найдено: 2" in text
+    assert text.index("High") < text.index("Low")
+    assert buttons(callback.message.edit_text.await_args.kwargs['reply_markup']) == [
+        f"store_{high}", f"store_{low}"
+    ]
+
+
+def test_empty_category_and_top_stores(db, handlers):
+    store_id = add_store(db, 'Only', 'Кафе', ratings=(5,))
+
+    callback = make_callback('stores_cat_0')
+    asyncio.run(handlers['show_stores_by_category'](callback, STORES_CAT_RE.match(callback.data), lang='ru'))
+    assert callback.answer.await_args.kwargs == {'show_alert': True}
+    callback.message.edit_text.assert_not_awaited()
+
+    callback = make_callback('stores_top')
+    asyncio.run(handlers['show_top_stores'](callback, lang='ru'))
+    text = callback.message.edit_text.await_args.args[0]
+    assert "ТОП МАГАЗИНЫ" in text and "⭐ 5.0 (1 отзывов)" in text
+    assert buttons(callback.message.edit_text.await_args.kwargs['reply_markup']) == [f"store_{store_id}"]
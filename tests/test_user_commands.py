@@ -0,0 +1,59 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from handlers import user_commands
+
+
+@pytest.fixture
+def handlers(db, collector):
+    user_commands.setup(
+        collector, db,
+        get_text=lambda lang, key, **kw: key,
+        get_cities=lambda lang: ['Ташкент'],
+        city_keyboard=lambda *a, **k: None,
+        language_keyboard=lambda: None,
+        phone_request_keyboard=lambda lang: 'phone_kb',
+        main_menu_seller=lambda lang: 'seller_menu',
+        main_menu_customer=lambda lang: 'customer_menu',
+    )
+    return collector
+
+
+def make_callback(user_id=7):
+    callback = MagicMock()
+    callback.from_user.id = user_id
+    callback.from_user.first_name = 'U'
+    callback.from_user.username = 'u'
+    callback.answer = AsyncMock()
+    # Parent mock records the order of calls on the message
+    callback.message = MagicMock()
+    callback.message.edit_text = AsyncMock()
+    callback.message.edit_reply_markup = AsyncMock()
+    callback.message.answer = AsyncMock()
+    return callback
+
+
+def test_cancel_offer_removes_inline_keyboard_and_sends_one_message(handlers):
+    callback = make_callback()
+    state = MagicMock(clear=AsyncMock())
+
+    asyncio.run(handlers['cancel_offer_callback'](callback, state))
+
+    callback.message.edit_reply_markup.assert_awaited_once_with(reply_markup=None)
+    callback.message.answer.assert_awaited_once()
+    assert callback.message.answer.await_args.kwargs['reply_markup'] == 'seller_menu'
+    state.clear.assert_awaited_once()
+
+
+def test_choose_language_edits_picker_before_next_screen(db, handlers):
+    callback = make_callback()
+    state = MagicMock(set_state=AsyncMock())
+    match = user_commands.LANG_CALLBACK_RE.match('lang_uz')
+
+    asyncio.run(handlers['choose_language'](callback, state, match))
+
+    calls = [name for name, *_ in callback.message.mock_calls if name in ('edit_text', 'answer')]
+    assert calls == ['edit_text', 'answer']
+    assert db.get_user_language(7) == 'uz'
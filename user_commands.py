@@ -1,6 +1,8 @@
 """
 User command handlers (start, language selection, city selection, cancel actions)
 """
+import re
+
 from aiogram import Router, types, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
@@ -8,40 +10,59 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 router = Router()
 
+# Compiled once: language callbacks are matched and parsed by the filter itself
+LANG_CALLBACK_RE = re.compile(r"^lang_(ru|uz)$")
+
+# Per-language text fragments, picked once per render instead of per-string ternaries
+MY_CITY_FRAG = {
+    'ru': ("✏️ Изменить город", "◀️ Назад",
+           "📊 В вашем городе:", "🏪 Магазинов: {}", "🍽 Предложений: {}"),
+    'uz': ("✏️ Shaharni o'zgartirish", "◀️ Orqaga",
+           "📊 Shahringizda:", "🏪 Do'konlar: {}", "🍽 Takliflar: {}"),
+}
+OFFER_CANCELLED_TEXT = {
+    'ru': "❌ Создание товара отменено",
+    'uz': "❌ Mahsulot yaratish bekor qilindi",
+}
+
 
 def setup(dp_or_router, db, get_text, get_cities, city_keyboard, language_keyboard,
           phone_request_keyboard, main_menu_seller, main_menu_customer):
     """Setup user command handlers with dependencies"""
-    from handlers.common import Registration, user_view_mode, has_approved_store
+    from handlers.common import (
+        Registration, user_view_mode, has_approved_store, edit_text_if_changed
+    )
     
+    def resolve_user(user_id, user, lang):
+        """Use the row injected by UserContextMiddleware, falling back to the DB"""
+        if lang is None:
+            user = db.get_user(user_id)
+            lang = (user[5] if user and len(user) > 5 else None) or 'ru'
+        return user, lang
+
     @dp_or_router.message(F.text == "Мой город")
-    async def my_city(message: types.Message, state: FSMContext = None):
-        user_id = message.from_user.id
-        lang = db.get_user_language(user_id)
-        user = db.get_user(user_id)
+    async def my_city(message: types.Message, state: FSMContext = None, user=None, lang: str = None):
+        user, lang = resolve_user(message.from_user.id, user, lang)
         current_city = user[4] if user and len(user) > 4 else None
         if not current_city:
             current_city = get_cities(lang)[0]
+        frag = MY_CITY_FRAG.get(lang, MY_CITY_FRAG['ru'])
         
         # Get city statistics
         stats_text = ""
         try:
             stores_count = len(db.get_stores_by_city(current_city))
             offers_count = len(db.get_active_offers(city=current_city))
-            stats_text = f"\n\n📊 В вашем городе:\n🏪 Магазинов: {stores_count}\n🍽 Предложений: {offers_count}"
+            stats_text = "\n\n" + "\n".join((
+                frag[2], frag[3].format(stores_count), frag[4].format(offers_count)
+            ))
         except:
             pass
         
         # Create inline keyboard with buttons
         builder = InlineKeyboardBuilder()
-        builder.button(
-            text="✏️ Изменить город" if lang == 'ru' else "✏️ Shaharni o'zgartirish",
-            callback_data="change_city"
-        )
-        builder.button(
-            text="◀️ Назад" if lang == 'ru' else "◀️ Orqaga",
-            callback_data="back_to_menu"
-        )
+        builder.button(text=frag[0], callback_data="change_city")
+        builder.button(text=frag[1], callback_data="back_to_menu")
         builder.adjust(1)
         
         await message.answer(
@@ -53,33 +74,33 @@ def setup(dp_or_router, db, get_text, get_cities, city_keyboard, language_keyboa
     @dp_or_router.callback_query(F.data == "change_city")
     async def show_city_selection(callback: types.CallbackQuery, state: FSMContext):
         """Show list of cities for selection"""
+        # Clear the loading spinner before any DB or API work
+        await callback.answer()
         lang = db.get_user_language(callback.from_user.id)
-        await callback.message.edit_text(
+        await edit_text_if_changed(
+            callback.message, state,
             get_text(lang, 'choose_city'),
             reply_markup=city_keyboard(lang)
         )
-        await callback.answer()
 
     @dp_or_router.callback_query(F.data == "back_to_menu")
-    async def back_to_main_menu(callback: types.CallbackQuery):
+    async def back_to_main_menu(callback: types.CallbackQuery, user=None, lang: str = None):
         """Return to main menu"""
-        lang = db.get_user_language(callback.from_user.id)
-        user = db.get_user(callback.from_user.id)
+        await callback.answer()
+        user, lang = resolve_user(callback.from_user.id, user, lang)
         menu = main_menu_seller(lang) if user and user[6] == "seller" else main_menu_customer(lang)
         
         await callback.message.delete()
         await callback.message.answer(
-            get_text(lang, 'main_menu') if 'main_menu' in dir() else "Главное меню",
+            get_text(lang, 'main_menu'),
             reply_markup=menu
         )
-        await callback.answer()
 
     @dp_or_router.message(F.text.in_(get_cities('ru') + get_cities('uz')))
-    async def change_city(message: types.Message, state: FSMContext = None):
+    async def change_city(message: types.Message, state: FSMContext = None, user=None, lang: str = None):
         """Quick city change handler (without FSM state)"""
         user_id = message.from_user.id
-        lang = db.get_user_language(user_id)
-        user = db.get_user(user_id)
+        user, lang = resolve_user(user_id, user, lang)
         
         # IMPORTANT: Check current FSM state
         # If user is in registration process (store or self), skip
@@ -147,9 +168,10 @@ def setup(dp_or_router, db, get_text, get_cities, city_keyboard, language_keyboa
             reply_markup=menu
         )
 
-    @dp_or_router.callback_query(F.data.startswith("lang_"))
-    async def choose_language(callback: types.CallbackQuery, state: FSMContext):
-        lang = callback.data.split("_")[1]
+    @dp_or_router.callback_query(F.data.regexp(LANG_CALLBACK_RE).as_("lang_match"))
+    async def choose_language(callback: types.CallbackQuery, state: FSMContext, lang_match: re.Match):
+        lang = lang_match.group(1)
+        await callback.answer()
         
         # Show menu after language selection
         user = db.get_user(callback.from_user.id)
@@ -269,17 +291,21 @@ def setup(dp_or_router, db, get_text, get_cities, city_keyboard, language_keyboa
     @dp_or_router.callback_query(F.data == "cancel_offer")
     async def cancel_offer_callback(callback: types.CallbackQuery, state: FSMContext):
         """Handler for offer creation cancel button"""
+        await callback.answer()
         lang = db.get_user_language(callback.from_user.id)
         await state.clear()
-        
-        await callback.message.edit_text(
-            f"❌ {'Создание товара отменено' if lang == 'ru' else 'Mahsulot yaratish bekor qilindi'}",
-            parse_mode="HTML"
-        )
-        
+
+        # Drop the inline "cancel" button from the original message; this edit
+        # is not a new chat message
+        try:
+            await callback.message.edit_reply_markup(reply_markup=None)
+        except Exception:
+            pass
+
+        # Single outbound message: edit_text cannot swap the reply keyboard,
+        # so the confirmation goes out together with the seller menu
         await callback.message.answer(
-            get_text(lang, 'operation_cancelled'),
+            OFFER_CANCELLED_TEXT.get(lang, OFFER_CANCELLED_TEXT['ru']),
+            parse_mode="HTML",
             reply_markup=main_menu_seller(lang)
         )
-        
-        await callback.answer()